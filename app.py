@@ -25,9 +25,12 @@ from backend.core.tools import (
     TableSchemaTool,
     SearchTablesTool,
     RelationshipTool,
+    JoinPathTool,
+    JoinSQLTool,
     ExecuteSQLTool,
 )
 from backend.core.conversation_manager import ConversationManager
+from backend.config import settings
 
 # Load environment variables
 load_dotenv()
@@ -91,6 +94,8 @@ def create_pdm_agent():
         TableSchemaTool(),
         SearchTablesTool(),
         RelationshipTool(),
+        JoinPathTool(),
+        JoinSQLTool(),
         ExecuteSQLTool()
     ]
 
@@ -100,7 +105,9 @@ def create_pdm_agent():
     
     1. For conceptual searches, use 'search_tables'.
     2. For table details, use 'get_table_schema' with the table's CODE.
-    3. For connections, use 'find_relationships'.
+    3. For connections, use 'find_relationships'. To see how two tables join (or a table's wider
+       neighborhood), use 'find_join_path' once instead of chaining 'find_relationships' calls.
+       For a multi-table query, start from the skeleton returned by 'get_join_sql'.
     4. To query actual data from MySQL or Oracle, use 'execute_sql'. 
        Before running SQL, always verify the table structure and database type.
        Try to limit results (e.g., LIMIT 5 or FETCH FIRST 5 ROWS ONLY) to avoid overwhelming the output.
@@ -199,6 +206,8 @@ def handle_command(cmd: str, conv_manager: ConversationManager) -> bool:
         print(f"   ID:     {session.session_id[:8]}...")
         print(f"   名称:   {session.name}")
         print(f"   消息数: {session.message_count()} 条（最大 {session.max_messages} 条）")
+        if session.token_budget:
+            print(f"   估算 token: {session.total_tokens}（预算 {session.token_budget}）")
         print(f"   创建于: {session.created_at[:19]}")
         print(f"   更新于: {session.updated_at[:19]}")
         print()
@@ -215,8 +224,11 @@ if __name__ == "__main__":
 
     # 初始化多轮对话管理器（会话自动从磁盘恢复）
     conv_manager = ConversationManager(
-        persist_path=os.getenv("CONVERSATION_PERSIST_PATH", "./data/conversations.json"),
+        db_path=os.getenv("CONVERSATION_DB_PATH", "./data/conversations.db"),
         max_messages_per_session=int(os.getenv("MAX_MESSAGES_PER_SESSION", "50")),
+        legacy_json_path=os.getenv("CONVERSATION_PERSIST_PATH", "./data/conversations.json"),
+        cache_size=int(os.getenv("SESSION_CACHE_SIZE", "64")),
+        token_budget=settings.HISTORY_TOKEN_BUDGET,
     )
 
     # 显示启动信息
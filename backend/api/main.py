@@ -19,8 +19,14 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from backend.api.routes import pdm, conversation, knowledge
+from backend.api.routes import pdm, conversation, knowledge, attachments
 from backend.config import settings
+from backend.core.attachments import attachment_stats
+from backend.core.concurrency import get_agent_limiter
+from backend.core.db_manager import db_manager
+from backend.core.executors import executor_stats, shutdown_executors
+from backend.core.ocr_cache import ocr_cache_stats
+from backend.core.stream_buffer import stream_buffer_stats
 
 # ---------------------------------------------------------------
 # 统一日志配置（全局唯一入口，其他模块只需 logging.getLogger(__name__)）
@@ -68,7 +74,10 @@ async def lifespan(app: FastAPI):
     logger.info(f"  Chroma DB    : {settings.CHROMA_DB_PATH}")
     logger.info(f"  API Docs     : http://{settings.API_HOST}:{settings.API_PORT}/docs")
     logger.info("=" * 60)
+    await conversation.start_chat_runs()
     yield
+    await conversation.stop_chat_runs()
+    shutdown_executors()
     logger.info("知识中枢助手 API 服务已关闭")
 
 
@@ -129,6 +138,7 @@ API_PREFIX = "/api"
 app.include_router(pdm.router, prefix=API_PREFIX)
 app.include_router(conversation.router, prefix=API_PREFIX)
 app.include_router(knowledge.router, prefix=API_PREFIX)
+app.include_router(attachments.router, prefix=API_PREFIX)
 
 
 # ---------------------------------------------------------------
@@ -145,11 +155,27 @@ def root():
     }
 
 
+# 健康检查与指标接口为 async，不经过线程池，对话负载高时也能立即响应
 @app.get("/health", tags=["系统"], summary="健康检查")
-def health_check():
+async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", tags=["系统"], summary="运行指标")
+async def metrics():
+    """Agent 并发 / 排队情况、各专用线程池积压、会话标题队列、流式缓冲、后台对话运行状态、OCR 缓存命中率、预上传附件数及外部数据库连接池状态。"""
+    return {
+        "agent": get_agent_limiter().stats(),
+        "executors": executor_stats(),
+        "title_queue": conversation.title_queue_stats(),
+        "streams": stream_buffer_stats(),
+        "chat_runs": conversation.chat_run_stats(),
+        "ocr_cache": ocr_cache_stats(),
+        "attachments": attachment_stats(),
+        "db_pools": db_manager.pool_stats(),
+    }
+
+
 # ---------------------------------------------------------------
 # 直接运行入口（开发环境）
 # ---------------------------------------------------------------
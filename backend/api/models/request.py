@@ -31,6 +31,7 @@ class ExecuteSQLRequest(BaseModel):
     """执行 SQL 查询请求体"""
     db_type: str = Field(..., description="数据库类型：'mysql' 或 'oracle'")
     sql: str = Field(..., description="要执行的 SQL 语句", min_length=1)
+    confirm: bool = Field(default=False, description="确认执行被 SQL 防护拦截的高成本查询（仅 DB_GUARD_MODE=confirm 时生效）")
 
     model_config = {
         "json_schema_extra": {
@@ -83,6 +84,9 @@ class SendMessageRequest(BaseModel):
     message: str = Field(default="", description="用户发送的消息内容")
     images: Optional[List[ImageData]] = Field(default=None, description="附件图片列表")
     log_file: Optional[LogFileData] = Field(default=None, description="附件日志文件")
+    attachment_ids: Optional[List[str]] = Field(
+        default=None, description="通过 POST /api/attachments 预上传的附件 ID 列表"
+    )
 
     model_config = {
         "json_schema_extra": {
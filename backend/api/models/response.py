@@ -55,6 +55,41 @@ class ListTablesResponse(BaseResponse):
     """列出所有表的响应"""
     data: List[TableInfo] = Field(default_factory=list, description="表列表")
     total: int = Field(default=0, description="总数量")
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标，为空表示没有更多数据")
+
+
+class CatalogTableInfo(TableInfo):
+    """目录快照中的表信息"""
+    file: str = Field(default="", description="所属 PDM 文件")
+    column_count: int = Field(default=0, description="字段数量")
+
+
+class CatalogColumnInfo(ColumnInfo):
+    """目录快照中的字段信息"""
+    table_code: str = Field(..., description="所属表代码")
+    file: str = Field(default="", description="所属 PDM 文件")
+
+
+class CatalogTablesResponse(BaseResponse):
+    """目录快照表列表（分页）响应"""
+    data: List[CatalogTableInfo] = Field(default_factory=list, description="当前页表列表")
+    total: int = Field(default=0, description="过滤后的总数量")
+    offset: int = Field(default=0, description="当前页起始偏移")
+    limit: int = Field(default=100, description="每页数量")
+
+
+class CatalogColumnsResponse(BaseResponse):
+    """目录快照字段列表（分页）响应"""
+    data: List[CatalogColumnInfo] = Field(default_factory=list, description="当前页字段列表")
+    total: int = Field(default=0, description="过滤后的总数量")
+    offset: int = Field(default=0, description="当前页起始偏移")
+    limit: int = Field(default=100, description="每页数量")
+
+
+class CatalogExportResponse(BaseResponse):
+    """目录快照导出响应"""
+    tables: int = Field(default=0, description="导出的表数量")
+    columns: int = Field(default=0, description="导出的字段数量")
 
 
 class TableDetailResponse(BaseResponse):
@@ -90,11 +125,47 @@ class RelationshipsResponse(BaseResponse):
     table_code: str = Field(..., description="查询的表代码")
 
 
+class JoinEdgeInfo(BaseModel):
+    """关联路径中的一条外键边"""
+    id: str = Field(default="", description="关系 ID")
+    name: str = Field(default="", description="关系名称")
+    parent_table: str = Field(..., description="父表代码")
+    child_table: str = Field(..., description="子表代码")
+
+
+class JoinPathResponse(BaseResponse):
+    """两表最短关联路径 / 单表 k 跳邻域响应"""
+    source: str = Field(..., description="起始表代码")
+    target: Optional[str] = Field(default=None, description="目标表代码（邻域查询时为空）")
+    found: bool = Field(default=False, description="是否找到关联路径")
+    tables: List[str] = Field(default_factory=list, description="路径或邻域中的表代码（按距离排序）")
+    distances: Dict[str, int] = Field(default_factory=dict, description="邻域查询时各表到起始表的跳数")
+    edges: List[JoinEdgeInfo] = Field(default_factory=list, description="外键边列表")
+    component_size: int = Field(default=0, description="起始表所在连通分量的表数量")
+
+
+class JoinSQLResponse(BaseResponse):
+    """两表 JOIN SQL 骨架响应"""
+    source: str = Field(..., description="起始表代码")
+    target: str = Field(..., description="目标表代码")
+    tables: List[str] = Field(default_factory=list, description="关联路径上的表代码")
+    edges: List[JoinEdgeInfo] = Field(default_factory=list, description="外键边列表")
+    join_sources: List[str] = Field(
+        default_factory=list,
+        description=(
+            "各边 JOIN 列来源：pdm（模型定义）、inferred（按父表主键列推断：子表须包含全部主键列，"
+            "主键 ID 只匹配子表的 <父表代码>_ID / <父表代码>ID）、unknown（无法确定，不生成 SQL）"
+        ),
+    )
+    sql: str = Field(default="", description="SELECT/JOIN 骨架 SQL")
+
+
 class ExecuteSQLResponse(BaseResponse):
     """执行 SQL 查询的响应"""
     data: Any = Field(default=None, description="查询结果（行列表或影响行数）")
     db_type: str = Field(..., description="执行的数据库类型")
     row_count: int = Field(default=0, description="返回行数")
+    truncated: bool = Field(default=False, description="结果超过行数上限，仅返回了前 row_count 行")
 
 
 # ---------------------------------------------------------------
@@ -125,12 +196,14 @@ class SessionInfo(BaseModel):
     created_at: str = Field(..., description="创建时间")
     updated_at: str = Field(..., description="最后更新时间")
     is_current: bool = Field(default=False, description="是否为当前活跃会话")
+    title_pending: bool = Field(default=False, description="会话标题是否正在后台生成（为 true 时客户端可稍后轮询）")
 
 
 class ListSessionsResponse(BaseResponse):
     """列出所有会话的响应"""
     data: List[SessionInfo] = Field(default_factory=list, description="会话列表")
     total: int = Field(default=0, description="会话总数")
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标，为空表示没有更多数据")
 
 
 class SessionDetailResponse(BaseResponse):
@@ -157,6 +230,45 @@ class ChatResponse(BaseResponse):
     """AI 对话响应"""
     session_id: str = Field(..., description="会话 ID")
     reply: str = Field(..., description="AI 回复内容")
+    title_pending: bool = Field(default=False, description="是否已在后台生成会话标题")
+
+
+class ChatRunInfo(BaseModel):
+    """对话运行（后台任务）信息"""
+    run_id: str = Field(..., description="运行 ID")
+    session_id: str = Field(..., description="会话 ID")
+    status: str = Field(..., description="状态：queued / running / done / error / cancelled / interrupted")
+    output: str = Field(default="", description="AI 回复内容（运行中为已生成的部分）")
+    error: Optional[str] = Field(default=None, description="错误信息")
+    created_at: str = Field(..., description="提交时间")
+    started_at: Optional[str] = Field(default=None, description="开始执行时间")
+    finished_at: Optional[str] = Field(default=None, description="结束时间")
+    events_url: str = Field(..., description="SSE 事件订阅地址（支持 Last-Event-ID 续传，可多端同时订阅）")
+
+
+class ChatRunResponse(BaseResponse):
+    """对话运行响应"""
+    data: ChatRunInfo
+
+
+class AttachmentInfo(BaseModel):
+    """已上传附件信息"""
+    attachment_id: str = Field(..., description="附件 ID，发送消息时通过 attachment_ids 引用")
+    kind: str = Field(..., description="附件类型：image / log")
+    filename: str = Field(default="", description="文件名")
+    mime_type: str = Field(default="", description="MIME 类型")
+    size: int = Field(default=0, description="文件大小（字节）")
+    status: str = Field(..., description="处理状态：processing / ready")
+
+
+class AttachmentUploadResponse(BaseResponse):
+    """附件上传响应"""
+    data: List[AttachmentInfo] = Field(default_factory=list, description="已上传的附件")
+
+
+class AttachmentResponse(BaseResponse):
+    """附件详情响应"""
+    data: AttachmentInfo
 
 
 # ---------------------------------------------------------------
@@ -180,6 +292,7 @@ class SourceListResponse(BaseResponse):
     """知识源列表响应"""
     data: List[SourceInfo] = Field(default_factory=list, description="知识源列表")
     total: int = Field(default=0, description="总数量")
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标，为空表示没有更多数据")
 
 
 class SourceDetailResponse(BaseResponse):
@@ -0,0 +1,161 @@
+"""
+backend/api/pagination.py
+
+列表接口通用的分页 / 字段投影 / NDJSON 流式输出工具，供 pdm、knowledge、conversation 路由共用。
+
+查询参数（通过 Depends(page_params) 注入）：
+    cursor : 上一页响应中的 next_cursor（不透明字符串）
+    limit  : 每页数量；不传时返回全部（与旧版接口行为一致）
+    fields : 逗号分隔的字段列表，只返回这些字段，如 fields=code,name
+    format : json（默认）或 ndjson（每行一个 JSON 对象的流式响应）
+
+游标为排序键的 base64 编码（keyset 分页），翻页期间插入/删除数据不会导致重复或遗漏。
+"""
+
+import json
+import base64
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 单页最大数量
+MAX_PAGE_LIMIT = 1000
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+@dataclass
+class PageParams:
+    cursor: Optional[str] = None
+    limit: Optional[int] = None
+    fields: Optional[str] = None
+    format: str = "json"
+
+    @property
+    def streaming(self) -> bool:
+        return self.format == "ndjson"
+
+
+def page_params(
+    cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的 next_cursor）"),
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_LIMIT, description="每页数量，不传返回全部"),
+    fields: Optional[str] = Query(default=None, description="只返回指定字段，逗号分隔，如 code,name"),
+    format: str = Query(default="json", pattern="^(json|ndjson)$", description="响应格式：json 或 ndjson"),
+) -> PageParams:
+    """FastAPI 依赖：解析通用分页参数。"""
+    return PageParams(cursor=cursor, limit=limit, fields=fields, format=format)
+
+
+# ------------------------------------------------------------------
+# 游标
+# ------------------------------------------------------------------
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    """将排序键编码为不透明游标。"""
+    raw = json.dumps(list(key), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[Tuple]:
+    """解析游标为排序键元组；格式错误时返回 400。"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        if not isinstance(key, list) or len(key) != size:
+            raise ValueError
+        return tuple(key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标 cursor")
+
+
+# ------------------------------------------------------------------
+# 字段投影
+# ------------------------------------------------------------------
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """解析 fields 参数；包含未知字段时返回 400。"""
+    if not fields:
+        return None
+    allowed = list(allowed)
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"未知字段: {', '.join(unknown)}，可选字段: {', '.join(allowed)}",
+        )
+    return selected or None
+
+
+def project(item: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if not fields:
+        return item
+    return {f: item.get(f) for f in fields}
+
+
+# ------------------------------------------------------------------
+# 分页
+# ------------------------------------------------------------------
+
+def paginate_sorted(
+    items: List[Any],
+    key_fn: Callable[[Any], Tuple],
+    params: PageParams,
+    descending: bool = False,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    对已按 key_fn 排好序的内存列表做 keyset 分页，返回 (当前页, next_cursor)。
+    """
+    if params.cursor:
+        sample = key_fn(items[0]) if items else ()
+        after = decode_cursor(params.cursor, len(sample)) if items else None
+        if after is not None:
+            if descending:
+                items = [it for it in items if key_fn(it) < after]
+            else:
+                items = [it for it in items if key_fn(it) > after]
+
+    if params.limit is None or len(items) <= params.limit:
+        return items, None
+    page = items[:params.limit]
+    return page, encode_cursor(key_fn(page[-1]))
+
+
+# ------------------------------------------------------------------
+# 响应构造
+# ------------------------------------------------------------------
+
+def ndjson_response(
+    rows: Iterable[Dict[str, Any]],
+    fields: Optional[List[str]] = None,
+    next_cursor: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    逐行输出 NDJSON。rows 可以是惰性生成器，服务端内存占用与结果集大小无关。
+    下一页游标通过 X-Next-Cursor 响应头返回。
+    """
+    def generate():
+        for row in rows:
+            yield json.dumps(project(row, fields), ensure_ascii=False, default=str) + "\n"
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+def projected_response(
+    response_model_instance,
+    fields: Optional[List[str]],
+) -> Any:
+    """
+    fields 为空时原样返回 Pydantic 响应；否则对 data 中每一项做字段投影后以 JSONResponse 返回
+    （跳过 response_model 校验，以便只输出部分字段）。
+    """
+    if not fields:
+        return response_model_instance
+    payload = response_model_instance.model_dump()
+    payload["data"] = [project(item, fields) for item in payload.get("data") or []]
+    return JSONResponse(content=payload)
@@ -0,0 +1,106 @@
+"""
+backend/api/routes/attachments.py
+
+附件预上传 API 路由。
+
+接口列表：
+  POST   /api/attachments                 - 上传附件（multipart，可多文件），立即开始后台处理，返回 attachment_id
+  GET    /api/attachments/{attachment_id} - 查询附件处理状态
+  DELETE /api/attachments/{attachment_id} - 删除附件
+
+发送消息时在请求体中用 attachment_ids 引用已上传的附件，替代 base64 内联的 images / log_file。
+"""
+
+import logging
+from typing import List
+from fastapi import APIRouter, File, HTTPException, UploadFile
+
+from backend.api.models.response import AttachmentInfo, AttachmentResponse, AttachmentUploadResponse, BaseResponse
+from backend.core.attachments import MAX_FILES_PER_UPLOAD, AttachmentError, get_attachment_store
+from backend.core.executors import run_blocking, OCR
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/attachments", tags=["附件"])
+
+
+# ---------------------------------------------------------------
+# POST /api/attachments — 上传附件
+# ---------------------------------------------------------------
+
+@router.post(
+    "",
+    response_model=AttachmentUploadResponse,
+    status_code=201,
+    summary="上传附件",
+    description=(
+        "以 multipart/form-data 上传图片或日志文件（字段名 files，可多个）。"
+        "文件分块写入临时目录后立即开始后台处理（图片 OCR / 日志摘要），"
+        "返回的 attachment_id 可在发送消息时通过 attachment_ids 引用。"
+    ),
+)
+async def upload_attachments(files: List[UploadFile] = File(..., description="图片或 .log / .txt 日志文件")):
+    try:
+        if len(files) > MAX_FILES_PER_UPLOAD:
+            raise HTTPException(status_code=400, detail=f"单次最多上传 {MAX_FILES_PER_UPLOAD} 个文件")
+
+        store = get_attachment_store()
+        uploaded = []
+        for upload in files:
+            try:
+                attachment = await run_blocking(
+                    OCR, store.save, upload.file,
+                    upload.filename or "", upload.content_type or "",
+                )
+            except AttachmentError as e:
+                # 已上传的附件一并撤销，保持整个请求的原子性
+                for item in uploaded:
+                    store.delete(item.attachment_id)
+                raise HTTPException(status_code=400, detail=str(e))
+            finally:
+                await upload.close()
+            uploaded.append(attachment)
+
+        return AttachmentUploadResponse(
+            success=True,
+            message=f"已上传 {len(uploaded)} 个附件",
+            data=[AttachmentInfo(**a.info()) for a in uploaded],
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"上传附件失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"上传附件失败: {str(e)}")
+
+
+# ---------------------------------------------------------------
+# GET /api/attachments/{attachment_id} — 查询附件状态
+# ---------------------------------------------------------------
+
+@router.get(
+    "/{attachment_id}",
+    response_model=AttachmentResponse,
+    summary="查询附件状态",
+    description="返回附件的类型、大小及处理状态（processing / ready）。",
+)
+def get_attachment(attachment_id: str):
+    attachment = get_attachment_store().get(attachment_id)
+    if attachment is None:
+        raise HTTPException(status_code=404, detail=f"附件 '{attachment_id}' 不存在或已过期")
+    return AttachmentResponse(success=True, data=AttachmentInfo(**attachment.info()))
+
+
+# ---------------------------------------------------------------
+# DELETE /api/attachments/{attachment_id} — 删除附件
+# ---------------------------------------------------------------
+
+@router.delete(
+    "/{attachment_id}",
+    response_model=BaseResponse,
+    summary="删除附件",
+    description="删除已上传的附件（用户在发送前移除附件时调用），未完成的处理会被取消。",
+)
+def delete_attachment(attachment_id: str):
+    if not get_attachment_store().delete(attachment_id):
+        raise HTTPException(status_code=404, detail=f"附件 '{attachment_id}' 不存在或已过期")
+    return BaseResponse(success=True, message="已删除")
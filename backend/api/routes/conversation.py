@@ -4,21 +4,26 @@ backend/api/routes/conversation.py
 会话管理及 AI 对话相关 API 路由。
 
 接口列表：
-  GET    /api/conversations                                  - 列出所有会话
+  GET    /api/conversations                                  - 列出所有会话（支持游标分页 / 字段投影 / NDJSON）
   POST   /api/conversations                                  - 创建新会话
   GET    /api/conversations/{session_id}                     - 获取会话详情
   GET    /api/conversations/{session_id}/history             - 获取会话消息历史
   POST   /api/conversations/{session_id}/messages            - 发送消息（AI 对话）
-  POST   /api/conversations/{session_id}/messages/stream     - 发送消息（SSE 流式）
+  POST   /api/conversations/{session_id}/messages/stream     - 发送消息（SSE 流式，支持 Last-Event-ID 续传）
+  POST   /api/conversations/{session_id}/runs                - 提交后台对话运行
+  GET    /api/conversations/{session_id}/runs/{run_id}       - 查询对话运行状态与结果
+  GET    /api/conversations/{session_id}/runs/{run_id}/events - 订阅对话运行事件（SSE，可多端共享）
+  DELETE /api/conversations/{session_id}/runs/{run_id}       - 取消对话运行
   DELETE /api/conversations/{session_id}/history             - 清空会话历史
   DELETE /api/conversations/{session_id}                     - 删除会话
 """
 
-import json
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
 from fastapi.responses import StreamingResponse
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
 from backend.api.models.request import CreateSessionRequest, SendMessageRequest, RenameSessionRequest
 from backend.api.models.response import (
@@ -28,9 +33,24 @@ from backend.api.models.response import (
     SessionHistoryResponse,
     MessageItem,
     ChatResponse,
+    ChatRunInfo,
+    ChatRunResponse,
     BaseResponse,
 )
+from backend.api.pagination import (
+    PageParams,
+    page_params,
+    parse_fields,
+    paginate_sorted,
+    ndjson_response,
+    projected_response,
+)
+from backend.api.sse import SSE_DONE, SSE_HEADERS, pump_events
 from backend.config import settings
+from backend.core.concurrency import ConcurrencyLimitExceeded, get_agent_limiter
+from backend.core.executors import run_blocking, OCR, SQLITE
+from backend.core.stream_buffer import CANCELLED, DONE, get_stream_buffer
+from backend.core.chat_runs import ChatRunManager, ChatRunStore, RunQueueFull, QUEUED, RUNNING
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +63,9 @@ router = APIRouter(prefix="/conversations", tags=["会话管理"])
 _agent_executor = None
 _conv_manager = None
 _summary_llm = None
+_history_summary_llm = None
+_title_queue = None
+_chat_run_manager = None
 
 
 DEFAULT_SESSION_NAME = "新的聊天"
@@ -64,17 +87,79 @@ def _get_summary_llm():
                 anthropic_api_key=settings.ANTHROPIC_AUTH_TOKEN,
                 anthropic_api_url=settings.ANTHROPIC_BASE_URL or None,
                 max_tokens=64,
-                timeout=30,
+                timeout=settings.TITLE_GENERATION_TIMEOUT,
             )
         else:
             _summary_llm = ChatDeepSeek(
                 model="deepseek-chat",
                 temperature=0.3,
                 max_tokens=64,
+                timeout=settings.TITLE_GENERATION_TIMEOUT,
+                max_retries=1,
+            )
+    return _summary_llm
+
+
+# 历史摘要输出上限 / 每条待压缩消息截取的最大字符数
+HISTORY_SUMMARY_MAX_TOKENS = 1024
+HISTORY_SUMMARY_MESSAGE_CHARS = 2000
+
+
+def _get_history_summary_llm():
+    """获取或初始化用于压缩会话历史的 LLM（单例，无工具）"""
+    global _history_summary_llm
+    if _history_summary_llm is None:
+        from langchain_deepseek import ChatDeepSeek
+        from langchain_anthropic import ChatAnthropic
+
+        if settings.LLM_PROVIDER == "claude":
+            if not settings.ANTHROPIC_AUTH_TOKEN:
+                raise ValueError("ANTHROPIC_AUTH_TOKEN 未在 .env 中配置")
+            _history_summary_llm = ChatAnthropic(
+                model=settings.CLAUDE_MODEL,
+                anthropic_api_key=settings.ANTHROPIC_AUTH_TOKEN,
+                anthropic_api_url=settings.ANTHROPIC_BASE_URL or None,
+                max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+                timeout=settings.LLM_TIMEOUT,
+            )
+        else:
+            _history_summary_llm = ChatDeepSeek(
+                model="deepseek-chat",
+                temperature=0.1,
+                max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
                 timeout=settings.LLM_TIMEOUT,
                 max_retries=2,
             )
-    return _summary_llm
+    return _history_summary_llm
+
+
+def _summarize_history(previous_summary: str, messages: list) -> str:
+    """将较早的对话增量合并进已有摘要，返回新摘要（在后台线程中调用）。"""
+    from langchain_core.messages import SystemMessage
+    from backend.core.token_utils import content_to_text
+
+    lines = []
+    for msg in messages:
+        role = "用户" if isinstance(msg, HumanMessage) else "助手"
+        text = content_to_text(msg.content).strip()
+        if len(text) > HISTORY_SUMMARY_MESSAGE_CHARS:
+            text = text[:HISTORY_SUMMARY_MESSAGE_CHARS] + " ...（已截断）"
+        lines.append(f"【{role}】{text}")
+
+    llm = _get_history_summary_llm()
+    resp = llm.invoke([
+        SystemMessage(
+            content=(
+                "你负责维护一段多轮对话的滚动摘要。请将【新增对话】合并进【已有摘要】，输出更新后的完整摘要。"
+                "保留后续对话可能用到的关键信息：涉及的表名/字段名、SQL、代码位置、结论和未解决的问题；"
+                "省略寒暄和重复内容。只输出摘要正文，不超过 600 字。"
+            )
+        ),
+        HumanMessage(
+            content=f"【已有摘要】\n{previous_summary or '（无）'}\n\n【新增对话】\n" + "\n".join(lines)
+        ),
+    ])
+    return content_to_text(resp.content).strip()
 
 
 def _generate_session_title(user_msg: str, ai_reply: str) -> str | None:
@@ -126,48 +211,143 @@ def _generate_session_title(user_msg: str, ai_reply: str) -> str | None:
         return None
 
 
-def _build_message_with_attachments(body) -> str:
+def _get_title_queue():
+    """获取或初始化会话标题生成的后台队列（单例）"""
+    global _title_queue
+    if _title_queue is None:
+        from backend.core.task_queue import BoundedTaskQueue
+        _title_queue = BoundedTaskQueue(
+            "session-title",
+            max_workers=settings.TITLE_GENERATION_WORKERS,
+            max_pending=settings.TITLE_GENERATION_QUEUE_SIZE,
+            max_wait=settings.TITLE_GENERATION_TIMEOUT,
+        )
+    return _title_queue
+
+
+def title_queue_stats() -> dict:
+    """标题生成队列指标（队列未初始化时为空）。"""
+    return _title_queue.stats() if _title_queue is not None else {}
+
+
+def _title_pending(session_id: str) -> bool:
+    """会话标题是否正在后台生成（供客户端轮询）。"""
+    return _title_queue is not None and _title_queue.is_pending(session_id)
+
+
+def _apply_session_title(conv_manager, session_id: str, user_msg: str, ai_reply: str) -> None:
+    new_title = _generate_session_title(user_msg, ai_reply)
+    if not new_title:
+        return
+    session = conv_manager.sessions.get(session_id)
+    # 生成期间用户可能已手动重命名
+    if session and session.name == DEFAULT_SESSION_NAME:
+        conv_manager.rename_session(session_id, new_title)
+
+
+def _schedule_session_title(conv_manager, session, user_msg: str, ai_reply: str) -> bool:
+    """
+    若会话名仍为默认值且为首轮回复（消息数==2），在后台生成标题，不阻塞当前回复。
+    返回是否已排队。
+    """
+    if session.message_count() != 2 or session.name != DEFAULT_SESSION_NAME:
+        return False
+    return _get_title_queue().submit(
+        session.session_id, _apply_session_title,
+        conv_manager, session.session_id, user_msg, ai_reply,
+    )
+
+
+def _build_message_with_attachments(body, uploaded: Optional[List[dict]] = None) -> str:
     """
-    处理请求体中的附件内容，将图片 OCR 和日志文本统一拼接到消息中。
+    处理请求体中的附件内容，将图片 OCR 和日志文本统一拼接到消息中；
+    附件中含 Java 堆栈时，附上代码索引中对应方法的代码。
     返回最终要发送给 LLM 的纯文本消息。
+
+    Args:
+        body: 请求体（images / log_file 为 base64 内联附件）
+        uploaded: 通过 attachment_ids 引用的预上传附件的处理结果 [{kind, filename, text}]
     """
+    from backend.core.attachments import IMAGE
+
+    uploaded = uploaded or []
     message = body.message or ""
     parts = [message] if message else []
-
-    if body.images:
-        from backend.core.ocr_service import process_images
-
-        images_data = [img.model_dump() for img in body.images]
-        ocr_text = process_images(images_data)
+    attachment_texts = []
+
+    uploaded_images = [(a["filename"], a["text"]) for a in uploaded if a["kind"] == IMAGE]
+    if body.images or uploaded_images:
+        from backend.core.ocr_service import format_ocr_results, process_images
+
+        ocr_parts = []
+        if body.images:
+            images_data = [img.model_dump() for img in body.images]
+            ocr_parts.append(process_images(images_data))
+        if uploaded_images:
+            ocr_parts.append(format_ocr_results(uploaded_images))
+        ocr_text = "\n\n".join(p for p in ocr_parts if p)
         if ocr_text:
             parts.append(f"---\n[附件图片OCR识别结果]\n{ocr_text}")
+            attachment_texts.append(ocr_text)
 
+    log_files = []
     if body.log_file:
         from backend.core.log_file_service import process_log_file
 
         log_file_data = body.log_file.model_dump()
-        log_text = process_log_file(log_file_data)
+        log_files.append((body.log_file.filename or "log.txt", process_log_file(log_file_data)))
+    log_files.extend((a["filename"] or "log.txt", a["text"]) for a in uploaded if a["kind"] != IMAGE)
+    for filename, log_text in log_files:
         if log_text:
-            filename = body.log_file.filename or "log.txt"
             parts.append(f"---\n[附件日志: {filename}]\n```\n{log_text}\n```")
+            attachment_texts.append(log_text)
 
-    if not parts and (body.images or body.log_file):
+    if attachment_texts:
+        from backend.core.stack_frames import build_stack_context
+
+        stack_context = build_stack_context(attachment_texts)
+        if stack_context:
+            parts.append(f"---\n[堆栈相关代码（已根据附件中的堆栈帧从代码索引中定位，> 标记为堆栈所在行）]\n{stack_context}")
+
+    has_attachments = bool(body.images or body.log_file or uploaded)
+    if not parts and has_attachments:
         parts.append("请分析以下附件内容")
 
-    elif (body.images or body.log_file) and not message:
+    elif has_attachments and not message:
         parts.insert(0, "请分析以下附件内容")
 
     return "\n\n".join(parts)
 
 
+async def _prepare_message(body) -> str:
+    """
+    等待引用的预上传附件处理完成，再在附件处理线程池中拼接最终消息。
+    引用的附件不存在或已过期时返回 400。
+    """
+    uploaded = []
+    if body.attachment_ids:
+        from backend.core.attachments import AttachmentError, get_attachment_store
+        try:
+            uploaded = await get_attachment_store().collect(body.attachment_ids)
+        except AttachmentError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return await run_blocking(OCR, _build_message_with_attachments, body, uploaded)
+
+
 def _get_conv_manager():
     """获取或初始化会话管理器（单例）"""
     global _conv_manager
     if _conv_manager is None:
         from backend.core.conversation_manager import ConversationManager
         _conv_manager = ConversationManager(
-            persist_path=settings.CONVERSATION_PERSIST_PATH,
+            db_path=settings.CONVERSATION_DB_PATH,
             max_messages_per_session=settings.MAX_MESSAGES_PER_SESSION,
+            legacy_json_path=settings.CONVERSATION_PERSIST_PATH,
+            cache_size=settings.SESSION_CACHE_SIZE,
+            token_budget=settings.HISTORY_TOKEN_BUDGET,
+            summarizer=_summarize_history,
+            summary_threshold=settings.HISTORY_SUMMARY_THRESHOLD,
+            summary_keep_messages=settings.HISTORY_SUMMARY_KEEP_MESSAGES,
         )
     return _conv_manager
 
@@ -185,6 +365,8 @@ def _get_agent():
             TableSchemaTool,
             SearchTablesTool,
             RelationshipTool,
+            JoinPathTool,
+            JoinSQLTool,
             ExecuteSQLTool,
         )
         from backend.core.code_tools import (
@@ -231,6 +413,8 @@ def _get_agent():
             TableSchemaTool(),
             SearchTablesTool(),
             RelationshipTool(),
+            JoinPathTool(),
+            JoinSQLTool(),
             ExecuteSQLTool(),
             # 代码工具
             SearchCodeTool(),
@@ -257,7 +441,9 @@ def _get_agent():
 - `get_table_schema`: 获取指定表的详细 schema（列、类型、注释）
 - `search_tables`: 语义搜索相关表
 - `find_relationships`: 查找表的外键关系
-- `execute_sql`: 在 MySQL 或 Oracle 上执行 SQL 查询
+- `find_join_path`: 一次调用查询两表之间的最短外键关联路径，或某表的 k 跳关联邻域
+- `get_join_sql`: 获取连接两表的 SELECT/JOIN SQL 骨架（已预计算列清单和 ON 条件）
+- `execute_sql`: 在 MySQL 或 Oracle 上执行 SQL 查询（缺少行数限制时自动追加；成本过高的查询会被拒绝，需与用户确认后才能以 confirm=true 重新执行）
 
 ## 2. 代码工具
 - `search_code`: 语义搜索代码片段（类、方法、模板等），支持中文查询
@@ -281,9 +467,11 @@ def _get_agent():
 3. 对于精确搜索（icon 名、CSS class、变量名等），使用 `grep_code`
 4. 对于配置问题（数据库连接、端口号等），使用 `config_lookup`
 5. 对于跨层追踪（如"某个表被哪些代码使用"），使用链路追踪工具
-6. 执行 SQL 前，先确认表结构和数据库类型
-7. 限制查询结果数量（如 LIMIT 5）避免输出过多
-8. 使用用户的语言（中文/英文）回复"""
+6. 需要确认多表如何关联时，直接使用 `find_join_path`，不要逐跳调用 `find_relationships`
+7. 编写多表查询时，先用 `get_join_sql` 获取 JOIN 骨架再按需裁剪列和条件
+8. 执行 SQL 前，先确认表结构和数据库类型
+9. 限制查询结果数量（如 LIMIT 5）避免输出过多
+10. 使用用户的语言（中文/英文）回复"""
         )
 
         _agent_executor = create_agent(llm, tools, system_prompt=system_message)
@@ -302,6 +490,7 @@ def _session_to_info(session_id: str, conv_manager, is_current: bool) -> Session
         created_at=session.created_at,
         updated_at=session.updated_at,
         is_current=is_current,
+        title_pending=_title_pending(session_id),
     )
 
 
@@ -313,24 +502,46 @@ def _session_to_info(session_id: str, conv_manager, is_current: bool) -> Session
     "",
     response_model=ListSessionsResponse,
     summary="列出所有会话",
-    description="返回所有对话会话的列表，按最后更新时间降序排列。",
+    description=(
+        "返回所有对话会话的列表，按最后更新时间降序排列。"
+        "支持 cursor/limit 游标分页、fields 字段投影，format=ndjson 时以 NDJSON 流式返回。"
+    ),
 )
-def list_sessions():
+def list_sessions(page: PageParams = Depends(page_params)):
     try:
+        fields = parse_fields(page.fields, SessionInfo.model_fields)
         conv_manager = _get_conv_manager()
-        sessions_data = conv_manager.list_sessions()
-        sessions = [SessionInfo(**s) for s in sessions_data]
-        return ListSessionsResponse(
-            success=True,
-            message="获取成功",
-            data=sessions,
-            total=len(sessions),
+        sessions = [
+            SessionInfo(**s, title_pending=_title_pending(s["session_id"]))
+            for s in conv_manager.list_sessions()
+        ]
+        sessions.sort(key=_session_sort_key, reverse=True)
+        total = len(sessions)
+        sessions, next_cursor = paginate_sorted(sessions, _session_sort_key, page, descending=True)
+
+        if page.streaming:
+            return ndjson_response((s.model_dump() for s in sessions), fields, next_cursor)
+        return projected_response(
+            ListSessionsResponse(
+                success=True,
+                message="获取成功",
+                data=sessions,
+                total=total,
+                next_cursor=next_cursor,
+            ),
+            fields,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"list_sessions error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _session_sort_key(session: SessionInfo):
+    return (session.updated_at, session.session_id)
+
+
 # ---------------------------------------------------------------
 # 创建新会话
 # ---------------------------------------------------------------
@@ -391,6 +602,7 @@ def rename_session(session_id: str, body: RenameSessionRequest):
             created_at=session.created_at,
             updated_at=session.updated_at,
             is_current=session_id == conv_manager.current_session_id,
+            title_pending=_title_pending(session_id),
         )
         return SessionDetailResponse(success=True, message="会话已重命名", data=info)
     except HTTPException:
@@ -424,6 +636,7 @@ def get_session(session_id: str):
             created_at=session.created_at,
             updated_at=session.updated_at,
             is_current=session_id == conv_manager.current_session_id,
+            title_pending=_title_pending(session_id),
         )
         return SessionDetailResponse(success=True, message="获取成功", data=info)
     except HTTPException:
@@ -480,79 +693,108 @@ def get_session_history(session_id: str):
 # 发送消息（AI 对话）
 # ---------------------------------------------------------------
 
+async def _acquire_session_or_409(conv_manager, session_id: str):
+    """
+    在占用 Agent 并发名额之前获取会话锁：等待同一会话的上一轮对话时不占用全局名额，
+    超过 SESSION_BUSY_TIMEOUT 秒返回 409。
+    """
+    try:
+        session = await conv_manager.acquire_session_async(session_id, timeout=settings.SESSION_BUSY_TIMEOUT)
+    except TimeoutError:
+        raise HTTPException(
+            status_code=409,
+            detail=f"会话 '{session_id}' 正在处理上一条消息，请稍后重试",
+            headers={"Retry-After": "5"},
+        )
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"会话 '{session_id}' 不存在")
+    return session
+
+
 @router.post(
     "/{session_id}/messages",
     response_model=ChatResponse,
     summary="发送消息（AI 对话）",
-    description="向指定会话发送一条消息，由 AI Agent 处理并返回回复。此接口会将消息追加到会话历史中。",
+    description=(
+        "向指定会话发送一条消息，由 AI Agent 处理并返回回复。此接口会将消息追加到会话历史中。"
+        "同时执行的对话数超过上限且排队已满（或排队超时）时返回 503；"
+        "同一会话的上一条消息仍在处理且等待超过 SESSION_BUSY_TIMEOUT 秒时返回 409。"
+    ),
 )
-def send_message(session_id: str, body: SendMessageRequest):
+async def send_message(session_id: str, body: SendMessageRequest):
     try:
         conv_manager = _get_conv_manager()
-        session = conv_manager.sessions.get(session_id)
-        if not session:
+        if session_id not in conv_manager.sessions:
             raise HTTPException(status_code=404, detail=f"会话 '{session_id}' 不存在")
 
-        # 切换到目标会话
-        conv_manager.switch_session(session_id)
-
-        # 处理附件内容（图片 OCR / 日志文本）
-        final_message = _build_message_with_attachments(body)
+        # 处理附件内容（图片 OCR / 日志文本 / 预上传附件），在 OCR 专用线程池中执行
+        final_message = await _prepare_message(body)
         if not final_message.strip():
             raise HTTPException(status_code=400, detail="消息内容不能为空")
 
-        # 先保存用户消息（防止 Agent 超时/失败后消息丢失）
-        conv_manager.add_user_message(final_message)
-
-        # 获取历史（已包含刚保存的用户消息）
-        messages_to_send = conv_manager.get_history()
-
-        # 调用 Agent
+        # 同一会话的请求串行处理，不同会话并行；先获取会话锁再排队占用并发名额
+        session = await _acquire_session_or_409(conv_manager, session_id)
         try:
-            agent = _get_agent()
-            response = agent.invoke({"messages": messages_to_send})
-        except Exception as e:
-            logger.error(f"Agent 调用失败: {e}")
-            raise HTTPException(
-                status_code=504,
-                detail=f"AI 响应超时或调用失败，您的消息已保存，请稍后重试。错误: {e}",
-            )
-
-        ai_msg = response["messages"][-1]
+            async with get_agent_limiter().slot():
+                # 先保存用户消息（防止 Agent 超时/失败后消息丢失）
+                await run_blocking(SQLITE, conv_manager.add_user_message, final_message, session_id=session_id)
 
-        # Claude 启用思考模式或工具调用时，content 可能是 blocks 列表
-        # 需要提取其中的 text 块作为最终回复（丢弃 thinking 块）
-        raw_content = ai_msg.content
-        if isinstance(raw_content, str):
-            assistant_content = raw_content
-        elif isinstance(raw_content, list):
-            text_parts = []
-            for block in raw_content:
-                if isinstance(block, dict) and block.get("type") == "text":
-                    text_parts.append(block.get("text", ""))
-                elif isinstance(block, str):
-                    text_parts.append(block)
-            assistant_content = "".join(text_parts)
-        else:
-            assistant_content = str(raw_content)
+                # 获取历史（已包含刚保存的用户消息）
+                messages_to_send = conv_manager.get_history(session_id)
 
-        # 保存 AI 回复
-        conv_manager.add_ai_message(AIMessage(content=assistant_content))
+                # 调用 Agent（异步，等待 LLM 期间不占用线程；工具在各自的专用线程池中执行）
+                try:
+                    agent = _get_agent()
+                    response = await agent.ainvoke({"messages": messages_to_send})
+                except Exception as e:
+                    logger.error(f"Agent 调用失败: {e}")
+                    raise HTTPException(
+                        status_code=504,
+                        detail=f"AI 响应超时或调用失败，您的消息已保存，请稍后重试。错误: {e}",
+                    )
+
+                ai_msg = response["messages"][-1]
+
+                # Claude 启用思考模式或工具调用时，content 可能是 blocks 列表
+                # 需要提取其中的 text 块作为最终回复（丢弃 thinking 块）
+                raw_content = ai_msg.content
+                if isinstance(raw_content, str):
+                    assistant_content = raw_content
+                elif isinstance(raw_content, list):
+                    text_parts = []
+                    for block in raw_content:
+                        if isinstance(block, dict) and block.get("type") == "text":
+                            text_parts.append(block.get("text", ""))
+                        elif isinstance(block, str):
+                            text_parts.append(block)
+                    assistant_content = "".join(text_parts)
+                else:
+                    assistant_content = str(raw_content)
+
+                # 保存 AI 回复
+                await run_blocking(
+                    SQLITE, conv_manager.add_ai_message, AIMessage(content=assistant_content), session_id=session_id
+                )
 
-        # 若会话名仍为默认值，且为首轮回复（消息数==2），则自动总结标题
-        if session.message_count() == 2 and session.name == DEFAULT_SESSION_NAME:
-            new_title = _generate_session_title(final_message, assistant_content)
-            if new_title:
-                conv_manager.rename_session(session_id, new_title)
+                # 首轮回复后在后台生成会话标题
+                title_pending = _schedule_session_title(
+                    conv_manager, session, final_message, assistant_content
+                )
+        finally:
+            conv_manager.release_session(session_id)
 
         return ChatResponse(
             success=True,
             message="对话成功",
             session_id=session_id,
             reply=assistant_content,
+            title_pending=title_pending,
         )
     except HTTPException:
         raise
+    except ConcurrencyLimitExceeded as e:
+        logger.warning(f"send_message rejected: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"send_message error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -562,91 +804,346 @@ def send_message(session_id: str, body: SendMessageRequest):
 # 发送消息（SSE 流式响应）
 # ---------------------------------------------------------------
 
+def _message_text(message) -> str:
+    """提取消息的文本内容；content 可能是 str（无工具场景）或 list（Anthropic content blocks）。"""
+    if isinstance(message.content, str):
+        return message.content
+    text = ""
+    if isinstance(message.content, list):
+        for block in message.content:
+            if isinstance(block, dict) and block.get("type") == "text":
+                text += block.get("text", "")
+            elif isinstance(block, str):
+                text += block
+    return text
+
+
+async def _produce_stream_events(conv_manager, session, session_id: str, final_message: str, run):
+    """
+    流式 Agent 运行：把回复文本片段和工具调用进度发布到 run。
+    结束（包括无人订阅导致的取消）时保存已生成的回复，并提交标题生成。
+    """
+    full_content = ""
+    try:
+        # 保存用户消息，获取历史（已包含刚保存的用户消息）
+        await run_blocking(SQLITE, conv_manager.add_user_message, final_message, session_id=session_id)
+        messages_to_send = conv_manager.get_history(session_id)
+
+        agent = _get_agent()
+        logger.info(f"[Stream] 开始流式调用 session={session_id}")
+        async for event, metadata in agent.astream(
+            {"messages": messages_to_send},
+            stream_mode="messages",
+        ):
+            # 工具执行完成
+            if isinstance(event, ToolMessage):
+                status = "error" if getattr(event, "status", None) == "error" else "done"
+                run.publish({"tool": {"name": event.name or "", "status": status}})
+                continue
+            # 只输出 AIMessage 的文本 content（跳过 HumanMessage 等）
+            if not isinstance(event, AIMessage):
+                continue
+            # 工具调用：首个分片带有工具名，输出 running 进度，不输出参数
+            tool_chunks = getattr(event, "tool_call_chunks", None) or event.tool_calls
+            if tool_chunks:
+                for chunk in tool_chunks:
+                    if chunk.get("name"):
+                        run.publish({"tool": {"name": chunk["name"], "status": "running"}})
+                continue
+
+            token = _message_text(event)
+            if token:
+                full_content += token
+                run.publish({"content": token})
+        logger.info(f"[Stream] 流式完成 session={session_id}, length={len(full_content)}")
+    except asyncio.CancelledError:
+        logger.info(f"[Stream] Agent 运行已取消 session={session_id}, length={len(full_content)}")
+        raise
+    except Exception as e:
+        logger.error(f"[Stream] error: {e}", exc_info=True)
+        run.publish({"error": str(e)})
+    finally:
+        # 保存已生成的回复（断开时为部分回复）
+        if full_content:
+            try:
+                await run_blocking(
+                    SQLITE, conv_manager.add_ai_message, AIMessage(content=full_content), session_id=session_id
+                )
+                # 首轮回复后在后台生成会话标题（客户端通过 title_pending 轮询）
+                _schedule_session_title(conv_manager, session, final_message, full_content)
+            except Exception as e:
+                logger.warning(f"[Stream] 保存回复失败: {e}")
+
+
+async def _run_stream_turn(conv_manager, session, final_message: str, run):
+    """
+    一次流式对话的完整运行：限流排队后运行 Agent，错误以事件形式发布到 run。
+    会话锁由调用方在创建任务前获取，任务结束（含取消）时由任务的完成回调释放。
+    """
+    session_id = session.session_id
+    try:
+        async with get_agent_limiter().slot():
+            await _produce_stream_events(conv_manager, session, session_id, final_message, run)
+    except ConcurrencyLimitExceeded as e:
+        logger.warning(f"[Stream] rejected: {e}")
+        run.publish({"error": str(e)})
+
+
 @router.post(
     "/{session_id}/messages/stream",
     summary="发送消息（SSE 流式）",
-    description="向指定会话发送一条消息，AI Agent 以 SSE 流式逐 token 返回回复。",
+    description=(
+        "向指定会话发送一条消息，AI Agent 以 SSE 流式返回回复。"
+        "文本片段按 SSE_FLUSH_INTERVAL_MS 合并输出，工具调用以 tool 事件报告进度，空闲时发送心跳注释。"
+        "每帧带 id（<run_id>:<seq>）；连接中断后带 Last-Event-ID 请求头重新调用本接口（请求体可为空），"
+        "会补发缺失的事件并继续接收同一次运行的输出，而不是重新运行 Agent。"
+        "所有连接断开超过 STREAM_RESUME_GRACE 秒后取消 Agent 运行，已生成的部分回复会保存。"
+        "同一会话的上一条消息仍在处理且等待超过 SESSION_BUSY_TIMEOUT 秒时返回 409。"
+    ),
 )
-async def send_message_stream(session_id: str, body: SendMessageRequest):
+async def send_message_stream(
+    session_id: str,
+    body: SendMessageRequest,
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
     conv_manager = _get_conv_manager()
-    session = conv_manager.sessions.get(session_id)
-    if not session:
+    if session_id not in conv_manager.sessions:
         raise HTTPException(status_code=404, detail=f"会话 '{session_id}' 不存在")
 
-    # 切换到目标会话
-    conv_manager.switch_session(session_id)
-
-    # 处理附件内容（图片 OCR / 日志文本）
-    final_message = _build_message_with_attachments(body)
-    if not final_message.strip():
-        raise HTTPException(status_code=400, detail="消息内容不能为空")
+    stream_buffer = get_stream_buffer()
+    if last_event_id:
+        # 断线续传：补发 Last-Event-ID 之后的事件，run 仍在运行时继续接收实时输出
+        run, after_seq = await stream_buffer.resume(last_event_id)
+        if run is None or run.session_id != session_id:
+            raise HTTPException(status_code=404, detail=f"流式记录 '{last_event_id}' 不存在或已过期")
+    else:
+        # 处理附件内容（图片 OCR / 日志文本 / 预上传附件），在 OCR 专用线程池中执行
+        final_message = await _prepare_message(body)
+        if not final_message.strip():
+            raise HTTPException(status_code=400, detail="消息内容不能为空")
 
-    # 保存用户消息
-    conv_manager.add_user_message(final_message)
+        # 同一会话的请求串行处理：先获取会话锁（不占用 Agent 并发名额），忙时返回 409
+        session = await _acquire_session_or_409(conv_manager, session_id)
 
-    # 获取历史（已包含刚保存的用户消息）
-    messages_to_send = conv_manager.get_history()
+        # Agent 在独立任务中运行，与 SSE 连接解耦；结束（含取消，即使任务尚未开始执行）时
+        # 释放会话锁并标记 run 结束
+        try:
+            run = stream_buffer.create(session_id)
+            run.task = asyncio.create_task(_run_stream_turn(conv_manager, session, final_message, run))
+        except BaseException:
+            conv_manager.release_session(session_id)
+            raise
+        run.task.add_done_callback(lambda t: conv_manager.release_session(session_id))
+        run.task.add_done_callback(lambda t: run.finish(CANCELLED if t.cancelled() else DONE))
+        after_seq = 0
 
     async def event_generator():
-        full_content = ""
-        try:
-            agent = _get_agent()
-            logger.info(f"[Stream] 开始流式调用 session={session_id}")
-            async for event, metadata in agent.astream(
-                {"messages": messages_to_send},
-                stream_mode="messages",
-            ):
-                # 只输出 AIMessage 的文本 content（跳过 tool_call、HumanMessage、ToolMessage 等）
-                if not isinstance(event, AIMessage):
-                    continue
-                if event.tool_calls:
-                    continue
-
-                # 提取文本 token
-                # content 可能是 str（无工具场景）或 list（有工具场景，Anthropic 返回 content blocks）
-                token = ""
-                if isinstance(event.content, str):
-                    token = event.content
-                elif isinstance(event.content, list):
-                    for block in event.content:
-                        if isinstance(block, dict) and block.get("type") == "text":
-                            token += block.get("text", "")
-                        elif isinstance(block, str):
-                            token += block
-
-                if token:
-                    full_content += token
-                    yield f"data: {json.dumps({'content': token}, ensure_ascii=False)}\n\n"
-            logger.info(f"[Stream] 流式完成 session={session_id}, length={len(full_content)}")
-        except Exception as e:
-            logger.error(f"[Stream] error: {e}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
-        finally:
-            # 保存完整 AI 回复
-            if full_content:
-                conv_manager.add_ai_message(AIMessage(content=full_content))
-                # 若会话名仍为默认值，且为首轮回复（消息数==2），则自动总结标题
-                try:
-                    cur = conv_manager.sessions.get(session_id)
-                    if cur and cur.message_count() == 2 and cur.name == DEFAULT_SESSION_NAME:
-                        new_title = _generate_session_title(final_message, full_content)
-                        if new_title:
-                            conv_manager.rename_session(session_id, new_title)
-                except Exception as e:
-                    logger.warning(f"[Stream] 自动总结标题失败: {e}")
-            yield "data: [DONE]\n\n"
-
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
+        async for frame in pump_events(
+            request,
+            run,
+            after_seq,
+            flush_interval=settings.SSE_FLUSH_INTERVAL_MS / 1000,
+            heartbeat_interval=settings.SSE_HEARTBEAT_INTERVAL,
+        ):
+            yield frame
+        if run.finished:
+            yield SSE_DONE
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ---------------------------------------------------------------
+# 后台对话运行（与请求生命周期解耦）
+# ---------------------------------------------------------------
+
+async def _execute_chat_run(record: dict, stream_run) -> None:
+    """
+    ChatRunManager 的执行函数：获取会话锁后运行 Agent，事件发布到 stream_run。
+    等待会话锁超过 CHAT_RUN_SESSION_TIMEOUT 秒时 run 以错误结束，不长期占用 worker。
+    """
+    conv_manager = _get_conv_manager()
+    session_id = record["session_id"]
+    try:
+        session = await conv_manager.acquire_session_async(session_id, timeout=settings.CHAT_RUN_SESSION_TIMEOUT)
+    except TimeoutError:
+        stream_run.publish({
+            "error": f"会话 {session_id} 正在处理其他消息，等待超过 {settings.CHAT_RUN_SESSION_TIMEOUT:g} 秒，请稍后重新提交"
+        })
+        return
+    if session is None:
+        stream_run.publish({"error": f"会话 {session_id} 不存在"})
+        return
+    try:
+        await _produce_stream_events(conv_manager, session, session_id, record["message"], stream_run)
+    finally:
+        conv_manager.release_session(session_id)
+
+
+def _get_chat_run_manager() -> ChatRunManager:
+    """获取或初始化对话运行管理器（单例）"""
+    global _chat_run_manager
+    if _chat_run_manager is None:
+        _chat_run_manager = ChatRunManager(
+            ChatRunStore(settings.STREAM_DB_PATH),
+            get_stream_buffer(),
+            handler=_execute_chat_run,
+            workers=settings.CHAT_RUN_WORKERS,
+            max_queue=settings.CHAT_RUN_QUEUE_SIZE,
+        )
+    return _chat_run_manager
+
+
+async def start_chat_runs() -> None:
+    """启动对话运行 worker，恢复上次退出时排队中的 run（应用启动时调用）。"""
+    await _get_chat_run_manager().start()
+
+
+async def stop_chat_runs() -> None:
+    if _chat_run_manager is not None:
+        await _chat_run_manager.stop()
+
+
+def chat_run_stats() -> dict:
+    """对话运行队列指标（未初始化时为空）。"""
+    return _chat_run_manager.stats() if _chat_run_manager is not None else {}
+
+
+def _run_to_info(record: dict, request: Request) -> ChatRunInfo:
+    output = record.get("output") or ""
+    # 运行中的输出取实时缓冲
+    if record["status"] in (QUEUED, RUNNING):
+        stream_run = get_stream_buffer().get(record["run_id"])
+        if stream_run is not None:
+            output = stream_run.text
+    return ChatRunInfo(
+        run_id=record["run_id"],
+        session_id=record["session_id"],
+        status=record["status"],
+        output=output,
+        error=record.get("error"),
+        created_at=record["created_at"],
+        started_at=record.get("started_at"),
+        finished_at=record.get("finished_at"),
+        events_url=str(request.app.url_path_for(
+            "subscribe_chat_run", session_id=record["session_id"], run_id=record["run_id"]
+        )),
     )
 
 
+async def _get_run_record(session_id: str, run_id: str) -> dict:
+    record = await _get_chat_run_manager().get(run_id)
+    if record is None or record["session_id"] != session_id:
+        raise HTTPException(status_code=404, detail=f"运行 '{run_id}' 不存在")
+    return record
+
+
+@router.post(
+    "/{session_id}/runs",
+    response_model=ChatRunResponse,
+    status_code=202,
+    summary="提交后台对话运行",
+    description=(
+        "向指定会话提交一条消息，由后台 worker 运行 Agent，接口立即返回 run_id。"
+        "运行不受 HTTP 连接影响；通过 GET runs/{run_id} 轮询结果，或订阅 runs/{run_id}/events 接收流式输出。"
+        "排队中的运行数达到 CHAT_RUN_QUEUE_SIZE 时返回 503。"
+    ),
+)
+async def create_chat_run(session_id: str, body: SendMessageRequest, request: Request):
+    try:
+        conv_manager = _get_conv_manager()
+        if session_id not in conv_manager.sessions:
+            raise HTTPException(status_code=404, detail=f"会话 '{session_id}' 不存在")
+
+        # 处理附件内容（图片 OCR / 日志文本 / 预上传附件），在 OCR 专用线程池中执行
+        final_message = await _prepare_message(body)
+        if not final_message.strip():
+            raise HTTPException(status_code=400, detail="消息内容不能为空")
+
+        record = await _get_chat_run_manager().submit(session_id, final_message)
+        return ChatRunResponse(success=True, message="已提交", data=_run_to_info(record, request))
+    except HTTPException:
+        raise
+    except RunQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error(f"create_chat_run error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/{session_id}/runs/{run_id}",
+    response_model=ChatRunResponse,
+    summary="查询对话运行",
+    description="返回对话运行的状态、AI 回复（运行中为已生成的部分）和错误信息。",
+)
+async def get_chat_run(session_id: str, run_id: str, request: Request):
+    try:
+        record = await _get_run_record(session_id, run_id)
+        return ChatRunResponse(success=True, message="获取成功", data=_run_to_info(record, request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"get_chat_run error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/{session_id}/runs/{run_id}/events",
+    summary="订阅对话运行事件（SSE）",
+    description=(
+        "以 SSE 输出对话运行的事件（与 /messages/stream 格式相同），从头补发已有事件后继续接收实时输出。"
+        "多个客户端可同时订阅同一运行；断开后带 Last-Event-ID 请求头重连即可续传，断开不会取消运行。"
+    ),
+)
+async def subscribe_chat_run(
+    session_id: str,
+    run_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
+    await _get_run_record(session_id, run_id)
+    if last_event_id and not last_event_id.startswith(f"{run_id}:"):
+        raise HTTPException(status_code=400, detail="Last-Event-ID 与运行 ID 不匹配")
+
+    run, after_seq = await get_stream_buffer().resume(last_event_id or f"{run_id}:0")
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"运行 '{run_id}' 的事件已过期")
+
+    async def event_generator():
+        async for frame in pump_events(
+            request,
+            run,
+            after_seq,
+            flush_interval=settings.SSE_FLUSH_INTERVAL_MS / 1000,
+            heartbeat_interval=settings.SSE_HEARTBEAT_INTERVAL,
+        ):
+            yield frame
+        if run.finished:
+            yield SSE_DONE
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.delete(
+    "/{session_id}/runs/{run_id}",
+    response_model=BaseResponse,
+    summary="取消对话运行",
+    description="取消排队中或运行中的对话运行；已生成的部分回复会保存到会话历史。",
+)
+async def cancel_chat_run(session_id: str, run_id: str):
+    try:
+        await _get_run_record(session_id, run_id)
+        if not await _get_chat_run_manager().cancel(run_id):
+            raise HTTPException(status_code=409, detail=f"运行 '{run_id}' 已结束")
+        return BaseResponse(success=True, message="已取消")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"cancel_chat_run error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ---------------------------------------------------------------
 # 清空会话历史
 # ---------------------------------------------------------------
@@ -664,8 +1161,7 @@ def clear_session_history(session_id: str):
         if not session:
             raise HTTPException(status_code=404, detail=f"会话 '{session_id}' 不存在")
 
-        session.clear()
-        conv_manager._save()
+        conv_manager.clear_session(session_id)
 
         return BaseResponse(success=True, message=f"会话 '{session.name}' 的历史已清空")
     except HTTPException:
@@ -5,7 +5,7 @@ backend/api/routes/knowledge.py
 
 接口列表：
   POST   /api/knowledge-sources              - 注册知识源
-  GET    /api/knowledge-sources              - 列出所有知识源
+  GET    /api/knowledge-sources              - 列出所有知识源（支持游标分页 / 字段投影 / NDJSON）
   GET    /api/knowledge-sources/{id}         - 知识源详情
   DELETE /api/knowledge-sources/{id}         - 删除知识源
   POST   /api/knowledge-sources/{id}/index   - 触发索引
@@ -15,7 +15,7 @@ backend/api/routes/knowledge.py
 
 import sqlite3
 import logging
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
 
 from backend.api.models.request import RegisterSourceRequest
 from backend.api.models.response import (
@@ -25,6 +25,14 @@ from backend.api.models.response import (
     SourceDetailResponse,
     SourceStatsResponse,
 )
+from backend.api.pagination import (
+    PageParams,
+    page_params,
+    parse_fields,
+    paginate_sorted,
+    ndjson_response,
+    projected_response,
+)
 from backend.config import settings
 
 logger = logging.getLogger(__name__)
@@ -92,25 +100,44 @@ def register_source(body: RegisterSourceRequest):
     "",
     response_model=SourceListResponse,
     summary="列出所有知识源",
-    description="返回所有已注册的知识源列表。",
+    description=(
+        "返回已注册的知识源列表，按创建时间降序排列。"
+        "支持 cursor/limit 游标分页、fields 字段投影，format=ndjson 时以 NDJSON 流式返回。"
+    ),
 )
-def list_sources():
+def list_sources(page: PageParams = Depends(page_params)):
     try:
         from backend.core.source_manager import source_manager
 
-        sources = source_manager.list_sources()
-        data = [_source_dict_to_info(s) for s in sources]
-        return SourceListResponse(
-            success=True,
-            message="获取成功",
-            data=data,
-            total=len(data),
+        fields = parse_fields(page.fields, SourceInfo.model_fields)
+        data = [_source_dict_to_info(s) for s in source_manager.list_sources()]
+        data.sort(key=_source_sort_key, reverse=True)
+        total = len(data)
+        data, next_cursor = paginate_sorted(data, _source_sort_key, page, descending=True)
+
+        if page.streaming:
+            return ndjson_response((s.model_dump() for s in data), fields, next_cursor)
+        return projected_response(
+            SourceListResponse(
+                success=True,
+                message="获取成功",
+                data=data,
+                total=total,
+                next_cursor=next_cursor,
+            ),
+            fields,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"list_sources error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _source_sort_key(source: SourceInfo):
+    return (source.created_at, source.id)
+
+
 # ---------------------------------------------------------------
 # GET /api/knowledge-sources/{source_id} — 知识源详情
 # ---------------------------------------------------------------
@@ -4,11 +4,16 @@ backend/api/routes/pdm.py
 PDM（PowerDesigner 物理数据模型）相关 API 路由。
 
 接口列表：
-  GET  /api/pdm/tables               - 列出所有表
+  GET  /api/pdm/tables               - 列出所有表（支持游标分页 / 字段投影 / NDJSON）
   GET  /api/pdm/tables/{table_code}  - 获取表结构详情
   POST /api/pdm/search               - 语义搜索表
   GET  /api/pdm/relationships/{code} - 查询表关联关系
-  POST /api/pdm/sql/execute          - 执行 SQL 查询
+  GET  /api/pdm/join-path            - 最短关联路径 / k 跳邻域
+  GET  /api/pdm/join-sql             - 两表 JOIN SQL 骨架
+  POST /api/pdm/sql/execute          - 执行 SQL 查询（行数上限 / NDJSON 流式导出）
+  GET  /api/pdm/catalog/tables       - 分页/过滤列出表（列式快照）
+  GET  /api/pdm/catalog/columns      - 分页/过滤列出字段（列式快照）
+  POST /api/pdm/catalog/export       - 重新导出列式快照
   GET  /api/pdm/indexer/status       - 查询索引状态
   POST /api/pdm/indexer/reindex      - 重建索引
 """
@@ -16,11 +21,8 @@ PDM（PowerDesigner 物理数据模型）相关 API 路由。
 import os
 import sqlite3
 import logging
-from typing import List
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-
-from chromadb import PersistentClient
-from chromadb.utils import embedding_functions
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Depends
 
 from backend.api.models.request import SearchTablesRequest, ExecuteSQLRequest
 from backend.api.models.response import (
@@ -33,11 +35,29 @@ from backend.api.models.response import (
     SearchResult,
     RelationshipsResponse,
     RelationshipInfo,
+    JoinPathResponse,
+    JoinEdgeInfo,
+    JoinSQLResponse,
     ExecuteSQLResponse,
     IndexStatusResponse,
     ReindexResponse,
+    CatalogTableInfo,
+    CatalogColumnInfo,
+    CatalogTablesResponse,
+    CatalogColumnsResponse,
+    CatalogExportResponse,
+)
+from backend.api.pagination import (
+    PageParams,
+    page_params,
+    parse_fields,
+    decode_cursor,
+    encode_cursor,
+    ndjson_response,
+    projected_response,
 )
 from backend.core.db_manager import db_manager
+from backend.core import embedding_registry
 from backend.config import settings
 
 logger = logging.getLogger(__name__)
@@ -58,16 +78,41 @@ def _get_sqlite_conn():
     "/tables",
     response_model=ListTablesResponse,
     summary="列出所有表",
-    description="返回 PDM 元数据库中所有已索引的数据表列表。",
+    description=(
+        "返回 PDM 元数据库中已索引的数据表列表，按 code 排序。"
+        "支持 cursor/limit 游标分页、fields 字段投影，format=ndjson 时以 NDJSON 流式返回。"
+    ),
 )
-def list_tables():
+def list_tables(page: PageParams = Depends(page_params)):
     try:
+        fields = parse_fields(page.fields, TableInfo.model_fields)
+        after = decode_cursor(page.cursor, 2)
+
+        sql = "SELECT COALESCE(code, '') AS code, name, comment, id FROM tables"
+        params: list = []
+        if after:
+            sql += " WHERE (COALESCE(code, ''), id) > (?, ?)"
+            params.extend(after)
+        sql += " ORDER BY COALESCE(code, ''), id"
+        if page.limit:
+            # 多取一行用于判断是否还有下一页
+            sql += " LIMIT ?"
+            params.append(page.limit + 1)
+
+        if page.streaming and not page.limit:
+            return ndjson_response(_iter_table_rows(sql, params), fields)
+
         conn = _get_sqlite_conn()
         cursor = conn.cursor()
-        cursor.execute("SELECT code, name, comment FROM tables ORDER BY code")
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
         conn.close()
 
+        next_cursor = None
+        if page.limit and len(rows) > page.limit:
+            rows = rows[:page.limit]
+            next_cursor = encode_cursor([rows[-1][0], rows[-1][3]])
+
         tables = [
             TableInfo(
                 code=row[0] or "",
@@ -76,17 +121,54 @@ def list_tables():
             )
             for row in rows
         ]
-        return ListTablesResponse(
-            success=True,
-            message="获取成功",
-            data=tables,
-            total=len(tables),
+        if page.streaming:
+            return ndjson_response((t.model_dump() for t in tables), fields, next_cursor)
+
+        if page.cursor or page.limit:
+            conn = _get_sqlite_conn()
+            total = conn.execute("SELECT COUNT(*) FROM tables").fetchone()[0]
+            conn.close()
+        else:
+            total = len(tables)
+
+        return projected_response(
+            ListTablesResponse(
+                success=True,
+                message="获取成功",
+                data=tables,
+                total=total,
+                next_cursor=next_cursor,
+            ),
+            fields,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"list_tables error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _iter_table_rows(sql: str, params: list, batch_size: int = 500):
+    """
+    逐批从 SQLite 读取表记录，用于 NDJSON 流式输出。
+
+    StreamingResponse 在另一个工作线程中迭代生成器，连接须在生成器内部创建，
+    保证连接、读取与关闭都在同一线程。
+    """
+    conn = _get_sqlite_conn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield {"code": row[0] or "", "name": row[1] or "", "comment": row[2] or ""}
+    finally:
+        conn.close()
+
+
 # ---------------------------------------------------------------
 # 获取表结构详情
 # ---------------------------------------------------------------
@@ -168,11 +250,8 @@ def get_table_schema(table_code: str):
 )
 def search_tables(body: SearchTablesRequest):
     try:
-        embedding_fn = embedding_functions.ONNXMiniLM_L6_V2()
-        client = PersistentClient(path=settings.CHROMA_DB_PATH)
-        collection = client.get_collection(
-            name="pdm_metadata", embedding_function=embedding_fn
-        )
+        # 使用 pdm_metadata 登记的嵌入模型，保证查询向量与索引向量同一空间
+        collection = embedding_registry.get_collection("pdm_metadata")
 
         results = collection.query(
             query_texts=[body.query],
@@ -270,6 +349,126 @@ def get_relationships(table_code: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ---------------------------------------------------------------
+# 关联路径 / 邻域查询
+# ---------------------------------------------------------------
+
+@router.get(
+    "/join-path",
+    response_model=JoinPathResponse,
+    summary="查询关联路径",
+    description="基于内存外键图查询两表之间的最短关联路径；不传 target 时返回 source 的 k 跳邻域。",
+)
+def get_join_path(
+    source: str = Query(..., min_length=1, description="起始表代码"),
+    target: Optional[str] = Query(default=None, description="目标表代码（可选）"),
+    hops: int = Query(default=2, ge=1, le=4, description="邻域跳数（仅在未指定 target 时生效）"),
+):
+    try:
+        from backend.core.join_graph import get_join_graph
+
+        graph = get_join_graph()
+
+        if target:
+            try:
+                path = graph.shortest_path(source, target)
+            except KeyError as e:
+                raise HTTPException(status_code=404, detail=f"表 {e} 不存在")
+
+            source_ids = graph.resolve(source)
+            component_size = max(graph.component_sizes[graph.component_of[i]] for i in source_ids)
+            if path is None:
+                return JoinPathResponse(
+                    success=True,
+                    message="两表之间不存在外键关联路径",
+                    source=source,
+                    target=target,
+                    found=False,
+                    component_size=component_size,
+                )
+            return JoinPathResponse(
+                success=True,
+                message="查询成功",
+                source=source,
+                target=target,
+                found=True,
+                tables=path["tables"],
+                edges=[JoinEdgeInfo(**e) for e in path["edges"]],
+                component_size=component_size,
+            )
+
+        try:
+            result = graph.neighborhood(source, hops)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=f"表 {e} 不存在")
+
+        return JoinPathResponse(
+            success=True,
+            message="查询成功",
+            source=source,
+            found=True,
+            tables=list(result["tables"].keys()),
+            distances=result["tables"],
+            edges=[JoinEdgeInfo(**e) for e in result["edges"]],
+            component_size=result["component_size"],
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"get_join_path error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/join-sql",
+    response_model=JoinSQLResponse,
+    summary="获取 JOIN SQL 骨架",
+    description="返回按最短外键路径连接两表的 SELECT/JOIN 骨架（列清单 + ON 条件），由索引阶段预计算。",
+)
+def get_join_sql(
+    source: str = Query(..., min_length=1, description="起始表代码"),
+    target: str = Query(..., min_length=1, description="目标表代码"),
+):
+    try:
+        from backend.core.join_graph import build_join_sql
+
+        try:
+            result = build_join_sql(source, target)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=f"表 {e} 不存在")
+
+        if result is None:
+            return JoinSQLResponse(
+                success=True,
+                message="两表之间不存在外键关联路径",
+                source=source,
+                target=target,
+            )
+        if "unknown" in result["join_sources"]:
+            raise HTTPException(
+                status_code=422,
+                detail="路径上存在关联列未知的外键关系（PDM 未定义且无法从父表主键推断），无法生成 JOIN SQL",
+            )
+        if result["edges"] and not result["sql"]:
+            raise HTTPException(status_code=409, detail="JOIN 骨架尚未生成，请先重建 PDM 索引")
+
+        return JoinSQLResponse(
+            success=True,
+            message="获取成功",
+            source=source,
+            target=target,
+            tables=result["tables"],
+            edges=[JoinEdgeInfo(**e) for e in result["edges"]],
+            join_sources=result["join_sources"],
+            sql=result["sql"],
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"get_join_sql error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ---------------------------------------------------------------
 # 执行 SQL 查询
 # ---------------------------------------------------------------
@@ -278,11 +477,27 @@ def get_relationships(table_code: str):
     "/sql/execute",
     response_model=ExecuteSQLResponse,
     summary="执行 SQL 查询",
-    description="在指定数据库（MySQL 或 Oracle）上执行 SQL 查询，返回结果集。",
+    description=(
+        "在指定数据库（MySQL 或 Oracle）上执行 SQL 查询，返回结果集。"
+        "结果通过服务端游标分批读取，最多返回 DB_QUERY_MAX_ROWS 行，超出时 truncated=true；"
+        "format=ndjson 时以 NDJSON 流式导出（上限 DB_EXPORT_MAX_ROWS 行），"
+        "被截断时最后一行为 {\"_truncated\": true, \"row_count\": N}。"
+        "SELECT 没有行数限制时自动追加，EXPLAIN 估算超过阈值的查询返回 400。"
+    ),
 )
-def execute_sql(body: ExecuteSQLRequest):
+def execute_sql(
+    body: ExecuteSQLRequest,
+    format: str = Query(default="json", pattern="^(json|ndjson)$", description="响应格式：json 或 ndjson"),
+):
     try:
-        result = db_manager.execute_query(body.db_type, body.sql)
+        if format == "ndjson":
+            result = db_manager.open_stream(
+                body.db_type, body.sql, max_rows=settings.DB_EXPORT_MAX_ROWS, confirm=body.confirm,
+            )
+            if not isinstance(result, str):
+                return ndjson_response(_iter_sql_rows(result))
+        else:
+            result = db_manager.execute_query(body.db_type, body.sql, confirm=body.confirm)
 
         if isinstance(result, str) and result.startswith("Error"):
             raise HTTPException(status_code=400, detail=result)
@@ -294,6 +509,7 @@ def execute_sql(body: ExecuteSQLRequest):
                 data=result,
                 db_type=body.db_type,
                 row_count=len(result),
+                truncated=result.truncated,
             )
         else:
             return ExecuteSQLResponse(
@@ -310,6 +526,119 @@ def execute_sql(body: ExecuteSQLRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _iter_sql_rows(stream):
+    """逐行输出查询结果，用于 NDJSON 导出；被截断或中途出错时追加一行说明。"""
+    try:
+        yield from stream
+    except Exception as e:
+        yield {"_error": stream.on_error(e)}
+        return
+    finally:
+        stream.close()
+    if stream.truncated:
+        yield {"_truncated": True, "row_count": stream.row_count}
+
+
+# ---------------------------------------------------------------
+# 目录快照（列式，内存映射读取）
+# ---------------------------------------------------------------
+
+def _get_catalog_snapshot():
+    from backend.core.catalog_export import catalog_snapshot
+
+    if not catalog_snapshot.exists():
+        raise HTTPException(
+            status_code=404,
+            detail="PDM 目录快照不存在，请先重建索引或调用 POST /api/pdm/catalog/export",
+        )
+    return catalog_snapshot
+
+
+@router.get(
+    "/catalog/tables",
+    response_model=CatalogTablesResponse,
+    summary="分页列出表（快照）",
+    description="从 PDM 目录列式快照中按关键词 / PDM 文件过滤并分页返回表列表。",
+)
+def list_catalog_tables(
+    q: str = Query(default="", description="关键词，匹配表代码/名称/注释（不区分大小写）"),
+    file: str = Query(default="", description="按 PDM 文件名过滤"),
+    offset: int = Query(default=0, ge=0, description="起始偏移"),
+    limit: int = Query(default=100, ge=1, le=1000, description="每页数量"),
+):
+    try:
+        snapshot = _get_catalog_snapshot()
+        total, rows = snapshot.query_tables(keyword=q, file=file, offset=offset, limit=limit)
+        return CatalogTablesResponse(
+            success=True,
+            message="获取成功",
+            data=[CatalogTableInfo(**r) for r in rows],
+            total=total,
+            offset=offset,
+            limit=limit,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"list_catalog_tables error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/catalog/columns",
+    response_model=CatalogColumnsResponse,
+    summary="分页列出字段（快照）",
+    description="从 PDM 目录列式快照中按表代码 / 关键词 / 数据类型过滤并分页返回字段列表。",
+)
+def list_catalog_columns(
+    table_code: str = Query(default="", description="按表代码过滤（不区分大小写）"),
+    q: str = Query(default="", description="关键词，匹配字段代码/名称/注释（不区分大小写）"),
+    data_type: str = Query(default="", description="按数据类型前缀过滤，如 VARCHAR"),
+    offset: int = Query(default=0, ge=0, description="起始偏移"),
+    limit: int = Query(default=100, ge=1, le=1000, description="每页数量"),
+):
+    try:
+        snapshot = _get_catalog_snapshot()
+        total, rows = snapshot.query_columns(
+            table_code=table_code, keyword=q, data_type=data_type, offset=offset, limit=limit
+        )
+        return CatalogColumnsResponse(
+            success=True,
+            message="获取成功",
+            data=[CatalogColumnInfo(**r) for r in rows],
+            total=total,
+            offset=offset,
+            limit=limit,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"list_catalog_columns error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/catalog/export",
+    response_model=CatalogExportResponse,
+    summary="导出目录快照",
+    description="将当前 SQLite 中的 PDM 表和字段重新导出为列式快照文件。",
+)
+def export_catalog():
+    try:
+        from backend.core.catalog_export import export_catalog as _export
+
+        counts = _export()
+        return CatalogExportResponse(
+            success=True,
+            message="导出成功",
+            tables=counts["tables"],
+            columns=counts["columns"],
+        )
+    except Exception as e:
+        logger.error(f"export_catalog error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ---------------------------------------------------------------
 # 索引状态
 # ---------------------------------------------------------------
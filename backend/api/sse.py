@@ -0,0 +1,118 @@
+"""
+backend/api/sse.py
+
+SSE（Server-Sent Events）流式输出工具，供对话流式接口使用。
+
+Agent 运行任务把事件发布到 StreamRun（见 backend/core/stream_buffer.py），
+pump_events() 作为订阅者把事件转换为 SSE 帧：
+- token 合并：连续的 content 事件按 flush_interval 合并为一帧，避免每个 token 一帧
+- 心跳：空闲超过 heartbeat_interval 秒时发送注释行（": ping"），防止代理断开空闲连接
+- 断连检测：定期检查客户端是否已断开，断开后退订；run 在宽限期内无人重连才取消 Agent 运行
+- 续传：每帧带 id（"<run_id>:<seq>"），客户端带 Last-Event-ID 重连时从该序号之后继续输出
+
+事件格式（data 为 JSON）：
+    {"content": "..."}                            回复文本片段
+    {"tool": {"name": "...", "status": "..."}}    工具调用进度（running / done / error）
+    {"error": "..."}                              错误
+    [DONE]                                        结束
+"""
+
+import json
+import time
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import Request
+
+from backend.core.stream_buffer import StreamRun
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+SSE_HEARTBEAT = ": ping\n\n"
+SSE_DONE = "data: [DONE]\n\n"
+
+# 客户端断连检查间隔（秒）
+DISCONNECT_CHECK_INTERVAL = 1.0
+
+
+def sse_event(data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """将一个事件编码为 SSE 帧；带 event_id 时输出 id 行，供客户端断线后通过 Last-Event-ID 续传。"""
+    frame = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"id: {event_id}\n{frame}" if event_id else frame
+
+
+async def pump_events(
+    request: Optional[Request],
+    run: StreamRun,
+    after_seq: int = 0,
+    flush_interval: float = 0.05,
+    heartbeat_interval: float = 15.0,
+) -> AsyncIterator[str]:
+    """
+    订阅 run，输出序号大于 after_seq 的事件，直到 run 结束且事件全部输出。
+    客户端断开（或本生成器被关闭）时退订；不输出 [DONE]，由调用方决定。
+    """
+    pending_text = []
+    pending_seq = after_seq
+    cursor = after_seq
+    now = time.monotonic()
+    last_flush = last_sent = last_check = now
+
+    def flush():
+        frame = sse_event({"content": "".join(pending_text)}, f"{run.run_id}:{pending_seq}")
+        pending_text.clear()
+        return frame
+
+    run.attach()
+    try:
+        while True:
+            events = await run.read_after(cursor)
+            for seq, data in events:
+                cursor = seq
+                if set(data) == {"content"}:
+                    pending_text.append(data["content"])
+                    pending_seq = seq
+                    continue
+                # 非文本事件：先输出已合并的文本，保持顺序
+                if pending_text:
+                    yield flush()
+                yield sse_event(data, f"{run.run_id}:{seq}")
+                last_flush = last_sent = time.monotonic()
+
+            now = time.monotonic()
+            caught_up = cursor >= run.last_seq
+            if pending_text and ((run.finished and caught_up) or now - last_flush >= flush_interval):
+                yield flush()
+                last_flush = last_sent = now
+
+            if run.finished and caught_up and not pending_text:
+                return
+
+            if now - last_check >= DISCONNECT_CHECK_INTERVAL:
+                last_check = now
+                if request is not None and await request.is_disconnected():
+                    return
+
+            if now - last_sent >= heartbeat_interval:
+                yield SSE_HEARTBEAT
+                last_sent = now
+
+            # 还有未读事件（补发批次或输出期间新发布的事件）时直接继续
+            if cursor < run.last_seq and not pending_text:
+                continue
+            # 有待合并的文本时按 flush_interval 唤醒，否则按心跳 / 断连检查间隔唤醒
+            now = time.monotonic()
+            if pending_text:
+                timeout = last_flush + flush_interval - now
+            else:
+                timeout = min(last_sent + heartbeat_interval, last_check + DISCONNECT_CHECK_INTERVAL) - now
+            if timeout > 0 and cursor >= run.last_seq:
+                await run.wait(timeout)
+            elif timeout > 0:
+                await asyncio.sleep(timeout)
+    finally:
+        run.detach()
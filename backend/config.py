@@ -27,16 +27,27 @@ class Settings:
     SQLITE_DB_PATH: str = os.getenv("SQLITE_DB_PATH", "./data/metadata.db")
     CHROMA_DB_PATH: str = os.getenv("CHROMA_DB_PATH", "./data/chroma_db")
     PDM_FILES_DIR: str = os.getenv("PDM_FILES_DIR", "./files")
+    # PDM 目录列式快照（Arrow IPC）目录
+    PDM_CATALOG_DIR: str = os.getenv("PDM_CATALOG_DIR", "./data/catalog")
 
     # ---------------------------------------------------------------
     # 会话管理配置
     # ---------------------------------------------------------------
+    # 会话存储（SQLite，WAL 模式）
+    CONVERSATION_DB_PATH: str = os.getenv(
+        "CONVERSATION_DB_PATH", "./data/conversations.db"
+    )
+    # 旧版 JSON 会话文件，会话库为空时自动迁移
     CONVERSATION_PERSIST_PATH: str = os.getenv(
         "CONVERSATION_PERSIST_PATH", "./data/conversations.json"
     )
     MAX_MESSAGES_PER_SESSION: int = int(
         os.getenv("MAX_MESSAGES_PER_SESSION", "50")
     )
+    # 内存中最多保留的已加载会话数（LRU 淘汰，其余会话只保留摘要）
+    SESSION_CACHE_SIZE: int = int(
+        os.getenv("SESSION_CACHE_SIZE", "64")
+    )
 
     # ---------------------------------------------------------------
     # LLM 配置
@@ -50,12 +61,120 @@ class Settings:
     # LLM 请求超时（秒），默认 120 秒
     LLM_TIMEOUT: int = int(os.getenv("LLM_TIMEOUT", "120"))
 
+    # 会话历史 token 预算（估算值），超出后从最早的消息开始裁剪；按 provider 区分，0 表示不限
+    HISTORY_TOKEN_BUDGET_DEEPSEEK: int = int(os.getenv("HISTORY_TOKEN_BUDGET_DEEPSEEK", "32000"))
+    HISTORY_TOKEN_BUDGET_CLAUDE: int = int(os.getenv("HISTORY_TOKEN_BUDGET_CLAUDE", "100000"))
+
+    @property
+    def HISTORY_TOKEN_BUDGET(self) -> int:
+        """当前 LLM_PROVIDER 对应的会话历史 token 预算。"""
+        if self.LLM_PROVIDER == "claude":
+            return self.HISTORY_TOKEN_BUDGET_CLAUDE
+        return self.HISTORY_TOKEN_BUDGET_DEEPSEEK
+
+    # 滚动摘要：历史达到 token 预算的该比例时，后台将较早的对话压缩为摘要（0 表示关闭）
+    HISTORY_SUMMARY_RATIO: float = float(os.getenv("HISTORY_SUMMARY_RATIO", "0.6"))
+    # 摘要时保留原文的最近消息数
+    HISTORY_SUMMARY_KEEP_MESSAGES: int = int(os.getenv("HISTORY_SUMMARY_KEEP_MESSAGES", "6"))
+
+    @property
+    def HISTORY_SUMMARY_THRESHOLD(self) -> int:
+        """触发滚动摘要的历史 token 数，0 表示不摘要。"""
+        return int(self.HISTORY_TOKEN_BUDGET * self.HISTORY_SUMMARY_RATIO)
+
+    # 会话标题后台生成：工作线程数、排队上限、超时（秒）
+    TITLE_GENERATION_WORKERS: int = int(os.getenv("TITLE_GENERATION_WORKERS", "2"))
+    TITLE_GENERATION_QUEUE_SIZE: int = int(os.getenv("TITLE_GENERATION_QUEUE_SIZE", "32"))
+    TITLE_GENERATION_TIMEOUT: int = int(os.getenv("TITLE_GENERATION_TIMEOUT", "15"))
+
+    # Agent 并发限流：同时执行的对话数、排队上限、排队超时（秒），超出时返回 503
+    AGENT_MAX_CONCURRENCY: int = int(os.getenv("AGENT_MAX_CONCURRENCY", "16"))
+    AGENT_MAX_QUEUE: int = int(os.getenv("AGENT_MAX_QUEUE", "64"))
+    AGENT_QUEUE_TIMEOUT: float = float(os.getenv("AGENT_QUEUE_TIMEOUT", "30"))
+    # 同一会话已有对话在进行时，新请求等待该会话的最长时间（秒），超时返回 409
+    SESSION_BUSY_TIMEOUT: float = float(os.getenv("SESSION_BUSY_TIMEOUT", "10"))
+
+    # SSE 流式输出：文本片段合并间隔（毫秒）、空闲心跳间隔（秒）
+    SSE_FLUSH_INTERVAL_MS: int = int(os.getenv("SSE_FLUSH_INTERVAL_MS", "50"))
+    SSE_HEARTBEAT_INTERVAL: float = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+
+    # 流式续传：事件落盘路径、每次运行在内存中保留的事件数、结束后在内存中保留的秒数、
+    # 客户端全部断开后 Agent 继续运行等待重连的秒数
+    STREAM_DB_PATH: str = os.getenv("STREAM_DB_PATH", "./data/streams.db")
+    STREAM_BUFFER_MAX_EVENTS: int = int(os.getenv("STREAM_BUFFER_MAX_EVENTS", "1000"))
+    STREAM_BUFFER_TTL: float = float(os.getenv("STREAM_BUFFER_TTL", "300"))
+    STREAM_RESUME_GRACE: float = float(os.getenv("STREAM_RESUME_GRACE", "30"))
+
+    # 后台对话运行（POST /conversations/{id}/runs）：worker 数、排队上限
+    CHAT_RUN_WORKERS: int = int(os.getenv("CHAT_RUN_WORKERS", "4"))
+    CHAT_RUN_QUEUE_SIZE: int = int(os.getenv("CHAT_RUN_QUEUE_SIZE", "100"))
+    # 后台对话运行等待同一会话上一轮对话的最长时间（秒），超时 run 以错误结束
+    CHAT_RUN_SESSION_TIMEOUT: float = float(os.getenv("CHAT_RUN_SESSION_TIMEOUT", "300"))
+
+    # 图片 OCR：并行识别的引擎实例数（线程池大小）、每个实例的 onnxruntime 推理线程数、单张图片超时（秒）
+    OCR_POOL_SIZE: int = int(os.getenv("OCR_POOL_SIZE", "2"))
+    OCR_INTRA_OP_THREADS: int = int(os.getenv("OCR_INTRA_OP_THREADS", "2"))
+    OCR_IMAGE_TIMEOUT: float = float(os.getenv("OCR_IMAGE_TIMEOUT", "20"))
+
+    # 图片 OCR 预处理：开关、缩放后的最大长边（像素，超长截图按宽度计）、超长截图的切块高度（像素），0 表示不限
+    OCR_PREPROCESS: bool = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+    OCR_MAX_LONG_EDGE: int = int(os.getenv("OCR_MAX_LONG_EDGE", "1920"))
+    OCR_TILE_HEIGHT: int = int(os.getenv("OCR_TILE_HEIGHT", "1600"))
+
+    # OCR 结果缓存（按图片内容寻址）：SQLite 路径、内存 LRU 条目数、SQLite 条目数上限（0 表示不持久化）
+    OCR_CACHE_DB_PATH: str = os.getenv("OCR_CACHE_DB_PATH", "./data/ocr_cache.db")
+    OCR_CACHE_MEMORY_SIZE: int = int(os.getenv("OCR_CACHE_MEMORY_SIZE", "256"))
+    OCR_CACHE_MAX_ENTRIES: int = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "10000"))
+
+    # 附件日志文件大小上限（MB）；日志按流式解码只保留尾部，上限主要受请求体大小约束
+    LOG_FILE_MAX_SIZE_MB: int = int(os.getenv("LOG_FILE_MAX_SIZE_MB", "20"))
+    # 附件日志摘要的 token 预算：超出时按模板归并压缩（错误与堆栈保留原文），0 表示不压缩、只截取尾部
+    LOG_DIGEST_TOKEN_BUDGET: int = int(os.getenv("LOG_DIGEST_TOKEN_BUDGET", "4000"))
+
+    # 附件中的 Java 堆栈帧在代码索引中定位后，最多附加到消息中的方法数（0 表示关闭）
+    STACK_FRAME_MAX_CHUNKS: int = int(os.getenv("STACK_FRAME_MAX_CHUNKS", "5"))
+
+    # 附件预上传（POST /api/attachments）：临时文件目录、附件保留秒数
+    ATTACHMENT_SPOOL_DIR: str = os.getenv("ATTACHMENT_SPOOL_DIR", "./data/attachments")
+    ATTACHMENT_TTL: float = float(os.getenv("ATTACHMENT_TTL", "3600"))
+
+    # 阻塞操作专用线程池大小（与 Starlette 默认线程池隔离）
+    SQLITE_EXECUTOR_WORKERS: int = int(os.getenv("SQLITE_EXECUTOR_WORKERS", "4"))
+    OCR_EXECUTOR_WORKERS: int = int(os.getenv("OCR_EXECUTOR_WORKERS", "2"))
+    EMBEDDING_EXECUTOR_WORKERS: int = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", "2"))
+    DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+
     # ---------------------------------------------------------------
     # 数据库连接配置
     # ---------------------------------------------------------------
     MYSQL_URL: str = os.getenv("MYSQL_URL", "")
     ORACLE_URL: str = os.getenv("ORACLE_URL", "")
 
+    # 外部数据库连接池：常驻连接数、高峰时额外允许的连接数、等待空闲连接的超时（秒）、
+    # 连接回收周期（秒，避免被防火墙 / 数据库端断开的陈旧连接）、取出连接前是否探活
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # 单条查询超时（秒）：MySQL 用 MAX_EXECUTION_TIME（仅 SELECT），Oracle 用驱动的 call timeout；0 表示不限
+    DB_QUERY_TIMEOUT: float = float(os.getenv("DB_QUERY_TIMEOUT", "30"))
+    # 查询结果行数上限（超出部分不读取，结果标记为已截断），0 表示不限：
+    # 接口 JSON 返回 / Agent 的 execute_sql 工具 / 接口 NDJSON 导出
+    DB_QUERY_MAX_ROWS: int = int(os.getenv("DB_QUERY_MAX_ROWS", "1000"))
+    DB_TOOL_MAX_ROWS: int = int(os.getenv("DB_TOOL_MAX_ROWS", "100"))
+    DB_EXPORT_MAX_ROWS: int = int(os.getenv("DB_EXPORT_MAX_ROWS", "100000"))
+    # execute_sql 工具输出给 LLM 时每列的最大字符数（超长内容截断）
+    DB_TOOL_MAX_COLUMN_WIDTH: int = int(os.getenv("DB_TOOL_MAX_COLUMN_WIDTH", "80"))
+
+    # SQL 防护：SELECT 无行数限制时自动追加 LIMIT / FETCH FIRST，执行前用 EXPLAIN 估算，
+    # 超过阈值时拒绝（refuse）或要求确认后以 confirm=true 重新执行（confirm）
+    DB_SQL_GUARD: bool = os.getenv("DB_SQL_GUARD", "true").lower() == "true"
+    DB_GUARD_MODE: str = os.getenv("DB_GUARD_MODE", "refuse").lower()
+    # 阈值：MySQL 估算扫描行数、Oracle 执行计划成本，0 表示不检查
+    DB_GUARD_MAX_ROWS: int = int(os.getenv("DB_GUARD_MAX_ROWS", "1000000"))
+    DB_GUARD_MAX_COST: float = float(os.getenv("DB_GUARD_MAX_COST", "100000"))
+
     # 数据库查询开关：true = 允许 LLM 访问数据库；未配置或其它值 = 禁止
     ENABLE_DB_QUERY: bool = os.getenv("ENABLE_DB_QUERY", "false").lower() == "true"
 
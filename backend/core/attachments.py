@@ -0,0 +1,277 @@
+"""
+backend/core/attachments.py
+
+附件预上传：图片 / 日志文件以 multipart 上传后先落到临时目录（spool），立即在后台开始处理
+（图片 OCR、日志解码与摘要），返回 attachment_id；发送消息时通过 attachment_ids 引用，
+用户还在输入时处理就已开始，发送时通常已完成。
+
+- 上传内容分块写入 spool 文件，边写边检查大小上限，不在内存中保留整个文件
+- 图片在 OCR 线程池中识别；日志在附件处理线程池（OCR executor）中流式解析
+- 处理完成后删除 spool 文件，只保留提取出的文本；ttl 秒后附件记录过期
+- 附件记录只保存在内存中（单进程），服务重启后需重新上传
+"""
+
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from backend.config import settings
+from backend.core.executors import OCR, get_executor
+
+logger = logging.getLogger(__name__)
+
+IMAGE = "image"
+LOG = "log"
+
+PROCESSING = "processing"
+READY = "ready"
+
+# 单次上传最多的文件数
+MAX_FILES_PER_UPLOAD = 10
+
+# spool 写入的块大小
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class AttachmentError(Exception):
+    """附件不合法（格式 / 大小）或不存在。"""
+
+
+class Attachment:
+    """一个已上传的附件。"""
+
+    def __init__(self, kind: str, filename: str, mime_type: str, path: str):
+        self.attachment_id = uuid.uuid4().hex
+        self.kind = kind
+        self.filename = filename
+        self.mime_type = mime_type
+        self.path = path
+        self.size = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None   # 后台处理实际开始执行的时间（monotonic）
+        self.future: Optional[Future] = None
+
+    def mark_started(self):
+        self.started_at = time.monotonic()
+
+    @property
+    def status(self) -> str:
+        return READY if self.future is not None and self.future.done() else PROCESSING
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "attachment_id": self.attachment_id,
+            "kind": self.kind,
+            "filename": self.filename,
+            "mime_type": self.mime_type,
+            "size": self.size,
+            "status": self.status,
+        }
+
+
+class AttachmentStore:
+    """附件登记与后台处理，跨线程安全。"""
+
+    def __init__(self, spool_dir: str = "./data/attachments", ttl: float = 3600):
+        """
+        Args:
+            spool_dir: 上传文件的临时目录（启动时清空遗留文件）
+            ttl: 附件记录的保留秒数
+        """
+        self.spool_dir = spool_dir
+        self.ttl = ttl
+        self._attachments: Dict[str, Attachment] = {}
+        self._lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+        for name in os.listdir(spool_dir):
+            _remove(os.path.join(spool_dir, name))
+
+    # ------------------------------------------------------------------
+    # 上传
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def classify(filename: str, mime_type: str) -> str:
+        """根据扩展名 / MIME 类型判断附件类型，不支持时抛出 AttachmentError。"""
+        from backend.core.ocr_service import ALLOWED_MIME_TYPES
+        from backend.core.log_file_service import ALLOWED_EXTENSIONS
+
+        if mime_type in ALLOWED_MIME_TYPES:
+            return IMAGE
+        if os.path.splitext((filename or "").lower())[1] in ALLOWED_EXTENSIONS:
+            return LOG
+        raise AttachmentError(
+            f"不支持的附件格式: {filename or '[未命名文件]'}（{mime_type}），"
+            f"支持 PNG / JPG / GIF / BMP / WEBP 图片及 .log / .txt 日志"
+        )
+
+    def save(self, fileobj: BinaryIO, filename: str, mime_type: str) -> Attachment:
+        """
+        将上传文件分块写入 spool 并开始后台处理（阻塞调用，在线程池中执行）。
+        格式不支持或超过大小上限时抛出 AttachmentError。
+        """
+        from backend.core.ocr_service import MAX_IMAGE_SIZE
+        from backend.core.log_file_service import MAX_FILE_SIZE
+
+        self._evict_expired()
+        kind = self.classify(filename, mime_type)
+        limit = MAX_IMAGE_SIZE if kind == IMAGE else MAX_FILE_SIZE
+        attachment = Attachment(kind, filename, mime_type, "")
+        attachment.path = os.path.join(self.spool_dir, attachment.attachment_id)
+
+        try:
+            with open(attachment.path, "wb") as out:
+                while True:
+                    chunk = fileobj.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    attachment.size += len(chunk)
+                    if attachment.size > limit:
+                        raise AttachmentError(
+                            f"附件 {filename} 超过大小限制（最大 {limit // (1024 * 1024)}MB）"
+                        )
+                    out.write(chunk)
+        except BaseException:
+            _remove(attachment.path)
+            raise
+
+        with self._lock:
+            self._attachments[attachment.attachment_id] = attachment
+        self._start(attachment)
+        logger.info(f"附件已上传 [{attachment.attachment_id}] {kind} {filename} {attachment.size} 字节")
+        return attachment
+
+    def _start(self, attachment: Attachment):
+        if attachment.kind == IMAGE:
+            from backend.core.ocr_service import submit_ocr
+            with open(attachment.path, "rb") as f:
+                raw = f.read()
+            _remove(attachment.path)
+            attachment.future = submit_ocr(raw, attachment.filename, on_start=attachment.mark_started)
+        else:
+            attachment.future = get_executor(OCR).submit(self._process_log, attachment)
+
+    @staticmethod
+    def _process_log(attachment: Attachment) -> str:
+        from backend.core.log_file_service import extract_text_from_file
+        attachment.mark_started()
+        try:
+            return extract_text_from_file(attachment.path, filename=attachment.filename)
+        finally:
+            _remove(attachment.path)
+
+    # ------------------------------------------------------------------
+    # 查询 / 引用
+    # ------------------------------------------------------------------
+
+    def get(self, attachment_id: str) -> Optional[Attachment]:
+        with self._lock:
+            return self._attachments.get(attachment_id)
+
+    def delete(self, attachment_id: str) -> bool:
+        with self._lock:
+            attachment = self._attachments.pop(attachment_id, None)
+        if attachment is None:
+            return False
+        self._discard(attachment)
+        return True
+
+    async def collect(self, attachment_ids: List[str]) -> List[Dict[str, str]]:
+        """
+        等待引用的附件处理完成，按传入顺序返回 [{kind, filename, text}]；
+        附件不存在或已过期时抛出 AttachmentError。图片识别超过 OCR_IMAGE_TIMEOUT 秒时返回超时提示。
+        """
+        attachments = []
+        for attachment_id in attachment_ids:
+            attachment = self.get(attachment_id)
+            if attachment is None:
+                raise AttachmentError(f"附件 '{attachment_id}' 不存在或已过期，请重新上传")
+            attachments.append(attachment)
+
+        results = []
+        for attachment in attachments:
+            results.append({
+                "kind": attachment.kind,
+                "filename": attachment.filename,
+                "text": await self._wait(attachment),
+            })
+        return results
+
+    @staticmethod
+    async def _wait(attachment: Attachment) -> str:
+        if attachment.future.done():
+            return attachment.future.result()
+        future = asyncio.wrap_future(attachment.future)
+        if attachment.kind != IMAGE:
+            return await asyncio.shield(future)
+        # 超时从识别实际开始时计算；仍在排队等待线程时从此刻开始计算
+        timeout = settings.OCR_IMAGE_TIMEOUT
+        started_at = attachment.started_at if attachment.started_at is not None else time.monotonic()
+        remaining = timeout - (time.monotonic() - started_at)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, remaining))
+        except asyncio.TimeoutError:
+            logger.warning(f"OCR 识别超时 [{attachment.filename}]")
+            return f"[图片识别超时（超过 {timeout} 秒）]"
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [a for a in self._attachments.values() if a.created_at < cutoff]
+            for attachment in expired:
+                del self._attachments[attachment.attachment_id]
+        for attachment in expired:
+            self._discard(attachment)
+
+    @staticmethod
+    def _discard(attachment: Attachment):
+        """取消尚未开始的处理；处理已开始时由 _process_log 自行删除 spool 文件。"""
+        if attachment.future is not None and attachment.future.cancel():
+            # 任务没有执行过，finally 中的清理也不会执行
+            _remove(attachment.path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            attachments = list(self._attachments.values())
+        return {
+            "attachments": len(attachments),
+            "processing": sum(1 for a in attachments if a.status == PROCESSING),
+        }
+
+
+def _remove(path: str):
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        logger.warning(f"删除附件临时文件失败 {path}: {e}")
+
+
+_attachment_store: Optional[AttachmentStore] = None
+_attachment_store_lock = threading.Lock()
+
+
+def get_attachment_store() -> AttachmentStore:
+    """获取全局附件存储（单例）。"""
+    global _attachment_store
+    if _attachment_store is None:
+        with _attachment_store_lock:
+            if _attachment_store is None:
+                _attachment_store = AttachmentStore(
+                    spool_dir=settings.ATTACHMENT_SPOOL_DIR,
+                    ttl=settings.ATTACHMENT_TTL,
+                )
+    return _attachment_store
+
+
+def attachment_stats() -> Dict[str, int]:
+    """附件指标（尚未初始化时为空）。"""
+    return _attachment_store.stats() if _attachment_store is not None else {}
@@ -0,0 +1,185 @@
+"""
+backend/core/catalog_export.py
+
+PDM 目录列式快照：将 SQLite 中的 tables / columns 批量导出为 Arrow IPC（Feather v2，未压缩）文件，
+读取时通过内存映射打开，过滤和分页均在 Arrow 列上完成，避免逐行 fetch + Pydantic 构造。
+
+快照文件：
+    {PDM_CATALOG_DIR}/pdm_tables.arrow   - file / code / name / comment / column_count
+    {PDM_CATALOG_DIR}/pdm_columns.arrow  - file / table_code / code / name / data_type / length / mandatory / comment
+
+PDMIndexer.index_all() 完成后自动导出，也可通过 POST /api/pdm/catalog/export 手动触发。
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, Any
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+TABLES_FILE = "pdm_tables.arrow"
+COLUMNS_FILE = "pdm_columns.arrow"
+
+# 分页单页最大行数
+MAX_PAGE_SIZE = 1000
+
+_TABLES_SQL = """
+    SELECT COALESCE(f.file_name, '') AS file,
+           COALESCE(t.code, '') AS code,
+           COALESCE(t.name, '') AS name,
+           COALESCE(t.comment, '') AS comment,
+           (SELECT COUNT(*) FROM columns c WHERE c.table_id = t.id) AS column_count
+    FROM tables t
+    LEFT JOIN pdm_files f ON t.file_id = f.id
+    ORDER BY t.code
+"""
+
+_COLUMNS_SQL = """
+    SELECT COALESCE(f.file_name, '') AS file,
+           COALESCE(t.code, '') AS table_code,
+           COALESCE(c.code, '') AS code,
+           COALESCE(c.name, '') AS name,
+           COALESCE(c.data_type, '') AS data_type,
+           COALESCE(c.length, '') AS length,
+           COALESCE(c.mandatory, 0) = 1 AS mandatory,
+           COALESCE(c.comment, '') AS comment
+    FROM columns c
+    JOIN tables t ON c.table_id = t.id
+    LEFT JOIN pdm_files f ON t.file_id = f.id
+    ORDER BY t.code, c.rowid
+"""
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError("pyarrow is not installed. Run: uv pip install pyarrow")
+
+
+def export_catalog(db_path: Optional[str] = None, out_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    将 PDM 目录导出为列式快照，返回 {"tables": n, "columns": m}。
+
+    先写临时文件再原子替换，读取端不会看到写了一半的快照。
+    """
+    _require_pyarrow()
+    import pandas as pd
+
+    db_path = db_path or settings.SQLITE_DB_PATH
+    out_dir = out_dir or settings.PDM_CATALOG_DIR
+    os.makedirs(out_dir, exist_ok=True)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        tables_df = pd.read_sql_query(_TABLES_SQL, conn)
+        columns_df = pd.read_sql_query(_COLUMNS_SQL, conn)
+    finally:
+        conn.close()
+    columns_df["mandatory"] = columns_df["mandatory"].astype(bool)
+
+    for df, file_name in ((tables_df, TABLES_FILE), (columns_df, COLUMNS_FILE)):
+        path = os.path.join(out_dir, file_name)
+        tmp_path = path + ".tmp"
+        # 未压缩才能直接内存映射读取
+        df.reset_index(drop=True).to_feather(tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+
+    logger.info(f"PDM catalog exported to {out_dir}: {len(tables_df)} tables, {len(columns_df)} columns")
+    return {"tables": len(tables_df), "columns": len(columns_df)}
+
+
+class CatalogSnapshot:
+    """内存映射读取的 PDM 目录快照，文件更新后自动重新打开。"""
+
+    def __init__(self, out_dir: Optional[str] = None):
+        self.out_dir = out_dir or settings.PDM_CATALOG_DIR
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.out_dir, TABLES_FILE))
+
+    def _open(self, file_name: str):
+        _require_pyarrow()
+        from pyarrow import feather
+
+        path = os.path.join(self.out_dir, file_name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._tables.get(file_name)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            table = feather.read_table(path, memory_map=True)
+            self._tables[file_name] = (mtime, table)
+            return table
+
+    @staticmethod
+    def _page(table, mask, offset: int, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        if mask is not None:
+            table = table.filter(mask)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        return table.num_rows, table.slice(max(0, offset), limit).to_pylist()
+
+    @staticmethod
+    def _and(mask, other):
+        import pyarrow.compute as pc
+        return other if mask is None else pc.and_(mask, other)
+
+    @staticmethod
+    def _keyword_mask(table, keyword: str, fields: List[str]):
+        import pyarrow.compute as pc
+        mask = None
+        for field in fields:
+            m = pc.match_substring(table[field], keyword, ignore_case=True)
+            mask = m if mask is None else pc.or_(mask, m)
+        return mask
+
+    def query_tables(
+        self,
+        keyword: str = "",
+        file: str = "",
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """按关键词（code/name/comment）和 PDM 文件过滤表，返回 (总数, 当前页)。"""
+        import pyarrow.compute as pc
+
+        table = self._open(TABLES_FILE)
+        mask = None
+        if keyword:
+            mask = self._keyword_mask(table, keyword, ["code", "name", "comment"])
+        if file:
+            mask = self._and(mask, pc.equal(table["file"], file))
+        return self._page(table, mask, offset, limit)
+
+    def query_columns(
+        self,
+        table_code: str = "",
+        keyword: str = "",
+        data_type: str = "",
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """按表代码、关键词（code/name/comment）和数据类型前缀过滤字段，返回 (总数, 当前页)。"""
+        import pyarrow.compute as pc
+
+        table = self._open(COLUMNS_FILE)
+        mask = None
+        if table_code:
+            mask = pc.equal(pc.utf8_upper(table["table_code"]), table_code.upper())
+        if keyword:
+            mask = self._and(mask, self._keyword_mask(table, keyword, ["code", "name", "comment"]))
+        if data_type:
+            mask = self._and(mask, pc.starts_with(table["data_type"], data_type, ignore_case=True))
+        return self._page(table, mask, offset, limit)
+
+
+# 模块级单例
+catalog_snapshot = CatalogSnapshot()
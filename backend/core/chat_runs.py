@@ -0,0 +1,289 @@
+"""
+backend/core/chat_runs.py
+
+对话运行（chat run）任务子系统：Agent 运行与 HTTP 请求生命周期解耦。
+
+- POST 提交后 run 持久化到 SQLite（chat_runs 表，与流式事件同库）并进入有界队列，立即返回 run_id
+- 固定数量的 worker 协程从队列取出 run 执行，worker 数与 HTTP 并发、Agent 限流分别配置
+- 运行过程中的事件发布到同 run_id 的 StreamRun，多个客户端（多个标签页）可同时订阅、断线续传；
+  订阅者全部断开不会取消 run
+- 运行结束后保存状态、完整回复和错误信息，可随时按 run_id 查询
+- 服务重启后，未开始的 run 重新入队；重启时正在运行的 run 标记为 interrupted（已生成的部分回复已保存到会话）
+
+实际执行逻辑由调用方注入（handler），本模块只负责排队、状态和持久化。
+"""
+
+import os
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.core.executors import SQLITE, run_blocking
+from backend.core.stream_buffer import StreamBuffer, StreamRun, CANCELLED, DONE, ERROR
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+INTERRUPTED = "interrupted"
+
+FINAL_STATUSES = (DONE, ERROR, CANCELLED, INTERRUPTED)
+
+
+class RunQueueFull(Exception):
+    """待执行的 run 已达上限。"""
+
+
+class ChatRunStore:
+    """chat_runs 表的读写，单连接 + 锁，跨线程安全。"""
+
+    def __init__(self, db_path: str = "./data/streams.db"):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS chat_runs (
+                    run_id      TEXT PRIMARY KEY,
+                    session_id  TEXT NOT NULL,
+                    message     TEXT NOT NULL,
+                    status      TEXT NOT NULL,
+                    output      TEXT DEFAULT '',
+                    error       TEXT,
+                    created_at  TEXT,
+                    started_at  TEXT,
+                    finished_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_chat_runs_status ON chat_runs(status, created_at);
+                CREATE INDEX IF NOT EXISTS idx_chat_runs_session ON chat_runs(session_id, created_at);
+            """)
+
+    def insert(self, run: Dict[str, Any]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO chat_runs (run_id, session_id, message, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run["run_id"], run["session_id"], run["message"], run["status"], run["created_at"]),
+            )
+
+    def update(self, run_id: str, **fields):
+        if not fields:
+            return
+        columns = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE chat_runs SET {columns} WHERE run_id = ?",
+                (*fields.values(), run_id),
+            )
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM chat_runs WHERE run_id = ?", (run_id,))
+            row = cursor.fetchone()
+            columns = [d[0] for d in cursor.description]
+        return dict(zip(columns, row)) if row else None
+
+    def list_by_status(self, status: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT * FROM chat_runs WHERE status = ? ORDER BY created_at", (status,)
+            )
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class ChatRunManager:
+    """对话运行队列与 worker 池，在事件循环中使用。"""
+
+    def __init__(
+        self,
+        store: ChatRunStore,
+        stream_buffer: StreamBuffer,
+        handler: Callable[[Dict[str, Any], StreamRun], Awaitable[Optional[str]]],
+        workers: int = 4,
+        max_queue: int = 100,
+    ):
+        """
+        Args:
+            store: run 状态存储
+            stream_buffer: 运行事件的发布 / 订阅缓冲
+            handler: 执行一个 run 的协程函数 handler(run_record, stream_run)，返回完整回复
+            workers: 同时执行的 run 数
+            max_queue: 排队中的 run 数上限，超出时提交失败（RunQueueFull）
+        """
+        self.store = store
+        self.stream_buffer = stream_buffer
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._cancel_requested: set = set()
+        self._claimed: set = set()      # 已被 worker 取出的 run_id
+        self._counters = {"submitted": 0, "rejected": 0, "done": 0, "error": 0, "cancelled": 0}
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """启动 worker，并恢复上次退出时未完成的 run。"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"chat-run-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+        for record in await run_blocking(SQLITE, self.store.list_by_status, RUNNING):
+            await run_blocking(
+                SQLITE, self.store.update, record["run_id"],
+                status=INTERRUPTED, error="服务重启，运行被中断", finished_at=_now(),
+            )
+        queued = await run_blocking(SQLITE, self.store.list_by_status, QUEUED)
+        for record in queued:
+            self.stream_buffer.create(record["session_id"], run_id=record["run_id"])
+            self._queue.put_nowait(record["run_id"])
+        if queued:
+            logger.info(f"[ChatRuns] 已恢复 {len(queued)} 个排队中的 run")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        self._queue = None
+
+    # ------------------------------------------------------------------
+    # 提交 / 查询 / 取消
+    # ------------------------------------------------------------------
+
+    async def submit(self, session_id: str, message: str) -> Dict[str, Any]:
+        """持久化并排队一个 run，返回 run 记录；排队已满时抛出 RunQueueFull。"""
+        await self.start()
+        if self._queue.qsize() >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise RunQueueFull(f"排队中的运行已达上限 {self.max_queue}，请稍后重试")
+
+        record = {
+            "run_id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "message": message,
+            "status": QUEUED,
+            "created_at": _now(),
+        }
+        await run_blocking(SQLITE, self.store.insert, record)
+        self.stream_buffer.create(session_id, run_id=record["run_id"])
+        self._queue.put_nowait(record["run_id"])
+        self._counters["submitted"] += 1
+        return record
+
+    async def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        return await run_blocking(SQLITE, self.store.get, run_id)
+
+    async def cancel(self, run_id: str) -> bool:
+        """取消排队中或运行中的 run，已结束的 run 返回 False。"""
+        record = await self.get(run_id)
+        if record is None or record["status"] in FINAL_STATUSES:
+            return False
+        self._cancel_requested.add(run_id)
+        task = self._tasks.get(run_id)
+        if task is not None:
+            task.cancel()
+        elif run_id not in self._claimed and record["status"] == QUEUED:
+            # 尚未被 worker 取出：直接落库为已取消，worker 取到后跳过
+            stream_run = self.stream_buffer.get(run_id) or self.stream_buffer.create(record["session_id"], run_id=run_id)
+            await self._finish(record, stream_run, CANCELLED)
+        # 已被 worker 取出但任务尚未创建时，由 _execute 在登记任务后检查 _cancel_requested
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._tasks),
+            **self._counters,
+        }
+
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+
+    async def _worker(self, index: int):
+        while True:
+            run_id = await self._queue.get()
+            try:
+                await self._execute(run_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[ChatRuns] worker-{index} 执行 run {run_id} 失败: {e}", exc_info=True)
+
+    async def _execute(self, run_id: str):
+        if run_id in self._cancel_requested:
+            # 排队期间已被 cancel() 结束
+            self._cancel_requested.discard(run_id)
+            return
+        self._claimed.add(run_id)
+        try:
+            await self._execute_claimed(run_id)
+        finally:
+            self._claimed.discard(run_id)
+            self._cancel_requested.discard(run_id)
+
+    async def _execute_claimed(self, run_id: str):
+        record = await self.get(run_id)
+        if record is None or record["status"] != QUEUED:
+            return
+        stream_run = self.stream_buffer.get(run_id) or self.stream_buffer.create(record["session_id"], run_id=run_id)
+
+        if run_id in self._cancel_requested:
+            self._cancel_requested.discard(run_id)
+            await self._finish(record, stream_run, CANCELLED)
+            return
+
+        await run_blocking(SQLITE, self.store.update, run_id, status=RUNNING, started_at=_now())
+        task = asyncio.create_task(self.handler(record, stream_run))
+        self._tasks[run_id] = task
+        # 更新状态期间到达的取消请求找不到任务，登记后补上
+        if run_id in self._cancel_requested:
+            task.cancel()
+        try:
+            await task
+            status = ERROR if stream_run.failed else DONE
+            error = stream_run.error
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            status, error = CANCELLED, None
+        except Exception as e:
+            logger.error(f"[ChatRuns] run {run_id} 执行失败: {e}", exc_info=True)
+            stream_run.publish({"error": str(e)})
+            status, error = ERROR, str(e)
+        finally:
+            self._tasks.pop(run_id, None)
+            self._cancel_requested.discard(run_id)
+        await self._finish(record, stream_run, status, error)
+
+    async def _finish(self, record: Dict[str, Any], stream_run: StreamRun, status: str,
+                      error: Optional[str] = None):
+        stream_run.finish(status)
+        self._counters[status] = self._counters.get(status, 0) + 1
+        await run_blocking(
+            SQLITE, self.store.update, record["run_id"],
+            status=status, output=stream_run.text, error=error, finished_at=_now(),
+        )
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
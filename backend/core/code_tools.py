@@ -8,36 +8,27 @@ import os
 import json
 import sqlite3
 import logging
+from typing import ClassVar
 from langchain.tools import BaseTool
-from chromadb import PersistentClient
-from chromadb.utils import embedding_functions
 
 from backend.config import settings
+from backend.core import embedding_registry
+from backend.core.executors import ExecutorToolMixin, SQLITE, EMBEDDING
 
 logger = logging.getLogger(__name__)
 
 
-def _get_embedding_fn():
-    """统一的嵌入函数工厂，使用多语言模型。"""
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=settings.MODEL_NAME
-    )
-
-
-class SearchCodeTool(BaseTool):
+class SearchCodeTool(ExecutorToolMixin, BaseTool):
     name: str = "search_code"
+    executor_name: ClassVar[str] = EMBEDDING
     description: str = (
         "Performs a semantic search across indexed code to find relevant code snippets. "
         "Input should be a natural language query describing what code you're looking for."
     )
 
     def _run(self, query: str) -> str:
-        chroma_path = settings.CHROMA_DB_PATH
-        embedding_fn = _get_embedding_fn()
-
-        client = PersistentClient(path=chroma_path)
         try:
-            collection = client.get_collection(name="code_chunks", embedding_function=embedding_fn)
+            collection = embedding_registry.get_collection("code_chunks")
         except Exception:
             return "Code index not found. Please index a code source first."
 
@@ -65,8 +56,9 @@ class SearchCodeTool(BaseTool):
         return output
 
 
-class GetCodeStructureTool(BaseTool):
+class GetCodeStructureTool(ExecutorToolMixin, BaseTool):
     name: str = "get_code_structure"
+    executor_name: ClassVar[str] = SQLITE
     description: str = (
         "Gets the code structure (classes, methods, fields) for a specific file path. "
         "Input should be a file path or partial path to search for."
@@ -100,8 +92,9 @@ class GetCodeStructureTool(BaseTool):
         return output
 
 
-class GetClassDetailTool(BaseTool):
+class GetClassDetailTool(ExecutorToolMixin, BaseTool):
     name: str = "get_class_detail"
+    executor_name: ClassVar[str] = SQLITE
     description: str = (
         "Gets detailed information about a specific class by name. "
         "Input should be a class name (e.g., 'UserController' or 'com.example.UserService')."
@@ -153,8 +146,9 @@ class GetClassDetailTool(BaseTool):
         return output
 
 
-class SearchAPIEndpointsTool(BaseTool):
+class SearchAPIEndpointsTool(ExecutorToolMixin, BaseTool):
     name: str = "search_api_endpoints"
+    executor_name: ClassVar[str] = SQLITE
     description: str = (
         "Searches for API endpoints (Spring REST mappings) in the indexed code. "
         "Input should be a keyword to filter endpoints (e.g., 'user', 'login', '/api/v1')."
@@ -201,8 +195,9 @@ class SearchAPIEndpointsTool(BaseTool):
         return output or f"No API endpoints with paths found matching '{keyword}'."
 
 
-class GrepCodeTool(BaseTool):
+class GrepCodeTool(ExecutorToolMixin, BaseTool):
     name: str = "grep_code"
+    executor_name: ClassVar[str] = SQLITE
     description: str = (
         "在索引的代码内容中精确搜索关键词（类似 grep）。"
         "适用于搜索精确的类名、函数名、CSS class、icon 名、变量名等。"
@@ -0,0 +1,119 @@
+"""
+backend/core/concurrency.py
+
+异步并发限流器。
+
+限制同时执行的 Agent 调用数，超出的请求在事件循环中排队等待（不占用线程）：
+- 同时执行数达到 max_concurrency 时新请求排队
+- 排队数达到 max_queue 时直接拒绝（ConcurrencyLimitExceeded，路由层返回 503）
+- 排队超过 queue_timeout 秒仍未轮到时放弃（同样返回 503）
+
+stats() 提供执行中 / 排队中数量及累计计数、排队耗时，供 /metrics 接口输出。
+"""
+
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """排队已满或排队超时。"""
+
+
+class AsyncConcurrencyLimiter:
+    """基于 asyncio.Semaphore 的并发限流器，带有界排队和指标。"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        queue_timeout: float = 30.0,
+    ):
+        """
+        Args:
+            name: 限流器名称（用于日志和指标）
+            max_concurrency: 同时执行数上限
+            max_queue: 排队数上限，0 表示不排队（满即拒绝）
+            queue_timeout: 排队等待的最长秒数
+        """
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._max_waiting = 0
+        self._total_wait = 0.0
+        self._counters = {"accepted": 0, "rejected": 0, "timeout": 0, "completed": 0, "failed": 0}
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """获取一个执行名额；排队已满或排队超时抛出 ConcurrencyLimitExceeded。"""
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise ConcurrencyLimitExceeded(
+                f"[{self.name}] 当前请求过多（执行中 {self._in_flight}，排队 {self._waiting}），请稍后重试"
+            )
+
+        started = time.monotonic()
+        self._waiting += 1
+        self._max_waiting = max(self._max_waiting, self._waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._counters["timeout"] += 1
+            raise ConcurrencyLimitExceeded(
+                f"[{self.name}] 排队超过 {self.queue_timeout} 秒，请稍后重试"
+            )
+        finally:
+            self._waiting -= 1
+            self._total_wait += time.monotonic() - started
+
+        self._in_flight += 1
+        self._counters["accepted"] += 1
+        try:
+            yield
+            self._counters["completed"] += 1
+        except BaseException:
+            self._counters["failed"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """限流器指标：执行中 / 排队中数量、排队峰值、平均排队耗时及累计计数。"""
+        waited = self._counters["accepted"] + self._counters["timeout"]
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "max_waiting": self._max_waiting,
+            "avg_wait_ms": round(self._total_wait * 1000 / waited, 1) if waited else 0.0,
+            **self._counters,
+        }
+
+
+_agent_limiter = None
+
+
+def get_agent_limiter() -> AsyncConcurrencyLimiter:
+    """获取 Agent 调用的全局限流器（单例）。"""
+    global _agent_limiter
+    if _agent_limiter is None:
+        _agent_limiter = AsyncConcurrencyLimiter(
+            "agent",
+            max_concurrency=settings.AGENT_MAX_CONCURRENCY,
+            max_queue=settings.AGENT_MAX_QUEUE,
+            queue_timeout=settings.AGENT_QUEUE_TIMEOUT,
+        )
+    return _agent_limiter
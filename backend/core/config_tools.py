@@ -6,24 +6,19 @@ backend/core/config_tools.py
 
 import sqlite3
 import logging
+from typing import ClassVar
 from langchain.tools import BaseTool
-from chromadb import PersistentClient
-from chromadb.utils import embedding_functions
 
 from backend.config import settings
+from backend.core import embedding_registry
+from backend.core.executors import ExecutorToolMixin, SQLITE, EMBEDDING
 
 logger = logging.getLogger(__name__)
 
 
-def _get_embedding_fn():
-    """统一的嵌入函数工厂，使用多语言模型。"""
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=settings.MODEL_NAME
-    )
-
-
-class ConfigLookupTool(BaseTool):
+class ConfigLookupTool(ExecutorToolMixin, BaseTool):
     name: str = "config_lookup"
+    executor_name: ClassVar[str] = EMBEDDING
     description: str = (
         "查找配置项。先按 key 精确匹配（如 spring.datasource.url），"
         "再走语义搜索。适用于查询数据库连接配置、端口号、第三方服务地址等。"
@@ -60,14 +55,8 @@ class ConfigLookupTool(BaseTool):
             return output
 
         # Step 2: Semantic search in ChromaDB
-        chroma_path = settings.CHROMA_DB_PATH
-        embedding_fn = _get_embedding_fn()
-        client = PersistentClient(path=chroma_path)
-
         try:
-            collection = client.get_collection(
-                name="config_entries", embedding_function=embedding_fn
-            )
+            collection = embedding_registry.get_collection("config_entries")
         except Exception:
             return f"Config index not found. No config entries matching '{query}'."
 
@@ -87,8 +76,9 @@ class ConfigLookupTool(BaseTool):
         return output
 
 
-class ListConfigsTool(BaseTool):
+class ListConfigsTool(ExecutorToolMixin, BaseTool):
     name: str = "list_configs"
+    executor_name: ClassVar[str] = SQLITE
     description: str = (
         "列出配置文件概览，按文件分组展示配置数量和 profile 信息。"
         "可选输入 source_id 或文件路径进行过滤，不输入则返回所有。"
@@ -5,17 +5,23 @@ conversation_manager.py
 
 功能：
 - 维护多个会话（session），每个会话有独立的对话历史
-- 支持将会话历史持久化到本地 JSON 文件，程序重启后可恢复
-- 支持限制最大上下文消息数量，防止上下文窗口溢出
+- 支持将会话历史持久化到本地 SQLite（WAL），每条消息追加写入，程序重启后可恢复
+- 支持按消息数量和估算 token 预算限制上下文，防止上下文窗口溢出
+- 滚动摘要：历史超过阈值时，后台将较早的对话增量压缩为摘要，后续轮次复用
+- 启动时只加载会话摘要，消息历史首次访问时才从存储读取，并由 LRU 缓存限制常驻内存的会话数
+- 线程安全：每个会话一把锁，API 按显式 session_id 操作，不依赖全局“当前会话”
 - 提供会话的创建、切换、清空、删除、列举等管理操作
 """
 
-import os
-import json
 import uuid
+import asyncio
 import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import Callable, Deque, Iterator, List, Optional, Dict, Any
 from langchain_core.messages import (
     BaseMessage,
     HumanMessage,
@@ -25,8 +31,15 @@ from langchain_core.messages import (
     messages_to_dict,
 )
 
+from backend.core.conversation_store import ConversationStore
+from backend.core.token_utils import message_tokens
+
 logger = logging.getLogger(__name__)
 
+# 摘要消息的前缀（以 HumanMessage + AIMessage 一问一答的形式放在历史最前面发送给 Agent）
+SUMMARY_PREFIX = "【此前对话摘要】"
+SUMMARY_ACK = "好的，我已了解此前的对话内容。"
+
 
 class ConversationSession:
     """表示一个独立的对话会话。"""
@@ -36,64 +49,178 @@ class ConversationSession:
         session_id: str,
         name: str = "",
         max_messages: int = 50,
+        token_budget: int = 0,
     ):
         """
         Args:
             session_id: 会话唯一标识
             name: 会话的可读名称
             max_messages: 保留的最大消息数（超出后自动裁剪最早的消息）
+            token_budget: 保留历史的估算 token 上限（超出后自动裁剪最早的消息），0 表示不限
         """
         self.session_id = session_id
         self.name = name or "新的聊天"
         self.max_messages = max_messages
-        self.messages: List[BaseMessage] = []
+        self.token_budget = token_budget
         self.created_at: str = datetime.now().isoformat()
         self.updated_at: str = self.created_at
-
-    def add_message(self, message: BaseMessage) -> None:
-        """添加一条消息到历史记录，并在超出限制时自动裁剪。"""
+        # SystemMessage 单独保存，不参与裁剪；其余消息按时间顺序放在 deque 中，
+        # 与每条消息的 token 数一一对应，total_tokens 为其累计值
+        self._system: List[BaseMessage] = []
+        self._turns: Deque[BaseMessage] = deque()
+        self._turn_tokens: Deque[int] = deque()
+        self.total_tokens = 0
+        # 已折叠进摘要的较早对话（滚动摘要），为空表示尚未摘要；摘要的 token 数计入预算
+        self._summary: str = ""
+        self._summary_tokens = 0
+        # 保护 messages 的增删（可重入，ConversationManager 写存储时也持有该锁）
+        self.lock = threading.RLock()
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    @summary.setter
+    def summary(self, summary: str) -> None:
+        self._summary = summary or ""
+        self._summary_tokens = sum(message_tokens(m) for m in self._summary_messages())
+
+    def _summary_messages(self) -> List[BaseMessage]:
+        """摘要以一问一答的形式发送，后面保留的对话仍从用户消息开始，不会出现连续两条用户消息。"""
+        if not self._summary:
+            return []
+        return [
+            HumanMessage(content=f"{SUMMARY_PREFIX}\n{self._summary}", additional_kwargs={"summary": True}),
+            AIMessage(content=SUMMARY_ACK, additional_kwargs={"summary": True}),
+        ]
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """完整消息列表（SystemMessage 在前）。"""
+        return self._system + list(self._turns)
+
+    @messages.setter
+    def messages(self, messages: List[BaseMessage]) -> None:
+        """整体替换消息（从存储恢复时使用，不做裁剪）。"""
+        with self.lock:
+            self._system, self._turns, self._turn_tokens = [], deque(), deque()
+            self.total_tokens = 0
+            for message in messages:
+                self._push(message)
+
+    @staticmethod
+    def _token_count(message: BaseMessage) -> int:
+        """读取缓存在 additional_kwargs 中的 token 数，没有则估算并缓存。"""
+        if message.additional_kwargs is None:
+            message.additional_kwargs = {}
+        tokens = message.additional_kwargs.get("token_count")
+        if not isinstance(tokens, int):
+            tokens = message_tokens(message)
+            message.additional_kwargs["token_count"] = tokens
+        return tokens
+
+    def _push(self, message: BaseMessage) -> None:
+        tokens = self._token_count(message)
+        if isinstance(message, SystemMessage):
+            self._system.append(message)
+            return
+        self._turns.append(message)
+        self._turn_tokens.append(tokens)
+        self.total_tokens += tokens
+
+    def _pop_oldest(self) -> None:
+        self._turns.popleft()
+        self.total_tokens -= self._turn_tokens.popleft()
+
+    def _over_limit(self) -> bool:
+        if len(self._turns) > self.max_messages:
+            return True
+        return bool(self.token_budget) and self.total_tokens + self._summary_tokens > self.token_budget
+
+    def _trim(self) -> int:
+        """超出消息数或 token 预算（含摘要）时从最早的消息开始移除，返回移除的条数。"""
+        # 始终保留最新一条
+        removed = 0
+        while len(self._turns) > 1 and self._over_limit():
+            self._pop_oldest()
+            removed += 1
+        # 裁剪后不以孤立的 AI 回复 / 工具消息开头
+        if removed:
+            while len(self._turns) > 1 and not isinstance(self._turns[0], HumanMessage):
+                self._pop_oldest()
+                removed += 1
+        return removed
+
+    def add_message(self, message: BaseMessage) -> int:
+        """添加一条消息到历史记录，并在超出限制时自动裁剪。返回被裁剪掉的消息数。"""
+        with self.lock:
+            return self._add_message(message)
+
+    def _add_message(self, message: BaseMessage) -> int:
         # 为消息打上时间戳（毫秒），存储在 additional_kwargs 中以保证可序列化
         if message.additional_kwargs is None:
             message.additional_kwargs = {}
         if "timestamp" not in message.additional_kwargs:
             message.additional_kwargs["timestamp"] = int(datetime.now().timestamp() * 1000)
-        self.messages.append(message)
+        self._push(message)
         self.updated_at = datetime.now().isoformat()
 
-        # 超出最大消息数时，移除最早的非 SystemMessage 消息对
-        if len(self.messages) > self.max_messages:
-            non_system_indices = [
-                i for i, m in enumerate(self.messages)
-                if not isinstance(m, SystemMessage)
-            ]
-            if len(non_system_indices) >= 2:
-                # 移除最早的一对消息
-                self.messages.pop(non_system_indices[0])
-                # 索引变了，重新找
-                non_system_indices = [
-                    i for i, m in enumerate(self.messages)
-                    if not isinstance(m, SystemMessage)
-                ]
-                if non_system_indices:
-                    self.messages.pop(non_system_indices[0])
+        removed = self._trim()
 
         logger.debug(
-            f"[Session {self.session_id[:8]}] 消息数: {len(self.messages)}"
+            f"[Session {self.session_id[:8]}] 消息数: {len(self._turns)}, "
+            f"估算 token: {self.total_tokens}"
         )
+        return removed
 
     def get_history(self) -> List[BaseMessage]:
-        """返回完整的消息历史列表。"""
-        return list(self.messages)
+        """返回发送给 Agent 的消息历史：有滚动摘要时，摘要问答排在 SystemMessage 之后、对话之前。"""
+        with self.lock:
+            return self._system + self._summary_messages() + list(self._turns)
+
+    def foldable(self, keep: int) -> List[BaseMessage]:
+        """
+        返回可折叠进摘要的较早消息：保留最近 keep 条，且保留部分从用户消息开始。
+        """
+        with self.lock:
+            turns = list(self._turns)
+        idx = len(turns) - keep
+        if idx <= 0:
+            return []
+        while idx < len(turns) - 1 and not isinstance(turns[idx], HumanMessage):
+            idx += 1
+        return turns[:idx]
+
+    def fold(self, folded: List[BaseMessage], summary: str) -> int:
+        """
+        用新摘要替换 folded 中仍位于历史开头的消息，返回实际移除的条数
+        （新摘要较长导致超出 token 预算时，还包括随后裁剪掉的最早消息）。
+        folded 中的消息若已被裁剪或清空，则只移除剩余部分；一条都没有时不更新摘要。
+        """
+        ids = {id(m) for m in folded}
+        removed = 0
+        with self.lock:
+            while len(self._turns) > 1 and id(self._turns[0]) in ids:
+                self._pop_oldest()
+                removed += 1
+            if removed:
+                self.summary = summary
+                removed += self._trim()
+        return removed
 
     def clear(self) -> None:
         """清空对话历史（保留 SystemMessage）。"""
-        self.messages = [m for m in self.messages if isinstance(m, SystemMessage)]
-        self.updated_at = datetime.now().isoformat()
+        with self.lock:
+            self._turns.clear()
+            self._turn_tokens.clear()
+            self.total_tokens = 0
+            self.summary = ""
+            self.updated_at = datetime.now().isoformat()
         logger.info(f"[Session {self.session_id[:8]}] 对话历史已清空。")
 
     def message_count(self) -> int:
         """返回非 SystemMessage 的消息数量。"""
-        return sum(1 for m in self.messages if not isinstance(m, SystemMessage))
+        return len(self._turns)
 
     def to_dict(self) -> Dict[str, Any]:
         """序列化为可 JSON 存储的字典。"""
@@ -101,6 +228,8 @@ class ConversationSession:
             "session_id": self.session_id,
             "name": self.name,
             "max_messages": self.max_messages,
+            "token_budget": self.token_budget,
+            "summary": self.summary,
             "created_at": self.created_at,
             "updated_at": self.updated_at,
             "messages": messages_to_dict(self.messages),
@@ -113,9 +242,11 @@ class ConversationSession:
             session_id=data["session_id"],
             name=data.get("name", ""),
             max_messages=data.get("max_messages", 50),
+            token_budget=data.get("token_budget", 0),
         )
         session.created_at = data.get("created_at", datetime.now().isoformat())
         session.updated_at = data.get("updated_at", session.created_at)
+        session.summary = data.get("summary", "")
         try:
             session.messages = messages_from_dict(data.get("messages", []))
         except Exception as e:
@@ -130,30 +261,332 @@ class ConversationSession:
         )
 
 
+class LazySessionMap:
+    """
+    session_id -> ConversationSession 的惰性映射。
+
+    所有会话的摘要（名称、时间、消息数）常驻内存；消息历史在首次通过 get / [] 访问时
+    才由 loader 从存储读取（hydrate）。已加载的会话按 LRU 保留最多 capacity 个，
+    超出时淘汰最久未访问的会话（其数据已写入存储，淘汰只释放内存）。
+    被 pin 的会话（当前会话、正在对话中的会话）不会被淘汰。
+
+    摘要读取（summary / summaries / in / len）不加锁，列表接口不会被正在写入的会话阻塞。
+    """
+
+    def __init__(
+        self,
+        loader: Optional[Callable[[str], List[BaseMessage]]] = None,
+        capacity: int = 64,
+        token_budget: int = 0,
+        summary_loader: Optional[Callable[[str], str]] = None,
+    ):
+        """
+        Args:
+            loader: session_id -> 消息列表；为 None 时不淘汰（无存储可回读）。
+            capacity: 常驻内存的已加载会话上限。
+            token_budget: 加载后会话的历史 token 预算（见 ConversationSession）。
+            summary_loader: session_id -> 滚动摘要。
+        """
+        self._loader = loader
+        self._summary_loader = summary_loader
+        self.capacity = max(1, capacity)
+        self.token_budget = token_budget
+        self._pins: Dict[str, int] = {}
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._hydrated: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _summary_of(session: ConversationSession) -> Dict[str, Any]:
+        return {
+            "session_id": session.session_id,
+            "name": session.name,
+            "max_messages": session.max_messages,
+            "message_count": session.message_count(),
+            "created_at": session.created_at,
+            "updated_at": session.updated_at,
+        }
+
+    def add_summary(self, summary: Dict[str, Any]) -> None:
+        """登记一个尚未加载消息的会话摘要。"""
+        with self._lock:
+            self._summaries[summary["session_id"]] = dict(summary)
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """返回会话摘要；已加载的会话以内存中的最新状态为准。"""
+        session = self._hydrated.get(session_id)
+        if session is not None:
+            return self._summary_of(session)
+        summary = self._summaries.get(session_id)
+        return dict(summary) if summary else None
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        result = []
+        for sid in list(self._summaries):
+            summary = self.summary(sid)
+            if summary:
+                result.append(summary)
+        return result
+
+    def pin(self, session_id: str) -> None:
+        """标记会话正在使用，期间不会被淘汰（可嵌套）。"""
+        with self._lock:
+            self._pins[session_id] = self._pins.get(session_id, 0) + 1
+
+    def unpin(self, session_id: str) -> None:
+        with self._lock:
+            count = self._pins.get(session_id, 0) - 1
+            if count > 0:
+                self._pins[session_id] = count
+            else:
+                self._pins.pop(session_id, None)
+            self._evict()
+
+    def is_hydrated(self, session_id: str) -> bool:
+        return session_id in self._hydrated
+
+    def hydrated_count(self) -> int:
+        return len(self._hydrated)
+
+    def _hydrate(self, session_id: str) -> ConversationSession:
+        meta = self._summaries[session_id]
+        session = ConversationSession(
+            session_id=session_id,
+            name=meta.get("name") or "",
+            max_messages=meta.get("max_messages") or 50,
+            token_budget=self.token_budget,
+        )
+        session.created_at = meta.get("created_at") or session.created_at
+        session.updated_at = meta.get("updated_at") or session.created_at
+        if self._loader:
+            try:
+                session.messages = self._loader(session_id)
+                if self._summary_loader:
+                    session.summary = self._summary_loader(session_id)
+            except Exception as e:
+                logger.warning(f"恢复会话消息失败，将使用空历史: {e}")
+        return session
+
+    def _evict(self) -> None:
+        if self._loader is None:
+            return
+        for sid in list(self._hydrated):
+            if len(self._hydrated) <= self.capacity:
+                break
+            if sid in self._pins:
+                continue
+            session = self._hydrated.pop(sid)
+            self._summaries[sid] = self._summary_of(session)
+            logger.debug(f"[Session {sid[:8]}] 已从内存缓存淘汰")
+
+    def get(self, session_id: Optional[str], default=None) -> Optional[ConversationSession]:
+        with self._lock:
+            if session_id not in self._summaries:
+                return default
+            session = self._hydrated.get(session_id)
+            if session is None:
+                session = self._hydrate(session_id)
+                self._hydrated[session_id] = session
+                self._evict()
+            else:
+                self._hydrated.move_to_end(session_id)
+            return session
+
+    def __getitem__(self, session_id: str) -> ConversationSession:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: ConversationSession) -> None:
+        with self._lock:
+            self._summaries[session_id] = self._summary_of(session)
+            self._hydrated[session_id] = session
+            self._hydrated.move_to_end(session_id)
+            self._evict()
+
+    def __delitem__(self, session_id: str) -> None:
+        with self._lock:
+            del self._summaries[session_id]
+            self._hydrated.pop(session_id, None)
+
+    def __contains__(self, session_id) -> bool:
+        return session_id in self._summaries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._summaries))
+
+    def __len__(self) -> int:
+        return len(self._summaries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._summaries.clear()
+            self._hydrated.clear()
+
+
+class _TurnWaiter:
+    """TurnLock 的一个等待者：同步线程用 event 唤醒，协程用 loop + future 唤醒。"""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+        self.granted = False
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            pass    # 事件循环已关闭
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class TurnLock:
+    """
+    会话的对话轮次锁：按等待顺序（FIFO）获取，释放时由释放线程直接移交给下一个等待者，
+    新来的请求不能插队。同步线程（acquire）和事件循环中的协程（acquire_async）都可等待，
+    锁可以在获取它之外的线程释放。
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locked = False
+        self._waiters: Deque[_TurnWaiter] = deque()
+
+    def locked(self) -> bool:
+        return self._locked
+
+    def _try_acquire(self) -> bool:
+        if not self._locked and not self._waiters:
+            self._locked = True
+            return True
+        return False
+
+    def acquire(self, timeout: float = -1) -> bool:
+        """阻塞获取（timeout=-1 一直等待，0 为非阻塞），超时返回 False。"""
+        with self._mutex:
+            if self._try_acquire():
+                return True
+            if timeout == 0:
+                return False
+            waiter = _TurnWaiter()
+            self._waiters.append(waiter)
+        waiter.event.wait(None if timeout < 0 else timeout)
+        with self._mutex:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """在事件循环中等待获取（timeout=None 一直等待），超时返回 False。"""
+        with self._mutex:
+            if self._try_acquire():
+                return True
+            if timeout is not None and timeout <= 0:
+                return False
+            waiter = _TurnWaiter(asyncio.get_running_loop())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._mutex:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    raise
+            # 取消时锁已移交给本等待者，转交给下一个
+            self.release()
+            raise
+        with self._mutex:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def release(self) -> None:
+        """释放锁；有等待者时直接移交给最早的等待者。"""
+        with self._mutex:
+            if not self._waiters:
+                self._locked = False
+                return
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+        waiter.wake()
+
+
 class ConversationManager:
     """
     多会话上下文管理器。
 
     支持：
     - 创建 / 切换 / 删除 / 列举会话
-    - 自动持久化（保存到 JSON 文件）
+    - 自动持久化（SQLite 会话存储，见 ConversationStore）
     - 控制每个会话的最大上下文长度
     """
 
     def __init__(
         self,
-        persist_path: str = "./data/conversations.json",
+        db_path: Optional[str] = "./data/conversations.db",
         max_messages_per_session: int = 50,
+        legacy_json_path: Optional[str] = None,
+        cache_size: int = 64,
+        token_budget: int = 0,
+        summarizer: Optional[Callable[[str, List[BaseMessage]], str]] = None,
+        summary_threshold: int = 0,
+        summary_keep_messages: int = 6,
     ):
         """
         Args:
-            persist_path: 持久化文件路径。设为 None 则不持久化。
+            db_path: SQLite 会话库路径。设为 None 则不持久化。
             max_messages_per_session: 每个会话默认保留的最大消息数。
+            legacy_json_path: 旧版 conversations.json 路径；会话库为空且该文件存在时自动迁移。
+            cache_size: 内存中最多保留多少个已加载消息历史的会话（LRU 淘汰）。
+            token_budget: 每个会话保留历史的估算 token 上限，0 表示只按消息数裁剪。
+            summarizer: (已有摘要, 待折叠消息) -> 新摘要；为 None 时不做滚动摘要。
+            summary_threshold: 会话历史估算 token 超过该值时触发后台摘要，0 表示不摘要。
+            summary_keep_messages: 摘要时保留原文的最近消息数。
         """
-        self.persist_path = persist_path
+        self.db_path = db_path
         self.max_messages_per_session = max_messages_per_session
-        self.sessions: Dict[str, ConversationSession] = {}
+        self.token_budget = token_budget
         self.current_session_id: Optional[str] = None
+        self.store: Optional[ConversationStore] = ConversationStore(db_path) if db_path else None
+        self.sessions = LazySessionMap(
+            loader=self.store.load_messages if self.store else None,
+            capacity=cache_size,
+            token_budget=token_budget,
+            summary_loader=self.store.get_summary if self.store else None,
+        )
+        # 保护会话的创建 / 删除 / 当前会话切换
+        self._lock = threading.RLock()
+        # 滚动摘要：单线程后台执行，同一会话同时最多一个摘要任务
+        self._summarizer = summarizer
+        self.summary_threshold = summary_threshold
+        self.summary_keep_messages = summary_keep_messages
+        self._summarizing: set = set()
+        self._summary_executor: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+            if summarizer and summary_threshold else None
+        )
+        # session_id -> 对话轮次锁，保证同一会话的“用户消息 → Agent → AI 回复”串行执行
+        self._turn_locks: Dict[str, TurnLock] = {}
+        # 当前持有者获取到的锁；会话删除后 _turn_locks 中的条目被移除，释放时仍使用这里记录的锁
+        self._held_locks: Dict[str, TurnLock] = {}
+
+        if self.store and legacy_json_path and self.store.is_empty():
+            try:
+                self.store.migrate_from_json(legacy_json_path)
+            except Exception as e:
+                logger.error(f"迁移 {legacy_json_path} 失败，将忽略旧会话文件: {e}")
 
         # 从磁盘加载已有会话
         self._load()
@@ -173,133 +606,289 @@ class ConversationManager:
             session_id=session_id,
             name=name or "新的聊天",
             max_messages=self.max_messages_per_session,
+            token_budget=self.token_budget,
         )
-        self.sessions[session_id] = session
-        self.current_session_id = session_id
-        self._save()
+        with self._lock:
+            self.sessions[session_id] = session
+            if self.store:
+                self.store.create_session(
+                    session_id, session.name, session.max_messages,
+                    session.created_at, session.updated_at,
+                )
+            self._set_current(session_id)
         logger.info(f"新建会话: {session}")
         return session
 
     def switch_session(self, session_id: str) -> Optional[ConversationSession]:
         """切换当前会话。返回切换后的会话，失败返回 None。"""
-        if session_id not in self.sessions:
-            logger.warning(f"会话 {session_id} 不存在。")
-            return None
-        self.current_session_id = session_id
+        with self._lock:
+            if session_id not in self.sessions:
+                logger.warning(f"会话 {session_id} 不存在。")
+                return None
+            self._set_current(session_id)
         logger.info(f"已切换至会话: {self.sessions[session_id]}")
         return self.sessions[session_id]
 
     def get_current_session(self) -> ConversationSession:
         """返回当前活跃会话，若不存在则自动创建。"""
-        if self.current_session_id not in self.sessions:
-            return self.new_session()
-        return self.sessions[self.current_session_id]
+        with self._lock:
+            if self.current_session_id not in self.sessions:
+                return self.new_session()
+            return self.sessions[self.current_session_id]
 
     def rename_session(self, session_id: str, name: str) -> bool:
         """重命名指定会话。成功返回 True，会话不存在返回 False。"""
         session = self.sessions.get(session_id)
         if not session:
             return False
-        session.name = name
-        session.updated_at = datetime.now().isoformat()
-        self._save()
+        with session.lock:
+            session.name = name
+            session.updated_at = datetime.now().isoformat()
+            if self.store:
+                self.store.rename_session(session_id, name, session.updated_at)
         logger.info(f"会话 {session_id[:8]} 已重命名为: {name}")
         return True
 
     def delete_session(self, session_id: str) -> bool:
         """删除指定会话。若删除的是当前会话，自动切换到其他会话。"""
-        if session_id not in self.sessions:
-            return False
-        del self.sessions[session_id]
-        if self.current_session_id == session_id:
-            # 切换到第一个可用会话，若无则创建新会话
-            if self.sessions:
-                self.current_session_id = next(iter(self.sessions))
-            else:
-                self.new_session(name="默认会话")
-        self._save()
+        with self._lock:
+            if session_id not in self.sessions:
+                return False
+            del self.sessions[session_id]
+            self._turn_locks.pop(session_id, None)
+            if self.store:
+                self.store.delete_session(session_id)
+            if self.current_session_id == session_id:
+                # 切换到第一个可用会话，若无则创建新会话
+                if self.sessions:
+                    self._set_current(next(iter(self.sessions)))
+                else:
+                    self.new_session(name="默认会话")
         logger.info(f"会话 {session_id[:8]} 已删除。")
         return True
 
     def list_sessions(self) -> List[Dict[str, Any]]:
-        """列出所有会话的摘要信息。"""
+        """列出所有会话的摘要信息（只读内存摘要，不加锁）。"""
         result = []
-        for sid, session in self.sessions.items():
+        for summary in self.sessions.summaries():
             result.append({
-                "session_id": sid,
-                "name": session.name,
-                "message_count": session.message_count(),
-                "created_at": session.created_at,
-                "updated_at": session.updated_at,
-                "is_current": sid == self.current_session_id,
+                "session_id": summary["session_id"],
+                "name": summary["name"],
+                "message_count": summary["message_count"],
+                "created_at": summary["created_at"],
+                "updated_at": summary["updated_at"],
+                "is_current": summary["session_id"] == self.current_session_id,
             })
         # 按更新时间降序排列
         result.sort(key=lambda x: x["updated_at"], reverse=True)
         return result
 
     # ---------------------------------------------------------------
-    # 消息操作（操作当前会话）
+    # 对话轮次锁
     # ---------------------------------------------------------------
 
-    def add_user_message(self, content: str) -> None:
-        """向当前会话添加用户消息。"""
-        self.get_current_session().add_message(HumanMessage(content=content))
-        self._save()
+    def acquire_session(self, session_id: str, timeout: float = -1) -> Optional[ConversationSession]:
+        """
+        获取会话的对话轮次锁，并在持有期间禁止该会话被缓存淘汰。
 
-    def add_ai_message(self, message: BaseMessage) -> None:
-        """向当前会话添加 AI 回复消息（支持 AIMessage 对象）。"""
-        self.get_current_session().add_message(message)
-        self._save()
+        会话不存在时返回 None 且不持有锁；timeout 内未获取到锁抛出 TimeoutError
+        （timeout=-1 一直等待，0 为非阻塞）。须与 release_session 成对调用；
+        锁可在其他线程释放，适用于异步流式响应。等待者按先后顺序获取锁。
+        """
+        lock = self._get_turn_lock(session_id)
+        if lock is None:
+            return None
+        if not lock.acquire(timeout):
+            raise TimeoutError(f"会话 {session_id} 正在处理其他请求")
+        return self._enter_turn(session_id, lock)
 
-    def get_history(self) -> List[BaseMessage]:
-        """返回当前会话的完整消息历史。"""
-        return self.get_current_session().get_history()
+    async def acquire_session_async(self, session_id: str,
+                                    timeout: Optional[float] = None) -> Optional[ConversationSession]:
+        """
+        acquire_session 的协程版本：在事件循环中等待锁，不占用线程；
+        timeout 秒内未获取到锁抛出 TimeoutError（None 表示一直等待）。
+        """
+        lock = self._get_turn_lock(session_id)
+        if lock is None:
+            return None
+        if not await lock.acquire_async(timeout):
+            raise TimeoutError(f"会话 {session_id} 正在处理其他请求")
+        return self._enter_turn(session_id, lock)
+
+    def _get_turn_lock(self, session_id: str) -> Optional[TurnLock]:
+        with self._lock:
+            if session_id not in self.sessions:
+                return None
+            return self._turn_locks.setdefault(session_id, TurnLock())
+
+    def _enter_turn(self, session_id: str, lock: TurnLock) -> Optional[ConversationSession]:
+        """已获取锁：会话仍存在时登记持有并返回会话，否则释放锁并返回 None。"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            # 等待期间会话已被删除
+            lock.release()
+            return None
+        self.sessions.pin(session_id)
+        with self._lock:
+            self._held_locks[session_id] = lock
+        return session
+
+    def release_session(self, session_id: str) -> None:
+        """释放 acquire_session 获取的对话轮次锁（会话已删除时同样释放，唤醒等待者）。"""
+        with self._lock:
+            lock = self._held_locks.pop(session_id, None)
+        if lock is None:
+            return
+        self.sessions.unpin(session_id)
+        lock.release()
+
+    @contextmanager
+    def session_turn(self, session_id: str):
+        """
+        同一会话的一轮对话串行执行，不同会话互不阻塞：
+
+            with conv_manager.session_turn(session_id) as session:
+                if session is None: ...  # 会话不存在
+        """
+        session = self.acquire_session(session_id)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                self.release_session(session_id)
+
+    # ---------------------------------------------------------------
+    # 消息操作（session_id 为空时操作当前会话）
+    # ---------------------------------------------------------------
+
+    def _resolve(self, session_id: Optional[str]) -> ConversationSession:
+        if session_id is None:
+            return self.get_current_session()
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(f"会话 {session_id} 不存在")
+        return session
+
+    def add_user_message(self, content: str, session_id: Optional[str] = None) -> None:
+        """向指定会话（默认当前会话）添加用户消息。"""
+        self._append(self._resolve(session_id), HumanMessage(content=content))
+
+    def add_ai_message(self, message: BaseMessage, session_id: Optional[str] = None) -> None:
+        """向指定会话（默认当前会话）添加 AI 回复消息（支持 AIMessage 对象）。"""
+        self._append(self._resolve(session_id), message)
+
+    def get_history(self, session_id: Optional[str] = None) -> List[BaseMessage]:
+        """返回指定会话（默认当前会话）的完整消息历史。"""
+        return self._resolve(session_id).get_history()
 
     def clear_current_session(self) -> None:
         """清空当前会话的对话历史（保留 SystemMessage）。"""
-        self.get_current_session().clear()
-        self._save()
+        self.clear_session(self.get_current_session().session_id)
+
+    def clear_session(self, session_id: str) -> bool:
+        """清空指定会话的对话历史（保留 SystemMessage）。会话不存在返回 False。"""
+        session = self.sessions.get(session_id)
+        if not session:
+            return False
+        with session.lock:
+            session.clear()
+            if self.store:
+                self.store.clear_messages(session_id, session.updated_at)
+        return True
 
     # ---------------------------------------------------------------
     # 持久化
     # ---------------------------------------------------------------
 
-    def _save(self) -> None:
-        """将所有会话序列化保存到 JSON 文件。"""
-        if not self.persist_path:
+    def _append(self, session: ConversationSession, message: BaseMessage) -> None:
+        """追加消息到会话，并只写入这一条消息（持久化开销与历史长度无关）。"""
+        # 持有会话锁写存储，保证存储中的消息顺序与内存一致
+        with session.lock:
+            trimmed = session.add_message(message)
+            if self.store:
+                try:
+                    self.store.append_message(
+                        session.session_id, message, session.updated_at, trimmed=trimmed
+                    )
+                except Exception as e:
+                    logger.error(f"保存消息失败: {e}")
+        self._maybe_summarize(session)
+
+    # ---------------------------------------------------------------
+    # 滚动摘要
+    # ---------------------------------------------------------------
+
+    def _maybe_summarize(self, session: ConversationSession) -> None:
+        """历史超过阈值时，提交后台任务将较早的消息折叠进摘要（不阻塞当前请求）。"""
+        if self._summary_executor is None or session.total_tokens <= self.summary_threshold:
             return
+        session_id = session.session_id
+        with self._lock:
+            if session_id in self._summarizing:
+                return
+            to_fold = session.foldable(self.summary_keep_messages)
+            if not to_fold:
+                return
+            self._summarizing.add(session_id)
+        self.sessions.pin(session_id)
+        self._summary_executor.submit(self._summarize, session_id, session.summary, to_fold)
+
+    def _summarize(self, session_id: str, previous: str, to_fold: List[BaseMessage]) -> None:
         try:
-            os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
-            data = {
-                "current_session_id": self.current_session_id,
-                "sessions": {
-                    sid: session.to_dict()
-                    for sid, session in self.sessions.items()
-                },
-            }
-            with open(self.persist_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            summary = self._summarizer(previous, to_fold)
+            if not summary:
+                return
+            session = self.sessions.get(session_id)
+            if session is None:
+                return
+            with session.lock:
+                folded = session.fold(to_fold, summary)
+                if folded and self.store:
+                    self.store.fold_messages(session_id, summary, folded)
+            logger.info(
+                f"[Session {session_id[:8]}] 已将 {folded} 条较早消息折叠进摘要，"
+                f"剩余估算 token: {session.total_tokens}"
+            )
         except Exception as e:
-            logger.error(f"保存会话失败: {e}")
+            logger.warning(f"[Session {session_id[:8]}] 生成历史摘要失败: {e}")
+        finally:
+            self.sessions.unpin(session_id)
+            with self._lock:
+                self._summarizing.discard(session_id)
+
+    def _set_current(self, session_id: Optional[str]) -> None:
+        if self.current_session_id and self.current_session_id != session_id:
+            self.sessions.unpin(self.current_session_id)
+        if session_id and session_id != self.current_session_id:
+            self.sessions.pin(session_id)
+        self.current_session_id = session_id
+        if self.store:
+            self.store.set_state("current_session_id", session_id)
 
     def _load(self) -> None:
-        """从 JSON 文件加载会话数据。"""
-        if not self.persist_path or not os.path.exists(self.persist_path):
+        """从 SQLite 会话库加载会话摘要（消息历史在首次访问时加载）。"""
+        if not self.store:
             return
         try:
-            with open(self.persist_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for sid, sdata in data.get("sessions", {}).items():
-                self.sessions[sid] = ConversationSession.from_dict(sdata)
-            self.current_session_id = data.get("current_session_id")
+            for meta in self.store.list_sessions():
+                if not meta.get("max_messages"):
+                    meta["max_messages"] = self.max_messages_per_session
+                self.sessions.add_summary(meta)
+            self._set_current_loaded(self.store.get_state("current_session_id"))
             logger.info(
-                f"已从 {self.persist_path} 加载 {len(self.sessions)} 个会话。"
+                f"已从 {self.db_path} 加载 {len(self.sessions)} 个会话摘要。"
             )
         except Exception as e:
             logger.error(f"加载会话失败，将使用空会话: {e}")
-            self.sessions = {}
+            self.sessions.clear()
             self.current_session_id = None
 
+    def _set_current_loaded(self, session_id: Optional[str]) -> None:
+        """启动时恢复当前会话（无需写回存储）。"""
+        if session_id in self.sessions:
+            self.sessions.pin(session_id)
+            self.current_session_id = session_id
+
     # ---------------------------------------------------------------
     # 格式化输出（用于 CLI 显示）
     # ---------------------------------------------------------------
@@ -0,0 +1,263 @@
+"""
+backend/core/conversation_store.py
+
+会话持久化存储（SQLite，WAL 模式）。
+
+替代原先每次变更都整体重写的 conversations.json：
+- sessions 表保存会话元信息（名称、时间、消息数、滚动摘要），updated_at 建索引用于排序
+- messages 表按会话追加写入消息，每条消息的持久化开销与历史长度无关
+- conversation_state 表保存当前会话 ID 等少量键值
+
+migrate_from_json() 可将旧版 conversations.json 一次性导入，导入后原文件改名为
+conversations.json.migrated.bak。
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+logger = logging.getLogger(__name__)
+
+# SystemMessage 在 messages_to_dict 中的 type 值，清空历史时保留
+SYSTEM_ROLE = "system"
+
+
+class ConversationStore:
+    """会话与消息的 SQLite 存储，单连接 + 锁，跨线程安全。"""
+
+    def __init__(self, db_path: str = "./data/conversations.db"):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id    TEXT PRIMARY KEY,
+                    name          TEXT DEFAULT '新的聊天',
+                    max_messages  INTEGER DEFAULT 50,
+                    message_count INTEGER DEFAULT 0,
+                    created_at    TEXT,
+                    updated_at    TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at);
+
+                CREATE TABLE IF NOT EXISTS messages (
+                    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+                    role       TEXT NOT NULL,
+                    data       TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+
+                CREATE TABLE IF NOT EXISTS conversation_state (
+                    key   TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            # 兼容旧库：补充滚动摘要列
+            try:
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT DEFAULT ''")
+            except sqlite3.OperationalError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 会话
+    # ------------------------------------------------------------------
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is None
+
+    def create_session(self, session_id: str, name: str, max_messages: int,
+                       created_at: str, updated_at: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions "
+                "(session_id, name, max_messages, message_count, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?)",
+                (session_id, name, max_messages, created_at, updated_at),
+            )
+
+    def rename_session(self, session_id: str, name: str, updated_at: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sessions SET name = ?, updated_at = ? WHERE session_id = ?",
+                (name, updated_at, session_id),
+            )
+
+    def delete_session(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """返回全部会话的元信息（不含消息），按 updated_at 降序。"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT session_id, name, max_messages, message_count, created_at, updated_at "
+                "FROM sessions ORDER BY updated_at DESC"
+            )
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # ------------------------------------------------------------------
+    # 消息
+    # ------------------------------------------------------------------
+
+    def append_message(self, session_id: str, message: BaseMessage, updated_at: str,
+                       trimmed: int = 0):
+        """
+        追加一条消息；trimmed > 0 时同时删除该会话最早的 trimmed 条非 system 消息，
+        与内存中 ConversationSession 的裁剪保持一致。
+        """
+        data = messages_to_dict([message])[0]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO messages (session_id, role, data) VALUES (?, ?, ?)",
+                (session_id, data.get("type", ""), json.dumps(data, ensure_ascii=False)),
+            )
+            if trimmed:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE id IN ("
+                    "  SELECT id FROM messages WHERE session_id = ? AND role != ? "
+                    "  ORDER BY id LIMIT ?)",
+                    (session_id, SYSTEM_ROLE, trimmed),
+                )
+            self._conn.execute(
+                "UPDATE sessions SET updated_at = ?, "
+                "message_count = message_count + ? WHERE session_id = ?",
+                (updated_at, (0 if data.get("type") == SYSTEM_ROLE else 1) - trimmed, session_id),
+            )
+
+    def fold_messages(self, session_id: str, summary: str, folded: int):
+        """保存滚动摘要，并删除已折叠进摘要的最早 folded 条非 system 消息。"""
+        with self._lock, self._conn:
+            if folded:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE id IN ("
+                    "  SELECT id FROM messages WHERE session_id = ? AND role != ? "
+                    "  ORDER BY id LIMIT ?)",
+                    (session_id, SYSTEM_ROLE, folded),
+                )
+            self._conn.execute(
+                "UPDATE sessions SET summary = ?, message_count = message_count - ? "
+                "WHERE session_id = ?",
+                (summary, folded, session_id),
+            )
+
+    def get_summary(self, session_id: str) -> str:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return (row[0] or "") if row else ""
+
+    def load_messages(self, session_id: str) -> List[BaseMessage]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def clear_messages(self, session_id: str, updated_at: str):
+        """删除会话的全部非 system 消息及滚动摘要。"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND role != ?",
+                (session_id, SYSTEM_ROLE),
+            )
+            self._conn.execute(
+                "UPDATE sessions SET message_count = 0, summary = '', updated_at = ? "
+                "WHERE session_id = ?",
+                (updated_at, session_id),
+            )
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM conversation_state WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: Optional[str]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conversation_state (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+    # ------------------------------------------------------------------
+    # 迁移
+    # ------------------------------------------------------------------
+
+    def migrate_from_json(self, json_path: str, rename: bool = True) -> int:
+        """
+        将旧版 conversations.json 导入 SQLite，返回导入的会话数。
+
+        已存在的同 ID 会话会被覆盖，可重复执行；rename=True 时导入完成后
+        将原文件改名为 <json_path>.migrated.bak。
+        """
+        if not json_path or not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        sessions = data.get("sessions", {})
+        with self._lock, self._conn:
+            for sid, sdata in sessions.items():
+                messages = sdata.get("messages", [])
+                message_count = sum(1 for m in messages if m.get("type") != SYSTEM_ROLE)
+                created_at = sdata.get("created_at", "")
+                self._conn.execute("DELETE FROM messages WHERE session_id = ?", (sid,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions "
+                    "(session_id, name, max_messages, message_count, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        sid,
+                        sdata.get("name", ""),
+                        sdata.get("max_messages", 50),
+                        message_count,
+                        created_at,
+                        sdata.get("updated_at", created_at),
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT INTO messages (session_id, role, data) VALUES (?, ?, ?)",
+                    [
+                        (sid, m.get("type", ""), json.dumps(m, ensure_ascii=False))
+                        for m in messages
+                    ],
+                )
+            if data.get("current_session_id"):
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO conversation_state (key, value) VALUES (?, ?)",
+                    ("current_session_id", data["current_session_id"]),
+                )
+
+        if rename:
+            os.replace(json_path, json_path + ".migrated.bak")
+        logger.info(f"已从 {json_path} 迁移 {len(sessions)} 个会话到 {self.db_path}")
+        return len(sessions)
@@ -1,11 +1,15 @@
 import os
+import time
+import threading
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import logging
 
 from backend.config import settings
+from backend.core.sql_guard import guard_statement
 
 # Configure logging
 logging.basicConfig(
@@ -21,11 +25,77 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Driver error markers for statements killed by the per-query timeout
+_MYSQL_TIMEOUT_ERRNO = 3024      # ER_QUERY_TIMEOUT: maximum statement execution time exceeded
+_ORACLE_TIMEOUT_MARKERS = ("DPI-1067", "ORA-03156")
+
+
+# Rows buffered per fetch from a server-side cursor
+STREAM_BATCH_ROWS = 1000
+
+
+class QueryRows(list):
+    """Rows of a query result (list of dicts) with column names and a truncation flag."""
+
+    def __init__(self, columns=None):
+        super().__init__()
+        self.columns = list(columns or [])
+        self.truncated = False
+
+
+class QueryStream:
+    """
+    Lazily iterates the rows of a streamed (server-side cursor) result as dicts.
+
+    Stops after max_rows rows, setting `truncated` when more rows were available,
+    and releases the connection once iteration ends or close() is called.
+    `bounded` marks results capped by a server-side row limit (injected by the SQL guard),
+    whose unread remainder is small enough to drain instead of dropping the connection.
+    """
+
+    def __init__(self, connection, result, max_rows: int = 0, on_error=None, bounded: bool = False):
+        self.columns = list(result.keys())
+        self.max_rows = max_rows
+        self.row_count = 0
+        self.truncated = False
+        self.on_error = on_error or (lambda e: f"SQL Error: {str(e)}")
+        self._connection = connection
+        self._result = result
+        self._bounded = bounded
+        self._exhausted = False
+
+    def __iter__(self):
+        try:
+            for row in self._result:
+                if self.max_rows and self.row_count >= self.max_rows:
+                    self.truncated = True
+                    return
+                self.row_count += 1
+                yield dict(row._mapping)
+            self._exhausted = True
+        finally:
+            self.close()
+
+    def close(self):
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        if not self._exhausted and not self._bounded and connection.dialect.name == "mysql":
+            # Closing an unbuffered MySQL cursor reads the rest of the result set off the wire;
+            # drop the connection instead so a truncated SELECT * doesn't transfer every row.
+            # A guard-limited result holds at most max_rows + 1 rows, so draining it is cheap
+            # and the connection goes back to the pool.
+            connection.invalidate()
+        connection.close()
+
+
 class DBConnectionManager:
     """Manages connections to multiple databases (MySQL, Oracle) using SQLAlchemy."""
     
     def __init__(self):
         self.engines = {}
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
         self._init_engines()
 
     def _init_engines(self):
@@ -34,7 +104,7 @@ class DBConnectionManager:
         mysql_url = os.getenv("MYSQL_URL")
         if mysql_url and "your_mysql_url_here" not in mysql_url:
             try:
-                self.engines["mysql"] = create_engine(mysql_url)
+                self.engines["mysql"] = self._create_engine("mysql", mysql_url)
                 logger.info("Successfully initialized MySQL engine.")
             except Exception as e:
                 logger.error(f"Failed to initialize MySQL engine: {e}")
@@ -44,19 +114,113 @@ class DBConnectionManager:
         if oracle_url and "your_oracle_url_here" not in oracle_url:
             try:
                 # oracledb is the modern driver for Oracle
-                self.engines["oracle"] = create_engine(oracle_url)
+                self.engines["oracle"] = self._create_engine("oracle", oracle_url)
                 logger.info("Successfully initialized Oracle engine.")
             except Exception as e:
                 logger.error(f"Failed to initialize Oracle engine: {e}")
 
-    def execute_query(self, db_type: str, sql: str, params: dict = None):
+    def _create_engine(self, db_type: str, url: str):
+        """Create a pooled engine sized and tuned from settings, with pool metrics attached."""
+        engine = create_engine(
+            url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+        metrics = {
+            "connects": 0,
+            "checkouts": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+            "pool_timeouts": 0,
+            "query_timeouts": 0,
+            "guard_limited": 0,
+            "guard_refused": 0,
+        }
+        self._metrics[db_type] = metrics
+
+        def on_connect(dbapi_connection, connection_record):
+            with self._metrics_lock:
+                metrics["connects"] += 1
+
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._metrics_lock:
+                metrics["checkouts"] += 1
+
+        event.listen(engine, "connect", on_connect)
+        event.listen(engine, "checkout", on_checkout)
+        return engine
+
+    def _connect(self, db_type: str, engine):
+        """Check out a pooled connection, recording how long the caller waited for it."""
+        started = time.perf_counter()
+        try:
+            return engine.connect()
+        except PoolTimeoutError:
+            with self._metrics_lock:
+                self._metrics[db_type]["pool_timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._metrics_lock:
+                metrics = self._metrics[db_type]
+                metrics["wait_total"] += waited
+                metrics["wait_max"] = max(metrics["wait_max"], waited)
+
+    @staticmethod
+    def _apply_timeout(connection, timeout: float):
         """
-        Executes a SQL query safely and returns results as a list of dictionaries.
-        
+        Apply the statement timeout to the checked-out connection.
+
+        The value is remembered in the pooled connection's info dict, so the
+        MySQL session variable is only re-sent when the timeout changes.
+        """
+        timeout_ms = max(0, int(timeout * 1000))
+        if connection.info.get("query_timeout_ms") == timeout_ms:
+            return
+
+        dialect = connection.dialect.name
+        try:
+            if dialect == "mysql":
+                # Only applies to read-only SELECT statements (MySQL 5.7.8+)
+                connection.exec_driver_sql(f"SET SESSION MAX_EXECUTION_TIME = {timeout_ms}")
+            elif dialect == "oracle":
+                dbapi_connection = connection.connection.dbapi_connection
+                if hasattr(dbapi_connection, "call_timeout"):
+                    dbapi_connection.call_timeout = timeout_ms
+                elif hasattr(dbapi_connection, "callTimeout"):
+                    dbapi_connection.callTimeout = timeout_ms
+        except Exception as e:
+            logger.warning(f"Failed to apply query timeout on {dialect}: {e}")
+        connection.info["query_timeout_ms"] = timeout_ms
+
+    @staticmethod
+    def _is_query_timeout(error: Exception) -> bool:
+        orig = getattr(error, "orig", None)
+        if orig is not None and getattr(orig, "args", None) and orig.args[0] == _MYSQL_TIMEOUT_ERRNO:
+            return True
+        message = str(error)
+        return any(marker in message for marker in _ORACLE_TIMEOUT_MARKERS)
+
+    def open_stream(self, db_type: str, sql: str, params: dict = None, timeout: float = None,
+                    max_rows: int = None, confirm: bool = False):
+        """
+        Executes a SQL query on a server-side cursor and returns a QueryStream over its rows.
+
+        Rows are fetched lazily in batches, so memory use does not grow with the result set.
+        SELECT statements pass through the SQL guard first: a dialect row limit is appended
+        when missing and the EXPLAIN estimate is checked against DB_GUARD_MAX_ROWS / DB_GUARD_MAX_COST.
+        Returns a string instead when the statement fails, is refused or does not return rows.
+
         Args:
             db_type: 'mysql' or 'oracle'
             sql: The SQL string to execute
             params: Dictionary of parameters for the SQL query
+            timeout: Statement timeout in seconds (defaults to DB_QUERY_TIMEOUT, 0 = unlimited)
+            max_rows: Maximum rows to yield (defaults to DB_QUERY_MAX_ROWS, 0 = unlimited)
+            confirm: Run the query even if its estimate exceeds the guard thresholds (DB_GUARD_MODE=confirm)
         """
         if not settings.ENABLE_DB_QUERY:
             return "Error: 无法访问数据库或者数据库查询开关未配置 (ENABLE_DB_QUERY 未开启)"
@@ -65,19 +229,109 @@ class DBConnectionManager:
             return f"Error: Database engine for '{db_type}' is not configured or failed to initialize."
         
         engine = self.engines[db_type]
+        if timeout is None:
+            timeout = settings.DB_QUERY_TIMEOUT
+        if max_rows is None:
+            max_rows = settings.DB_QUERY_MAX_ROWS
+
+        connection = None
+        try:
+            connection = self._connect(db_type, engine)
+            self._apply_timeout(connection, timeout)
+            # One extra row lets the row cap still detect truncation
+            guard = guard_statement(connection, sql, params, row_limit=max_rows + 1 if max_rows else 0,
+                                    confirm=confirm)
+            if guard.refused:
+                with self._metrics_lock:
+                    self._metrics[db_type]["guard_refused"] += 1
+                logger.warning(f"SQL guard refused query on {db_type} ({guard.estimate.describe()}): {sql}")
+                connection.close()
+                return guard.refused
+            if guard.limited:
+                with self._metrics_lock:
+                    self._metrics[db_type]["guard_limited"] += 1
+            result = connection.execute(
+                text(guard.sql), params or {},
+                execution_options={"stream_results": True, "max_row_buffer": STREAM_BATCH_ROWS},
+            )
+            if not result.returns_rows:
+                connection.commit()
+                connection.close()
+                return f"Execution successful. Rows affected: {result.rowcount}"
+            return QueryStream(
+                connection, result, max_rows,
+                on_error=lambda e: self._error_message(db_type, e, sql, timeout),
+                bounded=guard.limited,
+            )
+        except Exception as e:
+            if connection is not None:
+                connection.close()
+            return self._error_message(db_type, e, sql, timeout)
+
+    def execute_query(self, db_type: str, sql: str, params: dict = None, timeout: float = None,
+                      max_rows: int = None, confirm: bool = False):
+        """
+        Executes a SQL query safely and returns results as a list of dictionaries.
+
+        At most max_rows rows are fetched; the returned QueryRows list carries the
+        column names and a `truncated` flag telling whether more rows were available.
         
+        Args:
+            db_type: 'mysql' or 'oracle'
+            sql: The SQL string to execute
+            params: Dictionary of parameters for the SQL query
+            timeout: Statement timeout in seconds (defaults to DB_QUERY_TIMEOUT, 0 = unlimited)
+            max_rows: Maximum rows to return (defaults to DB_QUERY_MAX_ROWS, 0 = unlimited)
+            confirm: Run the query even if its estimate exceeds the guard thresholds (DB_GUARD_MODE=confirm)
+        """
+        stream = self.open_stream(db_type, sql, params, timeout, max_rows, confirm)
+        if isinstance(stream, str):
+            return stream
+
+        rows = QueryRows(stream.columns)
         try:
-            with engine.connect() as connection:
-                result = connection.execute(text(sql), params or {})
-                if result.returns_rows:
-                    rows = [dict(row._mapping) for row in result.all()]
-                    return rows
-                else:
-                    connection.commit()
-                    return f"Execution successful. Rows affected: {result.rowcount}"
+            rows.extend(stream)
         except Exception as e:
-            logger.error(f"SQL Execution Error on {db_type}: {e}")
-            return f"SQL Error: {str(e)}"
+            return stream.on_error(e)
+        rows.truncated = stream.truncated
+        return rows
+
+    def _error_message(self, db_type: str, error: Exception, sql: str, timeout: float) -> str:
+        """Log a failed query and turn it into the error string returned to callers."""
+        if isinstance(error, PoolTimeoutError):
+            logger.error(f"Connection pool exhausted on {db_type}")
+            return f"SQL Error: 数据库连接池繁忙（等待超过 {settings.DB_POOL_TIMEOUT:g} 秒），请稍后重试"
+        if self._is_query_timeout(error):
+            with self._metrics_lock:
+                self._metrics[db_type]["query_timeouts"] += 1
+            logger.warning(f"SQL timed out on {db_type} after {timeout:g}s: {sql}")
+            return f"SQL Error: 查询超时（超过 {timeout:g} 秒），请缩小查询范围或增加过滤条件"
+        logger.error(f"SQL Execution Error on {db_type}: {error}")
+        return f"SQL Error: {str(error)}"
+
+    def pool_stats(self) -> dict:
+        """Per-database pool occupancy plus checkout / wait / timeout / SQL guard counters."""
+        stats = {}
+        for db_type, engine in self.engines.items():
+            pool = engine.pool
+            with self._metrics_lock:
+                metrics = dict(self._metrics[db_type])
+            checkouts = metrics["checkouts"]
+            stats[db_type] = {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "connects": metrics["connects"],
+                "checkouts": checkouts,
+                "avg_wait_ms": round(metrics["wait_total"] / checkouts * 1000, 2) if checkouts else 0.0,
+                "max_wait_ms": round(metrics["wait_max"] * 1000, 2),
+                "pool_timeouts": metrics["pool_timeouts"],
+                "query_timeouts": metrics["query_timeouts"],
+                "guard_limited": metrics["guard_limited"],
+                "guard_refused": metrics["guard_refused"],
+            }
+        return stats
 
     def get_preview(self, db_type: str, table_name: str, limit: int = 5):
         """Quickly fetches a preview of table data."""
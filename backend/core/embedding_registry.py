@@ -0,0 +1,345 @@
+"""
+backend/core/embedding_registry.py
+
+嵌入模型注册表：记录每个 ChromaDB collection 使用的嵌入模型名称和向量维度。
+
+- 写入端（PDMIndexer / UnifiedIndexer）通过 get_or_create_collection() 获取 collection，
+  首次写入时自动登记模型
+- 读取端（API 路由 / Agent 工具）通过 get_collection() 获取 collection，
+  强制使用登记的模型生成查询向量，避免查询向量与存储向量不在同一空间
+- 同一进程内每个模型只加载一次（按模型名缓存嵌入函数）
+- 模型变更时通过 migrate_collection() 批量重新嵌入（见 scripts/migrate_embeddings.py）
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import chromadb
+from chromadb.utils import embedding_functions
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 迁移时每批读取/写入的记录数
+MIGRATION_BATCH_SIZE = 500
+
+# 迁移过程中使用的临时 collection 后缀
+_MIGRATION_SUFFIX = "__migrating"
+
+# 替换时原 collection 暂存的后缀（新 collection 改名成功后删除）
+_BACKUP_SUFFIX = "__backup"
+
+_embedding_fns: Dict[str, Any] = {}
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+class MigrationRenameError(RuntimeError):
+    """迁移已完成但替换原 collection 失败，原 collection 暂存在备份名下，重新执行迁移即可恢复。"""
+
+
+# ------------------------------------------------------------------
+# 嵌入函数 / Chroma 客户端缓存
+# ------------------------------------------------------------------
+
+def get_embedding_fn(model_name: Optional[str] = None):
+    """按模型名返回进程内共享的嵌入函数实例。"""
+    model_name = model_name or settings.MODEL_NAME
+    with _lock:
+        fn = _embedding_fns.get(model_name)
+        if fn is None:
+            fn = embedding_functions.SentenceTransformerEmbeddingFunction(
+                model_name=model_name
+            )
+            _embedding_fns[model_name] = fn
+            logger.info(f"嵌入模型已加载: {model_name}")
+        return fn
+
+
+def get_chroma_client(chroma_path: Optional[str] = None):
+    """按路径返回进程内共享的 Chroma PersistentClient。"""
+    chroma_path = chroma_path or settings.CHROMA_DB_PATH
+    with _lock:
+        client = _clients.get(chroma_path)
+        if client is None:
+            os.makedirs(chroma_path, exist_ok=True)
+            client = chromadb.PersistentClient(path=chroma_path)
+            _clients[chroma_path] = client
+        return client
+
+
+def _probe_dimension(embedding_fn) -> int:
+    """用一条探测文本计算嵌入维度。"""
+    vectors = embedding_fn(["dimension probe"])
+    return len(vectors[0]) if vectors else 0
+
+
+# ------------------------------------------------------------------
+# SQLite 登记表
+# ------------------------------------------------------------------
+
+def _connect(db_path: Optional[str] = None) -> sqlite3.Connection:
+    db_path = db_path or settings.SQLITE_DB_PATH
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_models (
+            collection_name TEXT PRIMARY KEY,
+            model_name TEXT NOT NULL,
+            dimension INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn
+
+
+def get_registered_model(collection_name: str, db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """返回 collection 登记的 {model_name, dimension}，未登记返回 None。"""
+    conn = _connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT model_name, dimension FROM embedding_models WHERE collection_name = ?",
+            (collection_name,),
+        ).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    return {"model_name": row[0], "dimension": row[1]}
+
+
+def register_model(
+    collection_name: str,
+    model_name: str,
+    dimension: Optional[int] = None,
+    db_path: Optional[str] = None,
+) -> int:
+    """登记（或更新）collection 使用的嵌入模型，返回向量维度。"""
+    if dimension is None:
+        dimension = _probe_dimension(get_embedding_fn(model_name))
+    conn = _connect(db_path)
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO embedding_models (collection_name, model_name, dimension, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, (collection_name, model_name, dimension))
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info(f"已登记嵌入模型: {collection_name} -> {model_name} ({dimension} 维)")
+    return dimension
+
+
+def list_registered_models(db_path: Optional[str] = None) -> list:
+    """列出所有 collection 的模型登记信息。"""
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT collection_name, model_name, dimension, updated_at FROM embedding_models ORDER BY collection_name"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [
+        {"collection_name": r[0], "model_name": r[1], "dimension": r[2], "updated_at": r[3]}
+        for r in rows
+    ]
+
+
+def resolve_model(collection_name: str, db_path: Optional[str] = None) -> str:
+    """
+    返回读取 collection 时必须使用的模型名。
+
+    未登记的历史 collection 均由 settings.MODEL_NAME 写入，按该模型读取；
+    只读不登记（collection 可能尚未创建），登记由写入端 get_or_create_collection() 完成。
+    """
+    registered = get_registered_model(collection_name, db_path)
+    if registered:
+        return registered["model_name"]
+    return settings.MODEL_NAME
+
+
+# ------------------------------------------------------------------
+# Collection 访问入口
+# ------------------------------------------------------------------
+
+def get_collection(collection_name: str, chroma_path: Optional[str] = None, db_path: Optional[str] = None):
+    """读取端入口：使用登记模型打开已存在的 collection（不存在时抛出异常）。"""
+    model_name = resolve_model(collection_name, db_path)
+    client = get_chroma_client(chroma_path)
+    return client.get_collection(
+        name=collection_name,
+        embedding_function=get_embedding_fn(model_name),
+    )
+
+
+def get_or_create_collection(collection_name: str, chroma_path: Optional[str] = None, db_path: Optional[str] = None):
+    """
+    写入端入口：获取或创建 collection。
+
+    若 .env 中的 MODEL_NAME 与登记模型不同，继续使用登记模型写入以保持向量空间一致，
+    并提示执行 scripts/migrate_embeddings.py 完成迁移。
+    """
+    client = get_chroma_client(chroma_path)
+    registered = get_registered_model(collection_name, db_path)
+    if registered:
+        model_name = registered["model_name"]
+        if model_name != settings.MODEL_NAME:
+            logger.warning(
+                f"collection '{collection_name}' 登记模型为 {model_name}，与配置 MODEL_NAME="
+                f"{settings.MODEL_NAME} 不一致，继续使用登记模型。"
+                f"如需切换请执行: python scripts/migrate_embeddings.py --collection {collection_name}"
+            )
+    else:
+        model_name = settings.MODEL_NAME
+
+    embedding_fn = get_embedding_fn(model_name)
+    try:
+        collection = client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=embedding_fn,
+        )
+    except ValueError as e:
+        # 旧版 Chroma 会持久化嵌入函数名称，名称冲突时只能重建
+        if "conflict" in str(e).lower() or "already exists" in str(e):
+            logger.warning(f"Embedding function conflict for '{collection_name}', recreating collection...")
+            client.delete_collection(collection_name)
+            collection = client.create_collection(
+                name=collection_name,
+                embedding_function=embedding_fn,
+            )
+        else:
+            raise
+
+    if not registered:
+        register_model(collection_name, model_name, db_path=db_path)
+    return collection
+
+
+# ------------------------------------------------------------------
+# 迁移
+# ------------------------------------------------------------------
+
+def migrate_collection(
+    collection_name: str,
+    model_name: Optional[str] = None,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    chroma_path: Optional[str] = None,
+    db_path: Optional[str] = None,
+) -> int:
+    """
+    使用新模型批量重新嵌入 collection 中的全部文档，返回迁移的记录数。
+
+    先写入临时 collection，全部成功后再替换原 collection 并更新登记信息；
+    重新嵌入中途失败时原 collection 保持不变。替换时原 collection 先改名为备份，
+    新 collection 改名或登记新模型失败都会还原为原 collection 和原登记，
+    还原仍失败时抛出 MigrationRenameError（提示备份 / 临时 collection 名），
+    重新执行迁移会先把备份恢复为原名。
+    """
+    model_name = model_name or settings.MODEL_NAME
+    client = get_chroma_client(chroma_path)
+    old_model = resolve_model(collection_name, db_path)
+    _recover_backup(client, collection_name)
+
+    source = client.get_collection(
+        name=collection_name,
+        embedding_function=get_embedding_fn(old_model),
+    )
+    new_fn = get_embedding_fn(model_name)
+    dimension = _probe_dimension(new_fn)
+
+    tmp_name = f"{collection_name}{_MIGRATION_SUFFIX}"
+    try:
+        client.delete_collection(tmp_name)
+    except Exception:
+        pass  # 上次迁移没有残留
+    target = client.create_collection(name=tmp_name, embedding_function=new_fn)
+
+    total = source.count()
+    migrated = 0
+    logger.info(f"开始迁移 '{collection_name}': {old_model} -> {model_name}，共 {total} 条")
+    try:
+        for offset in range(0, total, batch_size):
+            batch = source.get(
+                limit=batch_size,
+                offset=offset,
+                include=["documents", "metadatas"],
+            )
+            ids = batch.get("ids") or []
+            if not ids:
+                continue
+            documents = [doc or "" for doc in batch.get("documents") or [""] * len(ids)]
+            metadatas = batch.get("metadatas") or [None] * len(ids)
+            embeddings = new_fn(documents)
+            # Chroma 不接受空 metadata：有 / 无 metadata 的记录分开写入，避免整批丢失 metadata
+            with_meta = [i for i, meta in enumerate(metadatas) if meta]
+            without_meta = [i for i, meta in enumerate(metadatas) if not meta]
+            for indexes, keep_meta in ((with_meta, True), (without_meta, False)):
+                if not indexes:
+                    continue
+                target.add(
+                    ids=[ids[i] for i in indexes],
+                    documents=[documents[i] for i in indexes],
+                    embeddings=[embeddings[i] for i in indexes],
+                    metadatas=[metadatas[i] for i in indexes] if keep_meta else None,
+                )
+            migrated += len(ids)
+            logger.info(f"  已迁移 {migrated}/{total}")
+    except Exception:
+        client.delete_collection(tmp_name)
+        raise
+
+    _swap_collection(
+        client, source, target, collection_name,
+        commit=lambda: register_model(collection_name, model_name, dimension=dimension, db_path=db_path),
+    )
+    logger.info(f"迁移完成 '{collection_name}': {migrated} 条，{dimension} 维")
+    return migrated
+
+
+def _swap_collection(client, source, target, collection_name: str, commit: Callable[[], Any]):
+    """
+    原 collection 改名为备份 → 临时 collection 改名为原名 → commit()（登记新模型）→ 删除备份；
+    改名或 commit 失败时把临时 collection 改回原名并恢复备份，保证 collection 与登记的模型一致。
+    """
+    backup_name = f"{collection_name}{_BACKUP_SUFFIX}"
+    tmp_name = target.name
+    source.modify(name=backup_name)
+    renamed = False
+    try:
+        target.modify(name=collection_name)
+        renamed = True
+        commit()
+    except Exception as e:
+        try:
+            if renamed:
+                target.modify(name=tmp_name)
+            source.modify(name=collection_name)
+        except Exception:
+            raise MigrationRenameError(
+                f"替换 collection '{collection_name}' 失败: {e}；原数据暂存在 '{backup_name}'，"
+                f"新向量在 '{collection_name if renamed else tmp_name}'，重新执行迁移即可恢复"
+            ) from e
+        client.delete_collection(tmp_name)
+        raise
+    try:
+        client.delete_collection(backup_name)
+    except Exception as e:
+        logger.warning(f"删除备份 collection '{backup_name}' 失败（下次迁移时清理）: {e}")
+
+
+def _recover_backup(client, collection_name: str):
+    """处理上次替换失败的残留：原名缺失时把备份恢复为原名，原名存在时删除多余备份。"""
+    backup_name = f"{collection_name}{_BACKUP_SUFFIX}"
+    existing = {getattr(c, "name", c) for c in client.list_collections()}
+    if backup_name not in existing:
+        return
+    if collection_name in existing:
+        client.delete_collection(backup_name)
+        logger.info(f"已清理残留的备份 collection '{backup_name}'")
+    else:
+        client.get_collection(name=backup_name).modify(name=collection_name)
+        logger.warning(f"已将上次迁移残留的备份 '{backup_name}' 恢复为 '{collection_name}'")
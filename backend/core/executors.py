@@ -0,0 +1,96 @@
+"""
+backend/core/executors.py
+
+阻塞操作专用线程池。
+
+异步接口中的阻塞操作按类别分派到独立的线程池，不占用 Starlette 默认线程池
+（默认 40 线程，同步路由和依赖共用），也不会相互挤占：
+- sqlite    : 会话库、元数据库等本地 SQLite 读写
+- ocr       : 图片 OCR、日志附件解码
+- embedding : 向量检索（查询向量化 + ChromaDB 查询）
+- db        : 外部业务数据库（MySQL / Oracle）查询
+
+线程池在首次使用时创建，大小由 config 中的 *_EXECUTOR_WORKERS 配置。
+"""
+
+import asyncio
+import logging
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, ClassVar, Dict
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+SQLITE = "sqlite"
+OCR = "ocr"
+EMBEDDING = "embedding"
+DB = "db"
+
+_POOL_SIZES = {
+    SQLITE: settings.SQLITE_EXECUTOR_WORKERS,
+    OCR: settings.OCR_EXECUTOR_WORKERS,
+    EMBEDDING: settings.EMBEDDING_EXECUTOR_WORKERS,
+    DB: settings.DB_EXECUTOR_WORKERS,
+}
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """获取指定类别的线程池（懒加载单例）。"""
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+    if name not in _POOL_SIZES:
+        raise ValueError(f"未知的线程池类别: {name}")
+    with _lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=max(1, _POOL_SIZES[name]),
+                thread_name_prefix=f"{name}-executor",
+            )
+        return _executors[name]
+
+
+async def run_blocking(name: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """在指定类别的线程池中执行阻塞函数并等待结果。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(name), functools.partial(fn, *args, **kwargs))
+
+
+def executor_stats() -> Dict[str, Dict[str, int]]:
+    """各线程池指标：线程上限、已创建线程数、排队任务数。未使用过的线程池不创建。"""
+    stats = {}
+    for name, size in _POOL_SIZES.items():
+        executor = _executors.get(name)
+        stats[name] = {
+            "max_workers": max(1, size),
+            "threads": len(executor._threads) if executor else 0,
+            "queued": executor._work_queue.qsize() if executor else 0,
+        }
+    return stats
+
+
+def shutdown_executors(wait: bool = False) -> None:
+    with _lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=wait)
+        _executors.clear()
+
+
+class ExecutorToolMixin:
+    """
+    LangChain 工具混入类：异步调用（ainvoke）时把同步的 _run 分派到专用线程池，
+    而不是 LangChain 默认使用的事件循环默认线程池。
+
+    用法：class MyTool(ExecutorToolMixin, BaseTool): executor_name: ClassVar[str] = EMBEDDING
+    """
+
+    executor_name: ClassVar[str] = SQLITE
+
+    async def _arun(self, *args, **kwargs) -> Any:
+        return await run_blocking(self.executor_name, self._run, *args, **kwargs)
@@ -1,10 +1,10 @@
 import os
+import json
 import sqlite3
 import logging
 from dotenv import load_dotenv
 from .parser import PDMParser
-import chromadb
-from chromadb.utils import embedding_functions
+from . import embedding_registry
 from typing import List, Dict, Any
 
 # Load environment variables
@@ -28,28 +28,13 @@ class PDMIndexer:
         self.conn = sqlite3.connect(self.db_path)
         self._init_sqlite()
         
-        # Initialize Chroma
-        self.chroma_client = chromadb.PersistentClient(path=self.chroma_path)
-        # Use multilingual model for Chinese support
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=self.model_name
+        # Initialize Chroma (embedding model resolved through the registry so that
+        # readers and writers of pdm_metadata always share one vector space)
+        self.collection = embedding_registry.get_or_create_collection(
+            "pdm_metadata",
+            chroma_path=self.chroma_path,
+            db_path=self.db_path,
         )
-        
-        try:
-            self.collection = self.chroma_client.get_or_create_collection(
-                name="pdm_metadata",
-                embedding_function=self.embedding_fn
-            )
-        except ValueError as e:
-            if "conflict" in str(e).lower() or "already exists" in str(e):
-                logger.info("Embedding function conflict detected. Recreating pdm_metadata collection...")
-                self.chroma_client.delete_collection("pdm_metadata")
-                self.collection = self.chroma_client.create_collection(
-                    name="pdm_metadata",
-                    embedding_function=self.embedding_fn
-                )
-            else:
-                raise e
 
     def _init_sqlite(self):
         cursor = self.conn.cursor()
@@ -81,9 +66,15 @@ class PDMIndexer:
                 data_type TEXT,
                 length TEXT,
                 mandatory INTEGER,
+                primary_key INTEGER,
                 FOREIGN KEY(table_id) REFERENCES tables(id)
             )
         ''')
+        # Databases indexed before primary keys were tracked
+        try:
+            cursor.execute("ALTER TABLE columns ADD COLUMN primary_key INTEGER")
+        except sqlite3.OperationalError:
+            pass
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS references_rels (
                 id TEXT PRIMARY KEY,
@@ -95,6 +86,31 @@ class PDMIndexer:
                 FOREIGN KEY(file_id) REFERENCES pdm_files(id)
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reference_joins (
+                reference_id TEXT,
+                parent_column_id TEXT,
+                child_column_id TEXT,
+                PRIMARY KEY(reference_id, parent_column_id, child_column_id),
+                FOREIGN KEY(reference_id) REFERENCES references_rels(id)
+            )
+        ''')
+        # Precomputed SELECT/JOIN skeletons for every FK-connected table pair
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS join_skeletons (
+                reference_id TEXT PRIMARY KEY,
+                file_id INTEGER,
+                parent_code TEXT,
+                child_code TEXT,
+                join_columns TEXT,
+                join_source TEXT,
+                parent_columns TEXT,
+                child_columns TEXT,
+                sql_text TEXT,
+                FOREIGN KEY(reference_id) REFERENCES references_rels(id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_join_skeletons_pair ON join_skeletons(parent_code, child_code)")
         self.conn.commit()
 
     def index_all(self):
@@ -108,6 +124,19 @@ class PDMIndexer:
                 file_path = os.path.join(self.pdm_dir, file_name)
                 self.index_file(file_path)
 
+        self.export_catalog()
+
+        from .join_graph import invalidate_join_graph
+        invalidate_join_graph()
+
+    def export_catalog(self):
+        """Refresh the columnar catalog snapshot used by the paginated list endpoints."""
+        from .catalog_export import export_catalog
+        try:
+            export_catalog(db_path=self.db_path)
+        except Exception as e:
+            logger.warning(f"PDM catalog export skipped: {e}")
+
     def index_file(self, file_path: str):
         file_name = os.path.basename(file_path)
         logger.info(f"Indexing file: {file_name}")
@@ -139,10 +168,11 @@ class PDMIndexer:
 
             for col in table['columns']:
                 cursor.execute('''
-                    INSERT OR REPLACE INTO columns (id, table_id, name, code, comment, data_type, length, mandatory)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    INSERT OR REPLACE INTO columns (id, table_id, name, code, comment, data_type, length, mandatory, primary_key)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (col['id'], table['id'], col['name'], col['code'], col['comment'], 
-                      col['data_type'], col['length'], 1 if col['mandatory'] else 0))
+                      col['data_type'], col['length'], 1 if col['mandatory'] else 0,
+                      1 if col.get('primary_key') else 0))
                 
                 # Optionally index columns if they have comments
                 if col['comment']:
@@ -160,9 +190,144 @@ class PDMIndexer:
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (ref['id'], file_id, ref['name'], ref['code'], ref['parent_table_ref'], ref['child_table_ref']))
 
+            cursor.execute("DELETE FROM reference_joins WHERE reference_id = ?", (ref['id'],))
+            for join in ref.get('joins', []):
+                cursor.execute('''
+                    INSERT OR REPLACE INTO reference_joins (reference_id, parent_column_id, child_column_id)
+                    VALUES (?, ?, ?)
+                ''', (ref['id'], join['parent_column_ref'], join['child_column_ref']))
+
         self.conn.commit()
+        self.build_join_skeletons(file_id)
         logger.info(f"Finished indexing {file_name}")
 
+    def build_join_skeletons(self, file_id: int = None) -> int:
+        """
+        Precompute a SELECT skeleton (column lists + JOIN ... ON clause) for every
+        FK-connected table pair, so the agent can fetch a ready join in one call.
+
+        Join columns come from the PDM ReferenceJoin definitions; when a model has none,
+        they are inferred from the parent's primary key (see infer_join_columns). Pairs whose
+        join columns cannot be determined are stored with join_source "unknown" and no SQL,
+        so no Cartesian-product join is ever offered.
+        Returns the number of skeletons written.
+        """
+        cursor = self.conn.cursor()
+        if file_id is None:
+            cursor.execute("SELECT id, parent_table_id, child_table_id FROM references_rels")
+        else:
+            cursor.execute(
+                "SELECT id, parent_table_id, child_table_id FROM references_rels WHERE file_id = ?",
+                (file_id,),
+            )
+        refs = cursor.fetchall()
+
+        columns_cache: Dict[str, List[str]] = {}
+        keys_cache: Dict[str, List[str]] = {}
+
+        def table_columns(table_id: str) -> List[str]:
+            if table_id not in columns_cache:
+                cursor.execute(
+                    "SELECT code, COALESCE(primary_key, 0) FROM columns WHERE table_id = ? ORDER BY rowid",
+                    (table_id,),
+                )
+                rows = [r for r in cursor.fetchall() if r[0]]
+                columns_cache[table_id] = [r[0] for r in rows]
+                keys_cache[table_id] = [r[0] for r in rows if r[1]]
+            return columns_cache[table_id]
+
+        count = 0
+        for ref_id, parent_id, child_id in refs:
+            cursor.execute("SELECT code FROM tables WHERE id = ?", (parent_id,))
+            parent_row = cursor.fetchone()
+            cursor.execute("SELECT code FROM tables WHERE id = ?", (child_id,))
+            child_row = cursor.fetchone()
+            if not parent_row or not child_row:
+                continue
+            parent_code, child_code = parent_row[0], child_row[0]
+            parent_columns = table_columns(parent_id)
+            child_columns = table_columns(child_id)
+
+            cursor.execute('''
+                SELECT pc.code, cc.code
+                FROM reference_joins j
+                JOIN columns pc ON j.parent_column_id = pc.id
+                JOIN columns cc ON j.child_column_id = cc.id
+                WHERE j.reference_id = ?
+            ''', (ref_id,))
+            join_columns = [list(r) for r in cursor.fetchall()]
+            join_source = "pdm"
+            if not join_columns:
+                join_columns = infer_join_columns(parent_code, keys_cache[parent_id], child_columns)
+                join_source = "inferred" if join_columns else "unknown"
+
+            sql_text = ""
+            if join_columns:
+                sql_text = render_join_sql(
+                    [(parent_code, "p", parent_columns), (child_code, "c", child_columns)],
+                    [("c", "p", join_columns)],
+                )
+            cursor.execute('''
+                INSERT OR REPLACE INTO join_skeletons
+                (reference_id, file_id, parent_code, child_code, join_columns, join_source,
+                 parent_columns, child_columns, sql_text)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (ref_id, file_id, parent_code, child_code, json.dumps(join_columns), join_source,
+                  json.dumps(parent_columns), json.dumps(child_columns), sql_text))
+            count += 1
+
+        self.conn.commit()
+        logger.info(f"Built {count} join skeletons")
+        return count
+
+
+def infer_join_columns(parent_code: str, parent_keys: List[str], child_columns: List[str]) -> List[List[str]]:
+    """
+    Infer [[parent_col, child_col], ...] for a reference without ReferenceJoin definitions.
+
+    Only the parent's primary key columns are considered, and every one of them must be
+    found in the child: a key column is matched by the same code, except the generic
+    surrogate key ID, which only matches <PARENT_CODE>_ID / <PARENT_CODE>ID. Shared audit
+    or tenant columns (CREATOR_ID, TENANT_ID, ...) are therefore never used.
+    Returns [] when the join columns cannot be determined.
+    """
+    child_by_upper = {c.upper(): c for c in child_columns}
+    pairs = []
+    for key in parent_keys:
+        upper = key.upper()
+        if upper == "ID":
+            candidates = [f"{parent_code.upper()}_ID", f"{parent_code.upper()}ID"]
+        else:
+            candidates = [upper]
+        match = next((child_by_upper[c] for c in candidates if c in child_by_upper), None)
+        if match is None:
+            return []
+        pairs.append([key, match])
+    return pairs
+
+
+def render_join_sql(tables: list, joins: list) -> str:
+    """
+    Render a SELECT skeleton.
+
+    Args:
+        tables: [(table_code, alias, [column_code, ...]), ...] in FROM/JOIN order
+        joins: one entry per tables[1:], (joined_alias, other_alias, [[other_col, joined_col], ...])
+               where other_col belongs to other_alias and joined_col to joined_alias
+
+    Raises ValueError when a join has no columns (the pair must not be joined blindly).
+    """
+    select_cols = [f"{alias}.{col}" for _, alias, cols in tables for col in cols]
+    lines = ["SELECT " + (",\n       ".join(select_cols) if select_cols else "*")]
+    first_code, first_alias, _ = tables[0]
+    lines.append(f"FROM {first_code} {first_alias}")
+    for (code, alias, _), (joined_alias, other_alias, pairs) in zip(tables[1:], joins):
+        if not pairs:
+            raise ValueError(f"join columns unknown for {code}")
+        on = " AND ".join(f"{joined_alias}.{jc} = {other_alias}.{oc}" for oc, jc in pairs)
+        lines.append(f"JOIN {code} {alias} ON {on}")
+    return "\n".join(lines)
+
 
 if __name__ == "__main__":
     indexer = PDMIndexer()
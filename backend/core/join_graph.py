@@ -0,0 +1,333 @@
+"""
+backend/core/join_graph.py
+
+PDM 外键关系图（ER 图）引擎。
+
+将 references_rels 全量加载为内存中的无向邻接表（边保留父子方向），支持：
+- 两表之间的最短关联路径（BFS）
+- 指定表的 k 跳邻域
+- 预计算连通分量，不连通的表对直接返回，无需搜索
+
+图按 SQLite 中 tables / references_rels 的数据签名缓存：同进程重建 PDM 索引后立即失效，
+其他进程重建的索引在签名检查（最多每 STALE_CHECK_INTERVAL 秒一次）时发现并重新加载。
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Any
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 邻域查询允许的最大跳数，防止在大模型上返回过多表
+MAX_NEIGHBORHOOD_HOPS = 4
+
+# 两次数据签名检查的最小间隔（秒），避免每次工具调用都扫描 tables / references_rels
+STALE_CHECK_INTERVAL = 10.0
+
+
+class JoinGraph:
+    """内存中的 PDM 外键图，节点为 tables.id。"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or settings.SQLITE_DB_PATH
+        self.signature: Tuple = ()
+        # table_id -> code / name
+        self.codes: Dict[str, str] = {}
+        self.names: Dict[str, str] = {}
+        # code（大写） -> [table_id, ...]（不同 PDM 文件可能存在同名表）
+        self.ids_by_code: Dict[str, List[str]] = {}
+        # table_id -> [(neighbor_id, ref_id, ref_name, parent_id, child_id), ...]
+        self.adjacency: Dict[str, List[Tuple[str, str, str, str, str]]] = {}
+        # table_id -> 连通分量编号
+        self.component_of: Dict[str, int] = {}
+        self.component_sizes: List[int] = []
+
+    # ------------------------------------------------------------------
+    # 加载
+    # ------------------------------------------------------------------
+
+    def _read_signature(self, cursor) -> Tuple:
+        cursor.execute("SELECT COUNT(*), MAX(rowid) FROM tables")
+        tables_sig = cursor.fetchone()
+        cursor.execute("SELECT COUNT(*), MAX(rowid) FROM references_rels")
+        refs_sig = cursor.fetchone()
+        return tuple(tables_sig) + tuple(refs_sig)
+
+    def is_stale(self) -> bool:
+        """数据签名变化（重新索引过）时返回 True。"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return self._read_signature(conn.cursor()) != self.signature
+        finally:
+            conn.close()
+
+    def load(self) -> "JoinGraph":
+        """从 SQLite 加载全部表和外键，并预计算连通分量。"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        self.signature = self._read_signature(cursor)
+
+        self.codes, self.names, self.ids_by_code, self.adjacency = {}, {}, {}, {}
+        cursor.execute("SELECT id, code, name FROM tables")
+        for table_id, code, name in cursor.fetchall():
+            self.codes[table_id] = code or ""
+            self.names[table_id] = name or ""
+            self.ids_by_code.setdefault((code or "").upper(), []).append(table_id)
+            self.adjacency[table_id] = []
+
+        cursor.execute("SELECT id, name, parent_table_id, child_table_id FROM references_rels")
+        edge_count = 0
+        for ref_id, ref_name, parent_id, child_id in cursor.fetchall():
+            if parent_id not in self.adjacency or child_id not in self.adjacency:
+                continue
+            self.adjacency[parent_id].append((child_id, ref_id, ref_name or "", parent_id, child_id))
+            if child_id != parent_id:
+                self.adjacency[child_id].append((parent_id, ref_id, ref_name or "", parent_id, child_id))
+            edge_count += 1
+        conn.close()
+
+        self._compute_components()
+        logger.info(
+            f"JoinGraph loaded: {len(self.adjacency)} tables, {edge_count} references, "
+            f"{len(self.component_sizes)} components"
+        )
+        return self
+
+    def _compute_components(self):
+        self.component_of = {}
+        self.component_sizes = []
+        for start in self.adjacency:
+            if start in self.component_of:
+                continue
+            comp = len(self.component_sizes)
+            self.component_of[start] = comp
+            queue = deque([start])
+            size = 0
+            while queue:
+                node = queue.popleft()
+                size += 1
+                for neighbor, _, _, _, _ in self.adjacency[node]:
+                    if neighbor not in self.component_of:
+                        self.component_of[neighbor] = comp
+                        queue.append(neighbor)
+            self.component_sizes.append(size)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def resolve(self, table_code: str) -> List[str]:
+        """表 CODE（不区分大小写） -> table_id 列表。"""
+        return self.ids_by_code.get((table_code or "").strip().upper(), [])
+
+    def _edge_dict(self, ref_id: str, ref_name: str, parent_id: str, child_id: str) -> Dict[str, str]:
+        return {
+            "id": ref_id,
+            "name": ref_name,
+            "parent_table": self.codes.get(parent_id, ""),
+            "child_table": self.codes.get(child_id, ""),
+        }
+
+    def shortest_path(self, source_code: str, target_code: str) -> Optional[Dict[str, Any]]:
+        """
+        返回两表之间的最短关联路径：
+            {"tables": [A, ..., B], "edges": [{id, name, parent_table, child_table}, ...],
+             "table_ids": [...], "parent_ids": [...]}
+        table_ids 为路径上各表的 tables.id，parent_ids 为各边父表的 tables.id
+        （不同 PDM 文件可能存在同名表，判断边的方向须比较 id）。
+        任一表不存在时抛出 KeyError；不连通返回 None。
+        """
+        sources = self.resolve(source_code)
+        targets = set(self.resolve(target_code))
+        if not sources:
+            raise KeyError(source_code)
+        if not targets:
+            raise KeyError(target_code)
+
+        # 连通分量剪枝：不在同一分量中的表对无需搜索
+        target_comps = {self.component_of[t] for t in targets}
+        sources = [s for s in sources if self.component_of[s] in target_comps]
+        if not sources:
+            return None
+
+        prev: Dict[str, Optional[Tuple[str, str, str, str, str]]] = {s: None for s in sources}
+        queue = deque(sources)
+        found = None
+        while queue:
+            node = queue.popleft()
+            if node in targets:
+                found = node
+                break
+            for neighbor, ref_id, ref_name, parent_id, child_id in self.adjacency[node]:
+                if neighbor not in prev:
+                    prev[neighbor] = (node, ref_id, ref_name, parent_id, child_id)
+                    queue.append(neighbor)
+
+        if found is None:
+            return None
+
+        tables, edges, parent_ids = [found], [], []
+        node = found
+        while prev[node] is not None:
+            before, ref_id, ref_name, parent_id, child_id = prev[node]
+            edges.append(self._edge_dict(ref_id, ref_name, parent_id, child_id))
+            parent_ids.append(parent_id)
+            tables.append(before)
+            node = before
+        tables.reverse()
+        edges.reverse()
+        parent_ids.reverse()
+        return {
+            "tables": [self.codes[t] for t in tables],
+            "edges": edges,
+            "table_ids": tables,
+            "parent_ids": parent_ids,
+        }
+
+    def neighborhood(self, table_code: str, hops: int = 2) -> Dict[str, Any]:
+        """
+        返回表的 k 跳邻域：
+            {"hops": k, "tables": {code: distance}, "edges": [...], "component_size": n}
+        表不存在时抛出 KeyError。
+        """
+        starts = self.resolve(table_code)
+        if not starts:
+            raise KeyError(table_code)
+        hops = max(1, min(hops, MAX_NEIGHBORHOOD_HOPS))
+
+        dist = {s: 0 for s in starts}
+        edges, seen_edges = [], set()
+        queue = deque(starts)
+        while queue:
+            node = queue.popleft()
+            if dist[node] >= hops:
+                continue
+            for neighbor, ref_id, ref_name, parent_id, child_id in self.adjacency[node]:
+                if ref_id not in seen_edges:
+                    seen_edges.add(ref_id)
+                    edges.append(self._edge_dict(ref_id, ref_name, parent_id, child_id))
+                if neighbor not in dist:
+                    dist[neighbor] = dist[node] + 1
+                    queue.append(neighbor)
+
+        tables: Dict[str, int] = {}
+        for table_id, d in sorted(dist.items(), key=lambda x: x[1]):
+            code = self.codes[table_id]
+            if code not in tables:
+                tables[code] = d
+        return {
+            "hops": hops,
+            "tables": tables,
+            "edges": edges,
+            "component_size": max(self.component_sizes[self.component_of[s]] for s in starts),
+        }
+
+
+# ------------------------------------------------------------------
+# 模块级缓存
+# ------------------------------------------------------------------
+
+_graph: Optional[JoinGraph] = None
+_graph_checked_at = 0.0
+_graph_lock = threading.Lock()
+
+
+def get_join_graph() -> JoinGraph:
+    """返回已加载的外键图；PDM 索引变化后自动重新加载（签名最多每 STALE_CHECK_INTERVAL 秒检查一次）。"""
+    global _graph, _graph_checked_at
+    with _graph_lock:
+        now = time.monotonic()
+        if _graph is None:
+            _graph = JoinGraph().load()
+            _graph_checked_at = now
+        elif now - _graph_checked_at >= STALE_CHECK_INTERVAL:
+            _graph_checked_at = now
+            if _graph.is_stale():
+                _graph = JoinGraph().load()
+        return _graph
+
+
+def invalidate_join_graph():
+    """丢弃缓存的外键图（本进程重建 PDM 索引后调用），下次访问时重新加载。"""
+    global _graph
+    with _graph_lock:
+        _graph = None
+
+
+# ------------------------------------------------------------------
+# SQL 骨架
+# ------------------------------------------------------------------
+
+def build_join_sql(source_code: str, target_code: str) -> Optional[Dict[str, Any]]:
+    """
+    组装两表之间的 SELECT/JOIN 骨架。
+
+    直接外键相连的表对直接返回 PDMIndexer 预计算的骨架；多跳路径按最短路径
+    逐边拼接各关系预计算的 JOIN 列。返回：
+        {"tables", "edges", "sql", "join_sources"}
+    表不存在时抛出 KeyError；不连通返回 None；未预计算骨架，或路径上有关联列未知
+    （join_sources 含 "unknown"）的关系时 sql 为空字符串。
+    """
+    import json
+    from backend.core.indexer import render_join_sql
+
+    graph = get_join_graph()
+    path = graph.shortest_path(source_code, target_code)
+    if path is None:
+        return None
+    result = {"tables": path["tables"], "edges": path["edges"], "sql": "", "join_sources": []}
+    if not path["edges"]:
+        return result
+
+    conn = sqlite3.connect(graph.db_path)
+    cursor = conn.cursor()
+    skeletons = {}
+    try:
+        for edge in path["edges"]:
+            cursor.execute("""
+                SELECT join_columns, join_source, parent_columns, child_columns, sql_text
+                FROM join_skeletons WHERE reference_id = ?
+            """, (edge["id"],))
+            row = cursor.fetchone()
+            if not row:
+                return result
+            skeletons[edge["id"]] = row
+    except sqlite3.OperationalError:
+        return result  # 旧索引尚未生成 join_skeletons 表
+    finally:
+        conn.close()
+
+    result["join_sources"] = [skeletons[e["id"]][1] for e in path["edges"]]
+    if "unknown" in result["join_sources"]:
+        return result
+
+    # 单跳：直接使用缓存骨架
+    if len(path["edges"]) == 1:
+        result["sql"] = skeletons[path["edges"][0]["id"]][4]
+        return result
+
+    tables, joins = [], []
+    for i, edge in enumerate(path["edges"]):
+        join_columns, _, parent_columns, child_columns, _ = skeletons[edge["id"]]
+        parent_columns, child_columns = json.loads(parent_columns), json.loads(child_columns)
+        pairs = json.loads(join_columns)
+        left_alias, right_alias = f"t{i}", f"t{i + 1}"
+        # 路径方向可能与外键方向相反；同名表可能出现在多个 PDM 文件中，按 table id 判断
+        left_is_parent = path["parent_ids"][i] == path["table_ids"][i]
+        if i == 0:
+            tables.append((path["tables"][0], left_alias,
+                           parent_columns if left_is_parent else child_columns))
+        tables.append((path["tables"][i + 1], right_alias,
+                       child_columns if left_is_parent else parent_columns))
+        if left_is_parent:
+            joins.append((right_alias, left_alias, pairs))
+        else:
+            joins.append((right_alias, left_alias, [[c, p] for p, c in pairs]))
+
+    result["sql"] = render_join_sql(tables, joins)
+    return result
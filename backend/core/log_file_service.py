@@ -3,20 +3,40 @@ backend/core/log_file_service.py
 
 日志/文本文件解析服务。
 将用户上传的 .log / .txt 文件内容提取为纯文本，并在必要时截断后拼接到消息中。
+
+日志只保留尾部，因此按流式方式处理：base64 分块解码、增量 UTF-8 解码，
+LogTail 环形缓冲只保留最后 MAX_LINES 行且总字符数不超过 MAX_CHARS，
+处理过程中不会生成完整的解码字节 / 字符串 / 行列表，内存占用与文件大小基本无关。
+
+日志超过 LOG_DIGEST_TOKEN_BUDGET 时，改为输出 LogReducer 生成的摘要（模板归并、错误与堆栈原文保留，
+见 backend/core/log_reducer.py），而不是原始尾部。
 """
 
-import base64
-import logging
 import os
-from typing import Optional
+import re
+import codecs
+import logging
+import binascii
+from collections import deque
+from typing import Callable, Iterator, Optional
+
+from backend.config import settings
+from backend.core.log_reducer import LogReducer
+from backend.core.token_utils import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = {".log", ".txt"}
-MAX_FILE_SIZE = 5 * 1024 * 1024
+MAX_FILE_SIZE = settings.LOG_FILE_MAX_SIZE_MB * 1024 * 1024
 MAX_LINES = 2000
 MAX_CHARS = 200_000
 
+# 每次解码的 base64 字符数（4 的倍数）
+DECODE_CHUNK_SIZE = 64 * 1024
+
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/\s]*=?\s*=?\s*")
+_WHITESPACE_RE = re.compile(r"\s+")
+
 
 def validate_log_file(data: str, filename: str) -> Optional[str]:
     """
@@ -29,21 +49,108 @@ def validate_log_file(data: str, filename: str) -> Optional[str]:
     if ext not in ALLOWED_EXTENSIONS:
         return f"不支持的日志文件格式: {filename or '[未命名文件]'}，仅支持 .log 和 .txt"
 
-    try:
-        raw = base64.b64decode(data)
-    except Exception:
+    # 只做字符集检查和按长度估算大小，不解码整个文件
+    if not _BASE64_RE.fullmatch(data or ""):
         return "无效的 base64 文件数据"
 
-    if len(raw) > MAX_FILE_SIZE:
-        size_mb = len(raw) / (1024 * 1024)
-        return f"日志文件大小 {size_mb:.1f}MB 超过限制 (最大 5MB)"
+    size = len(data) * 3 // 4
+    if size > MAX_FILE_SIZE:
+        size_mb = size / (1024 * 1024)
+        return f"日志文件大小 {size_mb:.1f}MB 超过限制 (最大 {settings.LOG_FILE_MAX_SIZE_MB}MB)"
 
     return None
 
 
+def iter_base64_chunks(data: str, chunk_size: int = DECODE_CHUNK_SIZE) -> Iterator[bytes]:
+    """分块解码 base64 字符串，逐块产出解码后的字节；数据无效时抛出 binascii.Error。"""
+    pending = ""
+    for start in range(0, len(data), chunk_size):
+        piece = pending + _WHITESPACE_RE.sub("", data[start:start + chunk_size])
+        cut = len(piece) - len(piece) % 4
+        pending = piece[cut:]
+        if cut:
+            yield binascii.a2b_base64(piece[:cut])
+    if pending:
+        raise binascii.Error("base64 数据长度不完整")
+
+
+class LogTail:
+    """
+    日志尾部环形缓冲：逐块写入字节，只保留最后 max_lines 行、总字符数不超过 max_chars。
+    传入 sink 时，每个完整的行都会先交给 sink（如 LogReducer.add）。
+    """
+
+    def __init__(self, max_lines: int = MAX_LINES, max_chars: int = MAX_CHARS,
+                 sink: Optional[Callable[[str], None]] = None):
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self.sink = sink
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._lines: deque = deque()
+        self._chars = 0
+        self._partial = ""
+        self.total_lines = 0
+        self.total_bytes = 0
+        self.trimmed_chars = 0
+
+    def feed(self, chunk: bytes):
+        self.total_bytes += len(chunk)
+        self._feed_text(self._decoder.decode(chunk))
+
+    def close(self):
+        self._feed_text(self._decoder.decode(b"", final=True))
+        if self._partial:
+            self._push(self._partial)
+            self._partial = ""
+
+    def _feed_text(self, text: str):
+        if not text:
+            return
+        parts = (self._partial + text).split("\n")
+        self._partial = parts.pop()
+        for line in parts:
+            self._push(line)
+        # 超长的单行（无换行）只保留尾部
+        if len(self._partial) > self.max_chars:
+            self.trimmed_chars += len(self._partial) - self.max_chars
+            self._partial = self._partial[-self.max_chars:]
+
+    def _push(self, line: str):
+        if line.endswith("\r"):
+            line = line[:-1]
+        if self.sink is not None:
+            self.sink(line)
+        self.total_lines += 1
+        self._lines.append(line)
+        self._chars += len(line) + 1
+        while len(self._lines) > self.max_lines or (self._chars > self.max_chars and len(self._lines) > 1):
+            self._chars -= len(self._lines.popleft()) + 1
+        if self._chars > self.max_chars:
+            # 仅剩一行且仍超长：截掉行首
+            line = self._lines.pop()
+            self.trimmed_chars += len(line) - self.max_chars
+            self._lines.append(line[-self.max_chars:])
+            self._chars = self.max_chars + 1
+
+    @property
+    def omitted_lines(self) -> int:
+        return self.total_lines - len(self._lines)
+
+    def text(self) -> str:
+        """保留的尾部文本，带截断说明。"""
+        body = "\n".join(self._lines)
+        headers = []
+        if self.omitted_lines:
+            headers.append(f"[...已省略前 {self.omitted_lines} 行，仅保留尾部 {len(self._lines)} 行...]")
+        if self.trimmed_chars:
+            headers.append(f"[...已省略前 {self.trimmed_chars} 个字符，仅保留尾部 {self.max_chars} 个字符...]")
+        return "\n".join(headers + [body]) if headers else body
+
+
 def extract_text_from_base64(data: str, filename: str = "") -> str:
     """
-    从 base64 编码的日志/文本文件中提取文字。
+    从 base64 编码的日志/文本文件中提取文字（流式解码）。
+    日志在 LOG_DIGEST_TOKEN_BUDGET 以内时返回原文（超出行数 / 字符数上限时只保留尾部），否则返回日志摘要。
 
     Args:
         data: base64 编码的文件数据
@@ -52,27 +159,49 @@ def extract_text_from_base64(data: str, filename: str = "") -> str:
     Returns:
         提取出的文本，如果失败则返回错误提示。
     """
-    try:
-        raw = base64.b64decode(data)
-        text = raw.decode("utf-8", errors="replace")
-        lines = text.splitlines()
-
-        if len(lines) > MAX_LINES:
-            omitted = len(lines) - MAX_LINES
-            lines = lines[-MAX_LINES:]
-            text = f"[...已省略前 {omitted} 行，仅保留尾部 {MAX_LINES} 行...]\n" + "\n".join(lines)
-            logger.info(f"日志文件已截断 [{filename}]: 仅保留最后 {MAX_LINES} 行")
-        else:
-            text = "\n".join(lines) if lines else text
-
-        if len(text) > MAX_CHARS:
-            omitted_chars = len(text) - MAX_CHARS
-            text = f"[...已省略前 {omitted_chars} 个字符，仅保留尾部 {MAX_CHARS} 个字符...]\n" + text[-MAX_CHARS:]
-            logger.info(f"日志文件字符数过长 [{filename}]: 仅保留最后 {MAX_CHARS} 个字符")
+    return _extract_text(iter_base64_chunks(data), filename)
+
 
+def extract_text_from_file(path: str, filename: str = "") -> str:
+    """从磁盘上的日志/文本文件中提取文字（分块读取，处理方式同 extract_text_from_base64）。"""
+    def chunks():
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(DECODE_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    return _extract_text(chunks(), filename)
+
+
+def _extract_text(chunks: Iterator[bytes], filename: str) -> str:
+    try:
+        budget = settings.LOG_DIGEST_TOKEN_BUDGET
+        reducer = LogReducer(token_budget=budget) if budget > 0 else None
+        tail = LogTail(sink=reducer.add if reducer else None)
+        for chunk in chunks:
+            tail.feed(chunk)
+        tail.close()
+
+        text = tail.text()
+        if reducer and (tail.omitted_lines or tail.trimmed_chars or estimate_tokens(text) > budget):
+            text = reducer.digest()
+            logger.info(
+                f"日志文件已压缩为摘要 [{filename}]: {tail.total_bytes} 字节 / {tail.total_lines} 行 → "
+                f"约 {estimate_tokens(text)} tokens"
+            )
+        elif tail.omitted_lines or tail.trimmed_chars:
+            logger.info(
+                f"日志文件已截断 [{filename}]: {tail.total_bytes} 字节 / {tail.total_lines} 行，"
+                f"仅保留最后 {tail.total_lines - tail.omitted_lines} 行"
+            )
         logger.info(f"日志文件解析完成 [{filename}]: {len(text)} 字符")
         return text or "[日志文件为空]"
 
+    except binascii.Error as e:
+        logger.warning(f"日志文件 base64 解码失败 [{filename}]: {e}")
+        return "无效的 base64 文件数据"
     except Exception as e:
         logger.error(f"日志文件解析失败 [{filename}]: {e}", exc_info=True)
         return f"[日志文件解析失败: {e}]"
@@ -0,0 +1,317 @@
+"""
+backend/core/log_reducer.py
+
+日志压缩：把大日志归并为在 token 预算内的摘要，再拼接到发给 LLM 的消息中。
+
+逐行流式处理（内存只与模板数、保留的错误条目数有关，与日志行数无关）：
+- ERROR / WARN / FATAL 行及 Java 异常堆栈（异常行、"at ..."、"Caused by:"、"... N more"）原文保留，
+  堆栈接在触发它的日志行之后；内容相同（屏蔽数字、时间等变量后）的条目只保留首次出现的原文并计数
+- 其余日志行按 Drain 算法聚类为模板（变量位置替换为 <*>），输出 "×次数 模板"
+- 输出按优先级装入 token 预算：错误与堆栈（预算不足时保留最近的）> 日志尾部若干行 > 高频模板
+
+Drain 参考：He et al., "Drain: An Online Log Parsing Approach with Fixed Depth Tree", ICWS 2017。
+"""
+
+import re
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from backend.core.token_utils import estimate_tokens
+
+# Drain 参数：相似度阈值、按前几个 token 分桶、每个桶 / 全局最多的模板数
+SIMILARITY_THRESHOLD = 0.5
+PREFIX_DEPTH = 2
+MAX_CLUSTERS_PER_BUCKET = 100
+MAX_CLUSTERS = 2000
+
+# 摘要末尾保留的原始日志行数
+TAIL_LINES = 20
+
+# 单条错误 / 堆栈超出预算时，每个异常段（异常行或 Caused by）保留的堆栈帧数
+FRAMES_PER_CAUSE = 10
+
+# 单行最多保留的字符数（超长行截断，避免一行占满预算）
+MAX_LINE_CHARS = 1000
+
+WILDCARD = "<*>"
+
+_LEVEL_RE = re.compile(r"\b(ERROR|WARN|WARNING|FATAL|SEVERE)\b")
+_FRAME_RE = re.compile(r"^\s+at\s+\S+\(.*\)\s*$")
+_MORE_RE = re.compile(r"^\s*\.\.\. \d+ (?:more|common frames omitted)\s*$")
+_CAUSE_RE = re.compile(r"^\s*(?:Caused by|Suppressed):\s")
+_EXCEPTION_RE = re.compile(r"^\s*(?:[a-zA-Z_$][\w$]*\.)+[\w$]*(?:Exception|Error|Throwable)\b(?::.*)?$")
+
+# 变量屏蔽规则（按顺序替换为 <*>）
+_MASKS = [
+    re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"),
+    re.compile(r"\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"),
+    re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"),
+    re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),
+    re.compile(r"\b0x[0-9a-fA-F]+\b"),
+    re.compile(r"\b[0-9a-fA-F]{16,}\b"),
+    re.compile(r"(?<![A-Za-z_])-?\d+(?:\.\d+)?"),
+]
+
+
+def mask_variables(line: str) -> str:
+    """将时间、数字、IP、UUID 等变量替换为 <*>。"""
+    for pattern in _MASKS:
+        line = pattern.sub(WILDCARD, line)
+    return line
+
+
+def is_trace_continuation(line: str) -> bool:
+    """是否为异常堆栈的组成行（堆栈帧、Caused by、... N more、异常行）。"""
+    return bool(
+        _FRAME_RE.match(line) or _MORE_RE.match(line)
+        or _CAUSE_RE.match(line) or _EXCEPTION_RE.match(line)
+    )
+
+
+def _clip(line: str) -> str:
+    if len(line) <= MAX_LINE_CHARS:
+        return line
+    return line[:MAX_LINE_CHARS] + f" ...[截断 {len(line) - MAX_LINE_CHARS} 字符]"
+
+
+class _Cluster:
+    __slots__ = ("template", "count", "first_line")
+
+    def __init__(self, tokens: List[str], line_no: int):
+        self.template = tokens
+        self.count = 1
+        self.first_line = line_no
+
+
+class _Entry:
+    """一条原文保留的错误 / 警告（含其后的异常堆栈）。"""
+    __slots__ = ("lines", "count", "first_line", "last_line")
+
+    def __init__(self, lines: List[str], line_no: int):
+        self.lines = lines
+        self.count = 1
+        self.first_line = line_no
+        self.last_line = line_no
+
+    def render(self, compact: bool = False) -> str:
+        lines = _compact_trace(self.lines) if compact else self.lines
+        head = f"L{self.first_line}: {lines[0]}"
+        if self.count > 1:
+            head += f"  [×{self.count}，最后一次 L{self.last_line}]"
+        return "\n".join([head] + lines[1:])
+
+
+def _compact_trace(lines: List[str]) -> List[str]:
+    """每个异常段只保留前 FRAMES_PER_CAUSE 个堆栈帧。"""
+    result, frames, omitted = [], 0, 0
+    for line in lines:
+        if _FRAME_RE.match(line):
+            frames += 1
+            if frames > FRAMES_PER_CAUSE:
+                omitted += 1
+                continue
+        else:
+            if omitted:
+                result.append(f"\t... 省略 {omitted} 个堆栈帧")
+            frames, omitted = 0, 0
+        result.append(line)
+    if omitted:
+        result.append(f"\t... 省略 {omitted} 个堆栈帧")
+    return result
+
+
+class LogReducer:
+    """
+    流式日志压缩器：add() 逐行输入，digest() 输出 token 预算内的摘要。
+    """
+
+    def __init__(self, token_budget: int = 4000):
+        self.token_budget = token_budget
+        self.total_lines = 0
+        self.total_tokens = 0
+        self.unclustered = 0
+        self._buckets: Dict[Tuple, List[_Cluster]] = {}
+        self._cluster_count = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._entry_tokens = 0
+        self.evicted_entries = 0
+        self._block: Optional[List[str]] = None
+        self._block_line = 0
+        self._tail: deque = deque(maxlen=TAIL_LINES)
+
+    # ------------------------------------------------------------------
+    # 输入
+    # ------------------------------------------------------------------
+
+    def add(self, line: str):
+        self.total_lines += 1
+        line_no = self.total_lines
+        line = _clip(line.rstrip())
+        self.total_tokens += estimate_tokens(line) + 1
+        if not line.strip():
+            return
+        self._tail.append(line)
+
+        if is_trace_continuation(line):
+            if self._block is None:
+                self._block, self._block_line = [], line_no
+            self._block.append(line)
+            return
+
+        self._flush_block()
+        if _LEVEL_RE.search(line):
+            self._block, self._block_line = [line], line_no
+        else:
+            self._add_to_cluster(line, line_no)
+
+    def _flush_block(self):
+        if not self._block:
+            self._block = None
+            return
+        lines, line_no = self._block, self._block_line
+        self._block = None
+
+        key = "\n".join(mask_variables(line) for line in lines)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.count += 1
+            entry.last_line = line_no
+            return
+        entry = _Entry(lines, line_no)
+        self._entries[key] = entry
+        self._entry_tokens += estimate_tokens(entry.render())
+        # 保留的条目远超预算时丢弃最早的条目，保证内存有界（最终也只会输出最近的条目）
+        while self._entry_tokens > self.token_budget * 2 and len(self._entries) > 1:
+            _, oldest = self._entries.popitem(last=False)
+            self._entry_tokens -= estimate_tokens(oldest.render())
+            self.evicted_entries += oldest.count
+
+    def _add_to_cluster(self, line: str, line_no: int):
+        tokens = mask_variables(line).split()
+        prefix = tuple(
+            WILDCARD if any(c.isdigit() for c in token) else token
+            for token in tokens[:PREFIX_DEPTH]
+        )
+        bucket = self._buckets.setdefault((len(tokens), prefix), [])
+
+        best, best_sim = None, -1.0
+        for cluster in bucket:
+            sim = _similarity(cluster.template, tokens)
+            if sim > best_sim:
+                best, best_sim = cluster, sim
+        if best is not None and best_sim >= SIMILARITY_THRESHOLD:
+            best.count += 1
+            best.template = [t if t == u else WILDCARD for t, u in zip(best.template, tokens)]
+            return
+
+        if len(bucket) >= MAX_CLUSTERS_PER_BUCKET or self._cluster_count >= MAX_CLUSTERS:
+            self.unclustered += 1
+            return
+        bucket.append(_Cluster(tokens, line_no))
+        self._cluster_count += 1
+
+    # ------------------------------------------------------------------
+    # 输出
+    # ------------------------------------------------------------------
+
+    def digest(self) -> str:
+        """生成 token 预算内的日志摘要。"""
+        self._flush_block()
+        budget = self.token_budget
+        entries = list(self._entries.values())
+        clusters = sorted(
+            (c for bucket in self._buckets.values() for c in bucket),
+            key=lambda c: (-c.count, c.first_line),
+        )
+        tail = list(self._tail)
+
+        # 预留标题与各段说明的开销
+        remaining = budget - 120
+
+        # 1. 错误 / 警告与堆栈：从最近的条目往前装，模板至少保留 1/4 的预算（若需要）
+        template_cost = sum(estimate_tokens(self._render_cluster(c)) for c in clusters)
+        entry_budget = remaining - min(template_cost, remaining // 4) - min(
+            sum(estimate_tokens(line) + 1 for line in tail), remaining // 8
+        )
+        kept_entries: List[str] = []
+        used = 0
+        for entry in reversed(entries):
+            text = entry.render()
+            cost = estimate_tokens(text) + 1
+            if used + cost > entry_budget and len(entry.lines) > 1:
+                text = entry.render(compact=True)
+                cost = estimate_tokens(text) + 1
+            if used + cost > entry_budget:
+                break
+            kept_entries.append(text)
+            used += cost
+        kept_entries.reverse()
+        omitted_entries = len(entries) - len(kept_entries)
+        remaining -= used
+
+        # 2. 日志尾部
+        tail_lines: List[str] = []
+        tail_budget = min(remaining // 3, sum(estimate_tokens(line) + 1 for line in tail))
+        used = 0
+        for line in reversed(tail):
+            cost = estimate_tokens(line) + 1
+            if used + cost > tail_budget:
+                break
+            tail_lines.append(line)
+            used += cost
+        tail_lines.reverse()
+        remaining -= used
+
+        # 3. 模板：按出现次数从高到低装入剩余预算
+        kept_clusters: List[str] = []
+        for cluster in clusters:
+            text = self._render_cluster(cluster)
+            cost = estimate_tokens(text) + 1
+            if cost > remaining:
+                break
+            kept_clusters.append(text)
+            remaining -= cost
+        omitted_clusters = len(clusters) - len(kept_clusters)
+
+        clustered_lines = sum(c.count for c in clusters)
+        parts = [
+            f"[日志摘要] 原始日志共 {self.total_lines} 行（约 {self.total_tokens} tokens），"
+            f"已压缩到约 {budget} tokens 以内：错误/警告及异常堆栈保留原文（相同内容合并计数），"
+            f"其余 {clustered_lines + self.unclustered} 行归并为 {len(clusters)} 个模板"
+        ]
+        if entries or self.evicted_entries:
+            parts.append("== 错误 / 警告与异常堆栈（按首次出现顺序，L 为行号）==")
+            if omitted_entries or self.evicted_entries:
+                parts.append(f"[...预算不足，已省略更早的 {omitted_entries + self.evicted_entries} 条...]")
+            parts.extend(kept_entries)
+        if clusters:
+            parts.append("== 常规日志模板（×出现次数，<*> 为变量）==")
+            parts.extend(kept_clusters)
+            if omitted_clusters:
+                parts.append(f"[...另有 {omitted_clusters} 个低频模板已省略...]")
+        if self.unclustered:
+            parts.append(f"[...另有 {self.unclustered} 行未归类（模板数已达上限）...]")
+        if tail_lines:
+            parts.append(f"== 日志末尾 {len(tail_lines)} 行 ==")
+            parts.extend(tail_lines)
+        return "\n".join(parts)
+
+    @staticmethod
+    def _render_cluster(cluster: _Cluster) -> str:
+        return f"×{cluster.count}  L{cluster.first_line}: {' '.join(cluster.template)}"
+
+
+def _similarity(template: List[str], tokens: List[str]) -> float:
+    """Drain 相似度：与模板相同的 token 占比（模板中已泛化的 <*> 位置不计入，屏蔽后的变量计入）。"""
+    if not tokens:
+        return 1.0
+    same = sum(1 for t, u in zip(template, tokens) if t == u)
+    return same / len(tokens)
+
+
+def reduce_log(lines, token_budget: int = 4000) -> str:
+    """将日志行序列压缩为 token 预算内的摘要。"""
+    reducer = LogReducer(token_budget=token_budget)
+    for line in lines:
+        reducer.add(line)
+    return reducer.digest()
@@ -0,0 +1,172 @@
+"""
+backend/core/ocr_cache.py
+
+OCR 识别结果缓存（按内容寻址）。
+
+用户经常重复发送同一张截图（Agent 超时后重试、粘贴到新会话等），缓存后相同图片不再重复识别：
+- 缓存键为解码后图片字节与 OCR 参数（预处理开关、缩放 / 切块尺寸）的 SHA-256，参数变化后自动失效
+- 内存中按 LRU 保留最近 memory_size 条，SQLite 持久化最多 max_entries 条（超出时按最近使用时间淘汰），
+  服务重启后仍可命中
+- stats() 提供内存 / 磁盘命中数、未命中数和命中率，供 /metrics 接口输出
+
+识别失败（异常）不写入缓存；识别超时的图片在后台识别完成后仍会写入，重试时即可命中。
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本，识别结果的格式或预处理逻辑变化时递增，使旧缓存失效
+CACHE_VERSION = 1
+
+# 淘汰时额外删除的比例，避免每次写入都触发淘汰
+_PRUNE_SLACK = 0.1
+
+
+def cache_key(raw: bytes) -> str:
+    """图片字节 + 当前 OCR 参数的缓存键。"""
+    digest = hashlib.sha256(raw)
+    digest.update(
+        f"|v{CACHE_VERSION}|pre={settings.OCR_PREPROCESS}"
+        f"|edge={settings.OCR_MAX_LONG_EDGE}|tile={settings.OCR_TILE_HEIGHT}".encode()
+    )
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """内存 LRU + SQLite 两级缓存，跨线程安全（在 OCR 线程池中调用）。"""
+
+    def __init__(self, db_path: str = "./data/ocr_cache.db", memory_size: int = 256, max_entries: int = 10000):
+        """
+        Args:
+            db_path: SQLite 缓存文件路径
+            memory_size: 内存中保留的条目数
+            max_entries: SQLite 中保留的条目数上限，0 表示不持久化
+        """
+        self.memory_size = max(0, memory_size)
+        self.max_entries = max(0, max_entries)
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evicted": 0}
+
+        self._conn = None
+        self._disk_count = 0
+        if self.max_entries:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock, self._conn:
+                self._conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS ocr_cache (
+                        key        TEXT PRIMARY KEY,
+                        text       TEXT NOT NULL,
+                        created_at REAL,
+                        last_used  REAL
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache(last_used);
+                """)
+                self._disk_count = self._conn.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，未命中返回 None；磁盘命中时提升到内存。"""
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return text
+
+            if self._conn is not None:
+                with self._conn:
+                    row = self._conn.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        self._conn.execute(
+                            "UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key)
+                        )
+                if row is not None:
+                    self._counters["disk_hits"] += 1
+                    self._remember(key, row[0])
+                    return row[0]
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, text: str):
+        """写入缓存，SQLite 条目数超过上限时按最近使用时间淘汰。"""
+        with self._lock:
+            self._remember(key, text)
+            self._counters["writes"] += 1
+            if self._conn is None:
+                return
+            now = time.time()
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO ocr_cache (key, text, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, text, now, now),
+                )
+                self._disk_count += cursor.rowcount
+                if self._disk_count > self.max_entries:
+                    excess = self._disk_count - self.max_entries + int(self.max_entries * _PRUNE_SLACK)
+                    deleted = self._conn.execute(
+                        "DELETE FROM ocr_cache WHERE key IN "
+                        "(SELECT key FROM ocr_cache ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    ).rowcount
+                    self._disk_count -= deleted
+                    self._counters["evicted"] += deleted
+
+    def _remember(self, key: str, text: str):
+        if not self.memory_size:
+            return
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存指标：条目数、命中 / 未命中计数及命中率。"""
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+                "max_entries": self.max_entries,
+                **self._counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_ocr_cache: Optional[OCRCache] = None
+_ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> OCRCache:
+    """获取全局 OCR 缓存（单例）。"""
+    global _ocr_cache
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                _ocr_cache = OCRCache(
+                    db_path=settings.OCR_CACHE_DB_PATH,
+                    memory_size=settings.OCR_CACHE_MEMORY_SIZE,
+                    max_entries=settings.OCR_CACHE_MAX_ENTRIES,
+                )
+    return _ocr_cache
+
+
+def ocr_cache_stats() -> Dict[str, Any]:
+    """OCR 缓存指标（尚未初始化时为空）。"""
+    return _ocr_cache.stats() if _ocr_cache is not None else {}
@@ -3,14 +3,31 @@ backend/core/ocr_service.py
 
 OCR 图片文字识别服务。
 使用 RapidOCR 对用户上传的图片进行文字提取，将识别结果作为纯文本拼接到消息中。
+
+同一条消息的多张图片在 OCR 线程池中并行识别：
+- 每个线程持有独立的 RapidOCR 实例（onnxruntime 推理时释放 GIL，多实例可真正并行）
+- 每个实例的 onnxruntime intra-op 线程数可配置，避免多实例同时推理时 CPU 超额订阅
+- 单张图片超过 OCR_IMAGE_TIMEOUT 秒未完成时返回超时提示，不阻塞其余图片；输出顺序与上传顺序一致
+
+识别前先做预处理（OCR_PREPROCESS，默认开启）：灰度化、裁掉纯色边框、长边缩小到 OCR_MAX_LONG_EDGE，
+超长截图按 OCR_TILE_HEIGHT 切块逐块识别，4K / 长截图的检测耗时随输入尺寸显著下降。
+效果可用 scripts/benchmark_ocr.py 在截图样本集上对比。
+
+识别结果按图片内容缓存（见 backend/core/ocr_cache.py），重复发送的同一张截图不再重复识别。
 """
 
-import base64
 import io
+import time
+import base64
 import logging
-from typing import List, Optional
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops
 
-from PIL import Image
+from backend.config import settings
+from backend.core.ocr_cache import cache_key, get_ocr_cache
 
 logger = logging.getLogger(__name__)
 
@@ -30,17 +47,48 @@ MAX_IMAGE_SIZE = 5 * 1024 * 1024
 # 单条消息最多 5 张图片
 MAX_IMAGES_PER_MESSAGE = 5
 
-# 懒加载 RapidOCR 引擎（单例）
-_ocr_engine = None
+# 预处理：判定为背景边框的灰度差阈值、裁边后保留的留白（像素）、超长截图相邻切块的重叠高度（像素）
+_BORDER_THRESHOLD = 12
+_BORDER_PADDING = 8
+_TILE_OVERLAP = 96
+
+# 等待 OCR 结果时检查超时的间隔（秒）
+_TIMEOUT_POLL_INTERVAL = 0.2
+
+# OCR 线程池（懒加载）；每个工作线程懒加载自己的 RapidOCR 实例
+_ocr_pool: Optional[ThreadPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+_thread_local = threading.local()
 
 
 def _get_ocr_engine():
-    global _ocr_engine
-    if _ocr_engine is None:
+    """获取当前线程的 RapidOCR 实例（引擎实例不共享，首次调用时初始化）"""
+    engine = getattr(_thread_local, "engine", None)
+    if engine is None:
         from rapidocr_onnxruntime import RapidOCR
-        _ocr_engine = RapidOCR()
-        logger.info("RapidOCR 引擎已初始化")
-    return _ocr_engine
+        try:
+            engine = RapidOCR(
+                intra_op_num_threads=settings.OCR_INTRA_OP_THREADS,
+                inter_op_num_threads=1,
+            )
+        except TypeError:
+            # 旧版 rapidocr_onnxruntime 不支持线程数参数
+            engine = RapidOCR()
+        _thread_local.engine = engine
+        logger.info(f"RapidOCR 引擎已初始化 [{threading.current_thread().name}]")
+    return engine
+
+
+def _get_ocr_pool() -> ThreadPoolExecutor:
+    global _ocr_pool
+    if _ocr_pool is None:
+        with _ocr_pool_lock:
+            if _ocr_pool is None:
+                _ocr_pool = ThreadPoolExecutor(
+                    max_workers=max(1, settings.OCR_POOL_SIZE),
+                    thread_name_prefix="ocr-engine",
+                )
+    return _ocr_pool
 
 
 def validate_image(data: str, mime_type: str) -> Optional[str]:
@@ -65,6 +113,96 @@ def validate_image(data: str, mime_type: str) -> Optional[str]:
     return None
 
 
+def preprocess_image(image: Image.Image) -> List[Image.Image]:
+    """
+    OCR 前的图片预处理，减小检测模型的输入尺寸：
+    灰度化 → 裁掉四周纯色边框 → 按 OCR_MAX_LONG_EDGE 缩小 → 超长截图按 OCR_TILE_HEIGHT 纵向切块。
+
+    Returns:
+        切块列表（自上而下），不需要切块时只有一个元素。
+    """
+    gray = image.convert("L")
+
+    # 以左上角像素为背景色，裁掉与背景色差异不超过阈值的边框
+    background = Image.new("L", gray.size, gray.getpixel((0, 0)))
+    diff = ImageChops.difference(gray, background).point(lambda v: 255 if v > _BORDER_THRESHOLD else 0)
+    bbox = diff.getbbox()
+    if bbox is None:
+        return [gray]
+    left, top, right, bottom = bbox
+    pad = _BORDER_PADDING
+    gray = gray.crop((max(0, left - pad), max(0, top - pad),
+                      min(gray.width, right + pad), min(gray.height, bottom + pad)))
+
+    # 超长截图只按宽度限制缩放（高度由切块处理），否则按长边限制；只缩小不放大
+    width, height = gray.size
+    tile_height = settings.OCR_TILE_HEIGHT
+    tall = tile_height > 0 and height > tile_height
+    limit_edge = width if tall else max(width, height)
+    if settings.OCR_MAX_LONG_EDGE > 0 and limit_edge > settings.OCR_MAX_LONG_EDGE:
+        scale = settings.OCR_MAX_LONG_EDGE / limit_edge
+        gray = gray.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                           Image.Resampling.LANCZOS)
+        width, height = gray.size
+
+    if tile_height <= 0 or height <= tile_height:
+        return [gray]
+
+    # 相邻切块重叠 _TILE_OVERLAP 像素，保证被切断的文字行完整出现在其中一块里
+    step = tile_height - _TILE_OVERLAP
+    tiles = []
+    for top in range(0, height, step):
+        tiles.append(gray.crop((0, top, width, min(height, top + tile_height))))
+        if top + tile_height >= height:
+            break
+    return tiles
+
+
+def _ocr_lines(engine, image: Image.Image, first: bool = True, last: bool = True) -> List[str]:
+    """
+    识别单张图片（或切块），返回按从上到下顺序排列的文字行。
+    切块时丢弃中心落在与相邻切块重叠区域一半以内的行，避免重叠区域的文字重复输出。
+    """
+    import numpy as np
+    result, _ = engine(np.array(image))
+    if not result:
+        return []
+
+    # result 格式: [[box, text, score], ...]，box 为四个顶点坐标
+    half = _TILE_OVERLAP / 2
+    lines = []
+    for box, text, _score in result:
+        center_y = sum(point[1] for point in box) / len(box)
+        if not first and center_y < half:
+            continue
+        if not last and center_y >= image.height - half:
+            continue
+        lines.append(text)
+    return lines
+
+
+def ocr_image(image: Image.Image, preprocess: bool = True) -> List[str]:
+    """
+    识别一张图片中的文字行。
+
+    Args:
+        image: PIL 图片
+        preprocess: 是否先做预处理（见 preprocess_image），关闭时将原图 RGB 数组直接交给 RapidOCR
+
+    Returns:
+        文字行列表
+    """
+    engine = _get_ocr_engine()
+    if not preprocess:
+        return _ocr_lines(engine, image.convert("RGB"))
+
+    tiles = preprocess_image(image)
+    lines = []
+    for i, tile in enumerate(tiles):
+        lines.extend(_ocr_lines(engine, tile, first=i == 0, last=i == len(tiles) - 1))
+    return lines
+
+
 def extract_text_from_base64(data: str, filename: str = "") -> str:
     """
     从 base64 编码的图片中提取文字。
@@ -78,22 +216,35 @@ def extract_text_from_base64(data: str, filename: str = "") -> str:
     """
     try:
         raw = base64.b64decode(data)
-        image = Image.open(io.BytesIO(raw))
+    except Exception as e:
+        logger.error(f"OCR 识别失败 [{filename}]: {e}", exc_info=True)
+        return f"[图片识别失败: {e}]"
+    return extract_text_from_bytes(raw, filename)
 
-        # RapidOCR 接受 numpy array
-        import numpy as np
-        img_array = np.array(image.convert("RGB"))
 
-        engine = _get_ocr_engine()
-        result, _ = engine(img_array)
+def extract_text_from_bytes(raw: bytes, filename: str = "") -> str:
+    """
+    从图片字节中提取文字（结果按内容缓存）。
 
-        if not result:
-            return "[未识别到文字内容]"
+    Returns:
+        识别出的文字，如果识别失败则返回错误提示。
+    """
+    try:
+        cache = get_ocr_cache()
+        key = cache_key(raw)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"OCR 缓存命中 [{filename}]")
+            return cached
 
-        # result 格式: [[box, text, score], ...]
-        lines = [item[1] for item in result]
-        text = "\n".join(lines)
-        logger.info(f"OCR 识别完成 [{filename}]: {len(lines)} 行文字")
+        image = Image.open(io.BytesIO(raw))
+        lines = ocr_image(image, preprocess=settings.OCR_PREPROCESS)
+        if lines:
+            text = "\n".join(lines)
+            logger.info(f"OCR 识别完成 [{filename}]: {len(lines)} 行文字")
+        else:
+            text = "[未识别到文字内容]"
+        cache.put(key, text)
         return text
 
     except Exception as e:
@@ -101,9 +252,67 @@ def extract_text_from_base64(data: str, filename: str = "") -> str:
         return f"[图片识别失败: {e}]"
 
 
+def submit_ocr(raw: bytes, filename: str = "", on_start: Optional[Callable[[], None]] = None) -> Future:
+    """
+    在 OCR 线程池中异步识别一张图片，返回结果为识别文字的 Future（用于上传后提前识别）。
+    on_start 在识别线程开始执行时调用（不含排队等待线程的时间）。
+    """
+    def run() -> str:
+        if on_start is not None:
+            on_start()
+        return extract_text_from_bytes(raw, filename)
+
+    return _get_ocr_pool().submit(run)
+
+
+def format_ocr_results(results: List[Tuple[str, str]]) -> str:
+    """拼接多张图片的识别文字 [(文件名, 文字)]，格式与 process_images 一致。"""
+    if len(results) == 1:
+        return results[0][1]
+    return "\n\n".join(
+        f"--- 图片{i + 1} ({filename}) ---\n{text}" for i, (filename, text) in enumerate(results)
+    )
+
+
+def _ocr_images_parallel(images: List[Tuple[int, dict]]) -> Dict[int, str]:
+    """
+    在 OCR 线程池中并行识别已通过校验的图片 [(序号, 图片)]，返回 {序号: 识别文字}。
+    单张图片从开始识别起超过 OCR_IMAGE_TIMEOUT 秒仍未完成时记为超时
+    （识别线程无法强制中断，会在后台继续运行至结束）。
+    """
+    timeout = settings.OCR_IMAGE_TIMEOUT
+    pool = _get_ocr_pool()
+    started: Dict[int, float] = {}
+    names = {i: img.get("filename", f"image_{i + 1}") for i, img in images}
+
+    def run(i: int, img: dict) -> str:
+        started[i] = time.monotonic()
+        return extract_text_from_base64(img["data"], filename=names[i])
+
+    futures: Dict[Future, int] = {pool.submit(run, i, img): i for i, img in images}
+    # 兜底：即使排队等待线程，整批也不超过逐张串行识别的最长时间
+    batch_deadline = time.monotonic() + timeout * len(futures)
+    texts: Dict[int, str] = {}
+
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=_TIMEOUT_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+        for future in done:
+            texts[futures[future]] = future.result()
+        now = time.monotonic()
+        for future in list(pending):
+            i = futures[future]
+            if now > batch_deadline or (i in started and now - started[i] > timeout):
+                future.cancel()
+                pending.discard(future)
+                texts[i] = f"[图片识别超时（超过 {timeout} 秒）]"
+                logger.warning(f"OCR 识别超时 [{names[i]}]")
+    return texts
+
+
 def process_images(images: List[dict]) -> str:
     """
-    处理多张图片，返回拼接的 OCR 识别文字。
+    处理多张图片，返回拼接的 OCR 识别文字（多张图片并行识别，顺序与输入一致）。
 
     Args:
         images: 图片列表，每项包含 {data, filename, mime_type}
@@ -118,22 +327,26 @@ def process_images(images: List[dict]) -> str:
         images = images[:MAX_IMAGES_PER_MESSAGE]
         logger.warning(f"图片数量超过限制，仅处理前 {MAX_IMAGES_PER_MESSAGE} 张")
 
-    results = []
+    # 校验
+    errors: Dict[int, str] = {}
+    valid = []
     for i, img in enumerate(images):
-        # 校验
         error = validate_image(img.get("data", ""), img.get("mime_type", ""))
         if error:
-            results.append(f"图片{i + 1} ({img.get('filename', '未知')}): {error}")
-            continue
+            errors[i] = error
+        else:
+            valid.append((i, img))
 
-        # OCR 识别
-        text = extract_text_from_base64(
-            img["data"],
-            filename=img.get("filename", f"image_{i + 1}"),
-        )
-        if len(images) > 1:
-            results.append(f"--- 图片{i + 1} ({img.get('filename', '')}) ---\n{text}")
+    # OCR 识别（并行）
+    texts = _ocr_images_parallel(valid) if valid else {}
+
+    results = []
+    for i, img in enumerate(images):
+        if i in errors:
+            results.append(f"图片{i + 1} ({img.get('filename', '未知')}): {errors[i]}")
+        elif len(images) > 1:
+            results.append(f"--- 图片{i + 1} ({img.get('filename', '')}) ---\n{texts[i]}")
         else:
-            results.append(text)
+            results.append(texts[i])
 
     return "\n\n".join(results)
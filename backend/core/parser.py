@@ -63,6 +63,13 @@ class PDMParser:
             table_code = self.get_text(table_node, 'a:Code')
             table_comment = self.get_text(table_node, 'a:Comment')
 
+            # Primary key columns: c:PrimaryKey refers to one of the c:Keys entries
+            primary_refs = set(table_node.xpath('c:PrimaryKey/o:Key/@Ref', namespaces=self.NS))
+            primary_columns = set()
+            for key_node in table_node.xpath('c:Keys/o:Key[@Id]', namespaces=self.NS):
+                if key_node.get('Id') in primary_refs:
+                    primary_columns.update(key_node.xpath('c:Key.Columns/o:Column/@Ref', namespaces=self.NS))
+
             columns = []
             column_nodes = table_node.xpath('.//c:Columns/o:Column[@Id]', namespaces=self.NS)
             for col_node in column_nodes:
@@ -73,7 +80,8 @@ class PDMParser:
                     'comment': self.get_text(col_node, 'a:Comment'),
                     'data_type': self.get_text(col_node, 'a:DataType'),
                     'length': self.get_text(col_node, 'a:Length'),
-                    'mandatory': self.get_text(col_node, 'a:Column.Mandatory') == '1'
+                    'mandatory': self.get_text(col_node, 'a:Column.Mandatory') == '1',
+                    'primary_key': col_node.get('Id') in primary_columns
                 }
                 columns.append(column)
 
@@ -108,12 +116,26 @@ class PDMParser:
             child_node = ref_node.xpath('c:ChildTable/o:Table', namespaces=self.NS)
             child_ref = child_node[0].get('Ref') if child_node else ""
 
+            # Join columns: Object1 is the parent column, Object2 the child column
+            joins = []
+            join_nodes = ref_node.xpath('c:Joins/o:ReferenceJoin', namespaces=self.NS)
+            for join_node in join_nodes:
+                parent_col = join_node.xpath('c:Object1/o:Column', namespaces=self.NS)
+                child_col = join_node.xpath('c:Object2/o:Column', namespaces=self.NS)
+                if parent_col and child_col:
+                    joins.append({
+                        'id': join_node.get('Id') or "",
+                        'parent_column_ref': parent_col[0].get('Ref'),
+                        'child_column_ref': child_col[0].get('Ref')
+                    })
+
             references.append({
                 'id': ref_id,
                 'name': ref_name,
                 'code': ref_code,
                 'parent_table_ref': parent_ref,
-                'child_table_ref': child_ref
+                'child_table_ref': child_ref,
+                'joins': joins
             })
 
         return references
@@ -0,0 +1,289 @@
+"""
+backend/core/sql_guard.py
+
+外部数据库（MySQL / Oracle）查询的 SQL 防护：Agent 生成的 SQL 经常不带行数限制，
+直接在生产规模的表上全表扫描。DBConnectionManager 在执行 SELECT 前依次：
+
+1. 扫描语句（跳过字符串、引号标识符和注释），只分析括号外的顶层关键字
+2. 语句没有行数限制时按方言追加：MySQL 为 LIMIT n，Oracle 为 FETCH FIRST n ROWS ONLY
+   （已有 LIMIT / FETCH / ROWNUM，或含 INTO、FOR UPDATE / FOR SHARE / LOCK IN SHARE MODE 时不改写）
+3. 先执行 EXPLAIN 取得执行计划估算：MySQL 为各表估算扫描行数（同一 SELECT 内相乘、不同 SELECT 相加），
+   Oracle 为 EXPLAIN PLAN 的总成本（已计入 FETCH FIRST 的提前终止）
+4. 估算超过阈值时拒绝执行；DB_GUARD_MODE=confirm 时提示与用户确认后以 confirm=true 重新执行
+
+MySQL 的 EXPLAIN 行数不考虑 LIMIT 的提前终止：带行数限制且无需排序 / 分组 / 去重 / 聚合的查询
+读满限制行数即停止。其中没有 WHERE / ON / USING 条件的查询不执行 EXPLAIN、不受行数阈值约束
+（仍受 DB_QUERY_TIMEOUT 限制）；带过滤条件的查询可能扫描整表才凑够行数，仍执行 EXPLAIN，
+全表扫描（type=ALL）的估算行数超过阈值时拒绝。
+EXPLAIN 失败（权限不足等）时不阻断查询。
+"""
+
+import re
+import uuid
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+REFUSE = "refuse"
+CONFIRM = "confirm"
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_$#]*")
+_AGGREGATE_RE = re.compile(r"\b(COUNT|SUM|AVG|MIN|MAX|GROUP_CONCAT|LISTAGG)\s*\(")
+
+# 顶层出现时说明结果不能边读边返回（需先读完全部数据）
+_BLOCKING_KEYWORDS = {"ORDER", "GROUP", "HAVING", "DISTINCT", "UNION", "INTERSECT", "EXCEPT", "MINUS"}
+# 出现在任意层级时说明需要按条件筛选行，读满限制行数前可能扫描整表
+_FILTER_KEYWORDS = {"WHERE", "ON", "USING"}
+# 顶层的锁定读子句，其后不能再追加行数限制
+_LOCK_CLAUSE_RE = re.compile(r"\bFOR\s+(UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b")
+
+
+@dataclass
+class PlanEstimate:
+    rows: Optional[float] = None            # MySQL：估算扫描行数
+    cost: Optional[float] = None            # Oracle：执行计划总成本
+    full_scan_rows: Optional[float] = None  # MySQL：全表扫描（type=ALL）中最大的估算行数
+
+    def describe(self) -> str:
+        if self.cost is not None:
+            return f"estimated cost {self.cost:,.0f}"
+        return f"estimated {self.rows:,.0f} rows examined"
+
+
+@dataclass
+class GuardResult:
+    sql: str                                # 实际执行的 SQL（可能已追加行数限制）
+    limited: bool = False                   # 是否追加了行数限制
+    estimate: Optional[PlanEstimate] = None
+    refused: Optional[str] = None           # 拒绝原因，None 表示放行
+
+
+# ------------------------------------------------------------------
+# 语句扫描
+# ------------------------------------------------------------------
+
+def _mask(sql: str) -> str:
+    """把字符串、引号标识符和注释替换为等长空白，保留其余字符的位置。"""
+    out = list(sql)
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"', "`"):
+            j = i + 1
+            while j < n:
+                if sql[j] == "\\" and ch != "`":
+                    j += 2
+                    continue
+                if sql[j] == ch:
+                    if j + 1 < n and sql[j + 1] == ch:  # '' 转义
+                        j += 2
+                        continue
+                    break
+                j += 1
+            end = min(j + 1, n)
+        elif sql.startswith("--", i) or (ch == "#" and (i == 0 or not _is_word_char(sql[i - 1]))):
+            end = sql.find("\n", i)
+            end = n if end < 0 else end
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            end = n if end < 0 else end + 2
+        else:
+            i += 1
+            continue
+        for k in range(i, end):
+            if out[k] != "\n":
+                out[k] = " "
+        i = end
+    return "".join(out)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch in "_$#"
+
+
+def _top_level_words(masked: str) -> List[str]:
+    """括号外的关键字 / 标识符（大写）。"""
+    words, depth, last = [], 0, 0
+    for i, ch in enumerate(masked):
+        if ch in "()":
+            if depth == 0:
+                words.extend(_WORD_RE.findall(masked[last:i]))
+            depth += 1 if ch == "(" else -1
+            depth = max(depth, 0)
+            last = i + 1
+    if depth == 0:
+        words.extend(_WORD_RE.findall(masked[last:]))
+    return [w.upper() for w in words]
+
+
+def _top_level_text(masked: str) -> str:
+    """去掉所有括号内内容后的语句（用于匹配顶层的聚合函数调用）。"""
+    out, depth = [], 0
+    for ch in masked:
+        if ch == "(":
+            if depth == 0:
+                out.append("(")
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            out.append(ch)
+    return "".join(out).upper()
+
+
+def strip_statement(sql: str) -> str:
+    """去掉首尾空白和末尾的分号。"""
+    sql = sql.strip()
+    while sql.endswith(";"):
+        sql = sql[:-1].rstrip()
+    return sql
+
+
+def is_query(sql: str) -> bool:
+    """是否为 SELECT / WITH 查询。"""
+    words = _WORD_RE.findall(_mask(sql).lstrip(" \t\r\n("))
+    return bool(words) and words[0].upper() in ("SELECT", "WITH")
+
+
+def has_row_limit(sql: str) -> bool:
+    """顶层是否已有 LIMIT / FETCH FIRST|NEXT / ROWNUM 限制。"""
+    words = _top_level_words(_mask(sql))
+    return any(w in ("LIMIT", "FETCH", "ROWNUM") for w in words)
+
+
+def is_streamable(sql: str) -> bool:
+    """结果能否边读边返回（无需排序 / 分组 / 去重 / 聚合），此时行数限制会让执行提前终止。"""
+    masked = _mask(sql)
+    if _BLOCKING_KEYWORDS.intersection(_top_level_words(masked)):
+        return False
+    return not _AGGREGATE_RE.search(_top_level_text(masked))
+
+
+def has_filter(sql: str) -> bool:
+    """任意层级是否有 WHERE / ON / USING 过滤条件。"""
+    return any(w.upper() in _FILTER_KEYWORDS for w in _WORD_RE.findall(_mask(sql)))
+
+
+def apply_row_limit(sql: str, dialect: str, limit: int) -> Optional[str]:
+    """
+    为没有行数限制的查询追加方言对应的限制，返回改写后的 SQL；不需要或无法改写时返回 None。
+    """
+    sql = strip_statement(sql)
+    masked = _mask(sql)
+    if limit <= 0 or ";" in masked or not is_query(sql) or has_row_limit(sql):
+        return None
+    # SELECT ... INTO 与锁定读（FOR UPDATE / FOR SHARE / LOCK IN SHARE MODE）不能在末尾追加限制
+    if "INTO" in _top_level_words(masked) or _LOCK_CLAUSE_RE.search(_top_level_text(masked)):
+        return None
+    if dialect == "mysql":
+        return f"{sql}\nLIMIT {int(limit)}"
+    if dialect == "oracle":
+        return f"{sql}\nFETCH FIRST {int(limit)} ROWS ONLY"
+    return None
+
+
+# ------------------------------------------------------------------
+# 执行计划估算
+# ------------------------------------------------------------------
+
+def explain(connection, sql: str, params: Optional[dict] = None) -> Optional[PlanEstimate]:
+    """在当前连接上执行 EXPLAIN，返回估算；不支持或失败时返回 None。"""
+    from sqlalchemy import text
+
+    dialect = connection.dialect.name
+    try:
+        if dialect == "mysql":
+            result = connection.execute(text(f"EXPLAIN {sql}"), params or {})
+            per_select, full_scan = {}, None
+            for row in result.mappings():
+                rows = float(row.get("rows") or 1)
+                select_id = row.get("id")
+                per_select[select_id] = per_select.get(select_id, 1.0) * max(rows, 1.0)
+                if str(row.get("type") or "").upper() == "ALL":
+                    full_scan = max(full_scan or 0.0, rows)
+            if not per_select:
+                return None
+            return PlanEstimate(rows=sum(per_select.values()), full_scan_rows=full_scan)
+
+        if dialect == "oracle":
+            # EXPLAIN PLAN 不接受绑定变量的值；带参数的语句跳过估算
+            if params:
+                return None
+            statement_id = f"guard_{uuid.uuid4().hex[:20]}"
+            connection.exec_driver_sql(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}")
+            row = connection.exec_driver_sql(
+                f"SELECT cost, cardinality FROM plan_table WHERE statement_id = '{statement_id}' AND id = 0"
+            ).first()
+            connection.rollback()  # 丢弃 plan_table 中的计划行
+            if row is None or row[0] is None:
+                return None
+            return PlanEstimate(rows=float(row[1]) if row[1] is not None else None, cost=float(row[0]))
+    except Exception as e:
+        logger.warning(f"EXPLAIN failed on {dialect}, skipping cost guard: {e}")
+        if connection.in_transaction():
+            connection.rollback()
+    return None
+
+
+def guard_statement(connection, sql: str, params: Optional[dict] = None,
+                    row_limit: int = 0, confirm: bool = False) -> GuardResult:
+    """
+    对 SELECT 追加行数限制并按 EXPLAIN 估算判断是否放行；非查询语句原样放行。
+
+    Args:
+        connection: 已取出的 SQLAlchemy 连接
+        sql: 待执行的 SQL
+        params: SQL 参数
+        row_limit: 追加的行数限制，0 表示不追加
+        confirm: 调用方已确认执行高成本查询
+    """
+    if not settings.DB_SQL_GUARD or not is_query(sql):
+        return GuardResult(sql=sql)
+
+    dialect = connection.dialect.name
+    if dialect not in ("mysql", "oracle"):
+        return GuardResult(sql=sql)
+    limited_sql = apply_row_limit(sql, dialect, row_limit)
+    result = GuardResult(sql=limited_sql or sql, limited=limited_sql is not None)
+    if confirm and settings.DB_GUARD_MODE == CONFIRM:
+        return result
+
+    max_rows, max_cost = settings.DB_GUARD_MAX_ROWS, settings.DB_GUARD_MAX_COST
+    if (dialect == "mysql" and not max_rows) or (dialect == "oracle" and not max_cost):
+        return result
+    # 带行数限制、可边读边返回的 MySQL 查询读满即停，EXPLAIN 行数不代表实际扫描量；
+    # 没有过滤条件时前 n 行即是结果，直接放行，有过滤条件时只按全表扫描判断
+    early_stop = dialect == "mysql" and has_row_limit(result.sql) and is_streamable(result.sql)
+    if early_stop and not has_filter(result.sql):
+        return result
+
+    estimate = explain(connection, result.sql, params)
+    result.estimate = estimate
+    if estimate is None:
+        return result
+
+    if early_stop:
+        over = estimate.full_scan_rows is not None and estimate.full_scan_rows > max_rows
+    else:
+        over = (
+            (dialect == "mysql" and estimate.rows is not None and estimate.rows > max_rows)
+            or (dialect == "oracle" and estimate.cost is not None and estimate.cost > max_cost)
+        )
+    if over:
+        threshold = f"{max_rows:,} rows" if dialect == "mysql" else f"cost {max_cost:,.0f}"
+        detail = (
+            f"filtered full table scan of an estimated {estimate.full_scan_rows:,.0f} rows" if early_stop
+            else estimate.describe()
+        )
+        message = (
+            f"Error: [SQL Guard] Query refused: {detail}, exceeding the limit of {threshold}. "
+            "Add selective WHERE conditions on indexed columns, or aggregate on the server side."
+        )
+        if settings.DB_GUARD_MODE == CONFIRM:
+            message += " If this full query is really needed, confirm with the user and re-run it with confirm=true."
+        result.refused = message
+    return result
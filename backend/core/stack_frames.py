@@ -0,0 +1,200 @@
+"""
+backend/core/stack_frames.py
+
+从附件文本（日志、截图 OCR 结果）中提取 Java 堆栈帧，并直接在代码索引中定位对应的方法。
+
+Agent 原本需要多轮 search_code / get_class_detail 才能找到堆栈指向的代码；这里在发送前：
+1. 解析 "at com.acme.FooService.bar(FooService.java:123)" 形式的堆栈帧（兼容 OCR 的全角括号 / 冒号和多余空格）
+2. 用一次按 qualified_name 索引的查询批量取回候选方法，再按行号落在 line_start ~ line_end 内选出方法
+3. 将命中的方法代码（标出堆栈所在行）作为上下文拼接到消息中
+
+代码索引中内部类按 <包名>.<类名> 登记，因此内部类（Foo$Bar）按 <包名>.Bar 查找；
+匿名类（Foo$1）和 lambda（lambda$bar$0）归一到外层类 / 方法名。
+"""
+
+import re
+import sqlite3
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 最多解析的不同堆栈帧数
+MAX_FRAMES = 50
+
+# 附加的每个方法最多显示的行数（以堆栈所在行为中心截取）
+MAX_CHUNK_LINES = 60
+
+_FRAME_RE = re.compile(
+    r"\bat\s+((?:[\w$]+\s*\.\s*)+)([\w$<>]+)\s*[(（]\s*([\w$]+\.java)\s*[:：]\s*(\d+)\s*[)）]"
+)
+_LAMBDA_RE = re.compile(r"^lambda\$(.+?)\$\d+$")
+
+
+@dataclass
+class StackFrame:
+    class_name: str     # 堆栈中的完整类名，如 com.acme.FooService$Inner
+    method: str         # 堆栈中的方法名，如 bar / lambda$bar$0
+    file_name: str
+    line: int
+
+    @property
+    def label(self) -> str:
+        return f"{self.class_name}.{self.method}({self.file_name}:{self.line})"
+
+    def candidates(self) -> List[str]:
+        """可能对应的索引 qualified_name（内部类 / 匿名类 / lambda 归一后）。"""
+        method = self.method
+        match = _LAMBDA_RE.match(method)
+        if match:
+            method = match.group(1)
+        parts = self.class_name.split("$")
+        names = []
+        # 内部类：com.acme.Foo$Bar → com.acme.Foo.Bar，以及索引中的 com.acme.Bar；匿名类 Foo$1 去掉编号
+        named = [p for p in parts[1:] if p and not p.isdigit()]
+        if named:
+            names.append(".".join([parts[0]] + named) + f".{method}")
+            package = parts[0].rpartition(".")[0]
+            names.append(f"{package}.{named[-1]}.{method}" if package else f"{named[-1]}.{method}")
+        names.append(f"{parts[0]}.{method}")
+        return names
+
+
+def extract_frames(text: str, limit: int = MAX_FRAMES) -> List[StackFrame]:
+    """按出现顺序提取去重后的堆栈帧。"""
+    frames: List[StackFrame] = []
+    seen = set()
+    for match in _FRAME_RE.finditer(text or ""):
+        class_name = re.sub(r"\s+", "", match.group(1)).rstrip(".")
+        frame = StackFrame(class_name, match.group(2), match.group(3), int(match.group(4)))
+        if frame.label in seen:
+            continue
+        seen.add(frame.label)
+        frames.append(frame)
+        if len(frames) >= limit:
+            break
+    return frames
+
+
+def resolve_frames(frames: List[StackFrame], max_chunks: int = 5, db_path: Optional[str] = None) -> List[dict]:
+    """
+    在 code_chunks 中定位堆栈帧对应的方法。
+
+    Returns:
+        按堆栈顺序排列、按方法去重的命中列表，每项包含 frame 和方法 chunk 的字段。
+    """
+    if not frames or max_chunks <= 0:
+        return []
+
+    qualified_names = sorted({name for frame in frames for name in frame.candidates()})
+    placeholders = ", ".join("?" for _ in qualified_names)
+    try:
+        conn = sqlite3.connect(db_path or settings.SQLITE_DB_PATH)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT chunk_id, file_path, qualified_name, content, line_start, line_end
+                FROM code_chunks
+                WHERE qualified_name IN ({placeholders}) AND chunk_type = 'method'
+            """, qualified_names)
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"堆栈帧定位失败（代码索引不可用）: {e}")
+        return []
+
+    by_name: Dict[str, List[tuple]] = {}
+    for row in rows:
+        by_name.setdefault(row[2], []).append(row)
+
+    resolved, used = [], set()
+    for frame in frames:
+        chunk = _match_chunk(frame, by_name)
+        if chunk is None or chunk[0] in used:
+            continue
+        used.add(chunk[0])
+        chunk_id, file_path, qualified_name, content, line_start, line_end = chunk
+        resolved.append({
+            "frame": frame,
+            "chunk_id": chunk_id,
+            "file_path": file_path,
+            "qualified_name": qualified_name,
+            "content": content,
+            "line_start": line_start,
+            "line_end": line_end,
+        })
+        if len(resolved) >= max_chunks:
+            break
+    return resolved
+
+
+def _match_chunk(frame: StackFrame, by_name: Dict[str, List[tuple]]) -> Optional[tuple]:
+    """
+    优先选行号范围包含堆栈行且文件名一致的方法；重载方法靠行号区分。
+    方法 chunk 的 line_end 是截取上限而非方法实际结束行，相邻重载的范围会重叠，
+    因此取范围内起始行最接近堆栈行的方法。
+    """
+    for name in frame.candidates():
+        chunks = [c for c in by_name.get(name, []) if c[1].replace("\\", "/").endswith(frame.file_name)]
+        in_range = [c for c in chunks if c[4] <= frame.line <= c[5]]
+        if in_range:
+            return max(in_range, key=lambda c: c[4])
+        # 代码版本与日志不一致时行号可能偏移：唯一同名方法仍可采用
+        if len(chunks) == 1:
+            return chunks[0]
+    return None
+
+
+def _format_chunk(item: dict) -> str:
+    frame: StackFrame = item["frame"]
+    lines = item["content"].splitlines()
+    start = item["line_start"] or 1
+    in_range = item["line_start"] <= frame.line <= item["line_end"]
+
+    # 方法过长时以堆栈所在行为中心截取
+    offset = 0
+    if len(lines) > MAX_CHUNK_LINES:
+        center = frame.line - start if in_range else 0
+        offset = max(0, min(center - MAX_CHUNK_LINES // 2, len(lines) - MAX_CHUNK_LINES))
+        lines = lines[offset:offset + MAX_CHUNK_LINES]
+
+    body = []
+    for i, line in enumerate(lines):
+        line_no = start + offset + i
+        marker = ">" if in_range and line_no == frame.line else " "
+        body.append(f"{marker}{line_no:>5} | {line}")
+
+    note = f"堆栈行 L{frame.line}" if in_range else f"堆栈行 L{frame.line} 不在索引范围内，代码版本可能不一致"
+    header = (f"### {item['qualified_name']} — {item['file_path']} "
+              f"(L{item['line_start']}-L{item['line_end']})，{note}")
+    return f"{header}\n```java\n" + "\n".join(body) + "\n```"
+
+
+def build_stack_context(texts: List[str], max_chunks: Optional[int] = None) -> str:
+    """
+    从多段附件文本中提取堆栈帧并定位代码，返回可拼接到消息中的上下文；没有命中时返回空字符串。
+    """
+    if max_chunks is None:
+        max_chunks = settings.STACK_FRAME_MAX_CHUNKS
+    if max_chunks <= 0:
+        return ""
+
+    frames: List[StackFrame] = []
+    seen = set()
+    for text in texts:
+        for frame in extract_frames(text):
+            if frame.label not in seen and len(frames) < MAX_FRAMES:
+                seen.add(frame.label)
+                frames.append(frame)
+    if not frames:
+        return ""
+
+    resolved = resolve_frames(frames, max_chunks=max_chunks)
+    logger.info(f"堆栈帧定位: 解析 {len(frames)} 个帧，命中 {len(resolved)} 个方法")
+    if not resolved:
+        return ""
+    return "\n\n".join(_format_chunk(item) for item in resolved)
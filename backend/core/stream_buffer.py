@@ -0,0 +1,351 @@
+"""
+backend/core/stream_buffer.py
+
+流式回复的服务端事件缓冲，支持断线续传。
+
+每次流式对话是一个 StreamRun：Agent 运行任务把事件（文本片段、工具进度、错误）依次发布到
+run 中，事件序号从 1 递增；SSE 连接只是 run 的订阅者，按序号读取事件：
+- 客户端断开不会立即终止 run，超过 resume_grace 秒仍无订阅者时才取消 Agent 运行
+- 客户端带 Last-Event-ID（"<run_id>:<seq>"）重连时，先补发 seq 之后的事件，再继续接收实时事件
+- 内存中每个 run 最多保留 max_events 条事件，更早的事件溢出到 SQLite；
+  已结束的 run 全部落盘，ttl 秒后从内存移除，之后仍可从 SQLite 续传，retention 秒后删除
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.config import settings
+from backend.core.executors import SQLITE, get_executor, run_blocking
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+# 一次从 SQLite 补发的最大事件数
+REPLAY_BATCH_SIZE = 500
+
+# 清理过期 run 的最小间隔（秒）
+PURGE_INTERVAL = 3600
+
+
+class StreamEventStore:
+    """已溢出 / 已结束 run 的事件存储（SQLite，WAL 模式），单连接 + 锁，跨线程安全。"""
+
+    def __init__(self, db_path: str = "./data/streams.db"):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS stream_runs (
+                    run_id     TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    status     TEXT NOT NULL,
+                    last_seq   INTEGER DEFAULT 0,
+                    updated_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_stream_runs_updated ON stream_runs(updated_at);
+
+                CREATE TABLE IF NOT EXISTS stream_events (
+                    run_id TEXT NOT NULL,
+                    seq    INTEGER NOT NULL,
+                    data   TEXT NOT NULL,
+                    PRIMARY KEY (run_id, seq)
+                ) WITHOUT ROWID;
+            """)
+
+    def save(self, run_id: str, session_id: str, status: str, events: List[Tuple[int, Dict[str, Any]]]):
+        """写入一批事件并更新 run 状态（可重复写入同一序号）。"""
+        last_seq = events[-1][0] if events else 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO stream_events (run_id, seq, data) VALUES (?, ?, ?)",
+                [(run_id, seq, json.dumps(data, ensure_ascii=False)) for seq, data in events],
+            )
+            self._conn.execute(
+                "INSERT INTO stream_runs (run_id, session_id, status, last_seq, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET "
+                "status = CASE WHEN stream_runs.status = 'running' THEN excluded.status ELSE stream_runs.status END, "
+                "last_seq = MAX(last_seq, excluded.last_seq), updated_at = excluded.updated_at",
+                (run_id, session_id, status, last_seq, time.time()),
+            )
+
+    def load_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, session_id, status, last_seq FROM stream_runs WHERE run_id = ?",
+                (run_id,),
+            ).fetchone()
+        if not row:
+            return None
+        return {"run_id": row[0], "session_id": row[1], "status": row[2], "last_seq": row[3]}
+
+    def load_events(self, run_id: str, after_seq: int, limit: int = REPLAY_BATCH_SIZE) -> List[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, data FROM stream_events WHERE run_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (run_id, after_seq, limit),
+            ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def purge(self, older_than: float) -> int:
+        """删除 updated_at 早于 older_than 的 run 及其事件，返回删除的 run 数。"""
+        with self._lock, self._conn:
+            run_ids = [r[0] for r in self._conn.execute(
+                "SELECT run_id FROM stream_runs WHERE updated_at < ?", (older_than,)
+            ).fetchall()]
+            for run_id in run_ids:
+                self._conn.execute("DELETE FROM stream_events WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM stream_runs WHERE updated_at < ?", (older_than,))
+        return len(run_ids)
+
+
+class StreamRun:
+    """一次流式对话的事件序列，在事件循环线程中使用。"""
+
+    def __init__(self, buffer: "StreamBuffer", run_id: str, session_id: str,
+                 status: str = RUNNING, last_seq: int = 0):
+        self.buffer = buffer
+        self.run_id = run_id
+        self.session_id = session_id
+        self.status = status
+        self.task: Optional[asyncio.Task] = None
+        self.finished_at: Optional[float] = None if status == RUNNING else time.monotonic()
+        # 内存中的事件 [(seq, data)]，序号连续；更早的事件在 SQLite 中
+        self._events: List[Tuple[int, Dict[str, Any]]] = []
+        self._last_seq = last_seq
+        self._persisted_seq = last_seq
+        self._pending_writes = 0
+        # 已发布的回复全文与最后一条错误（供运行结束后保存结果）
+        self.text = ""
+        self.error: Optional[str] = None
+        self._subscribers = 0
+        self._changed = asyncio.Event()
+
+    # ------------------------------------------------------------------
+    # 生产者
+    # ------------------------------------------------------------------
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    @property
+    def finished(self) -> bool:
+        return self.status != RUNNING
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def publish(self, data: Dict[str, Any]) -> int:
+        """发布一个事件，返回其序号。"""
+        if self.finished:
+            return self._last_seq
+        self._last_seq += 1
+        self._events.append((self._last_seq, data))
+        if "content" in data:
+            self.text += data["content"]
+        if "error" in data:
+            self.error = data["error"]
+        self._notify()
+        if len(self._events) > self.buffer.max_events:
+            self._spill()
+        return self._last_seq
+
+    def finish(self, status: str = DONE) -> None:
+        """标记 run 结束（幂等），剩余事件全部落盘。"""
+        if self.finished:
+            return
+        self.status = ERROR if status == DONE and self.failed else status
+        self.finished_at = time.monotonic()
+        self._notify()
+        self._spill(final=True)
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _spill(self, final: bool = False) -> None:
+        """把内存中超出上限的事件（final 时为全部）异步写入 SQLite，写入完成后再从内存移除。"""
+        if self._pending_writes and not final:
+            return
+        keep = 0 if final else self.buffer.max_events // 2
+        batch = [e for e in self._events[:len(self._events) - keep] if e[0] > self._persisted_seq]
+        if not batch and not final:
+            return
+        self._pending_writes += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            get_executor(SQLITE), self.buffer.store.save,
+            self.run_id, self.session_id, self.status, batch,
+        )
+
+        def _done(f):
+            self._pending_writes -= 1
+            if f.exception() is not None:
+                logger.warning(f"[StreamBuffer] run {self.run_id} 事件落盘失败: {f.exception()}")
+                return
+            if batch:
+                upto = batch[-1][0]
+                self._persisted_seq = max(self._persisted_seq, upto)
+                if not final:
+                    self._events = [e for e in self._events if e[0] > upto]
+
+        future.add_done_callback(_done)
+
+    # ------------------------------------------------------------------
+    # 订阅者
+    # ------------------------------------------------------------------
+
+    def attach(self) -> None:
+        self._subscribers += 1
+
+    def detach(self) -> None:
+        """订阅者断开；没有订阅者且 run 未结束时，宽限期后取消 Agent 运行。"""
+        self._subscribers = max(0, self._subscribers - 1)
+        if self._subscribers == 0 and not self.finished and self.task is not None:
+            asyncio.get_running_loop().call_later(self.buffer.resume_grace, self._cancel_if_detached)
+
+    def _cancel_if_detached(self) -> None:
+        if self._subscribers == 0 and not self.finished and self.task is not None and not self.task.done():
+            logger.info(f"[StreamBuffer] run {self.run_id} 无订阅者超过 {self.buffer.resume_grace}s，取消 Agent 运行")
+            self.task.cancel()
+
+    async def read_after(self, seq: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """返回序号大于 seq 的已发布事件（可能为空）；早于内存窗口的部分从 SQLite 读取。"""
+        if self._events and seq + 1 >= self._events[0][0]:
+            return [e for e in self._events if e[0] > seq]
+        if seq >= self._last_seq:
+            return []
+        events = await run_blocking(SQLITE, self.buffer.store.load_events, self.run_id, seq)
+        if events:
+            return events
+        # 落盘尚未完成时回退到内存
+        return [e for e in self._events if e[0] > seq]
+
+    async def wait(self, timeout: float) -> None:
+        """等待新事件或 run 结束，最多 timeout 秒。"""
+        changed = self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class StreamBuffer:
+    """StreamRun 注册表：创建、按 Last-Event-ID 查找、过期清理。"""
+
+    def __init__(
+        self,
+        db_path: str = "./data/streams.db",
+        max_events: int = 1000,
+        ttl: float = 300.0,
+        resume_grace: float = 30.0,
+        retention: float = 86400.0,
+    ):
+        """
+        Args:
+            db_path: 事件溢出 / 落盘的 SQLite 路径
+            max_events: 每个 run 在内存中保留的最大事件数
+            ttl: 已结束 run 在内存中保留的秒数
+            resume_grace: 客户端全部断开后 Agent 继续运行、等待重连的秒数
+            retention: SQLite 中 run 的保留秒数
+        """
+        self.store = StreamEventStore(db_path)
+        self.max_events = max(2, max_events)
+        self.ttl = ttl
+        self.resume_grace = resume_grace
+        self.retention = retention
+        self._runs: Dict[str, StreamRun] = {}
+        self._last_purge = 0.0
+
+    def create(self, session_id: str, run_id: Optional[str] = None) -> StreamRun:
+        self._evict_expired()
+        run = StreamRun(self, run_id or uuid.uuid4().hex, session_id)
+        self._runs[run.run_id] = run
+        return run
+
+    def get(self, run_id: str) -> Optional[StreamRun]:
+        return self._runs.get(run_id)
+
+    async def resume(self, last_event_id: str) -> Tuple[Optional[StreamRun], int]:
+        """
+        解析 Last-Event-ID（"<run_id>:<seq>"），返回 (run, seq)；
+        run 已不在内存时从 SQLite 恢复为只读的已结束 run，找不到返回 (None, 0)。
+        """
+        run_id, _, seq = (last_event_id or "").strip().partition(":")
+        try:
+            after = int(seq or 0)
+        except ValueError:
+            return None, 0
+        run = self._runs.get(run_id)
+        if run is not None:
+            return run, after
+        record = await run_blocking(SQLITE, self.store.load_run, run_id)
+        if record is None:
+            return None, 0
+        # 服务重启时仍在运行的 run 已无法继续，按已取消处理
+        status = record["status"] if record["status"] != RUNNING else CANCELLED
+        return StreamRun(self, run_id, record["session_id"], status=status, last_seq=record["last_seq"]), after
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for run_id, run in list(self._runs.items()):
+            if run.finished and run.finished_at and now - run.finished_at > self.ttl and not run._pending_writes:
+                del self._runs[run_id]
+        if now - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = now
+            get_executor(SQLITE).submit(self._purge)
+
+    def _purge(self) -> None:
+        try:
+            removed = self.store.purge(time.time() - self.retention)
+            if removed:
+                logger.info(f"[StreamBuffer] 已清理 {removed} 个过期的流式记录")
+        except Exception as e:
+            logger.warning(f"[StreamBuffer] 清理过期流式记录失败: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "runs": len(self._runs),
+            "running": sum(1 for r in self._runs.values() if not r.finished),
+            "buffered_events": sum(len(r._events) for r in self._runs.values()),
+        }
+
+
+_stream_buffer = None
+
+
+def get_stream_buffer() -> StreamBuffer:
+    """获取全局流式事件缓冲（单例）。"""
+    global _stream_buffer
+    if _stream_buffer is None:
+        _stream_buffer = StreamBuffer(
+            db_path=settings.STREAM_DB_PATH,
+            max_events=settings.STREAM_BUFFER_MAX_EVENTS,
+            ttl=settings.STREAM_BUFFER_TTL,
+            resume_grace=settings.STREAM_RESUME_GRACE,
+        )
+    return _stream_buffer
+
+
+def stream_buffer_stats() -> Dict[str, int]:
+    """流式缓冲指标（尚未初始化时为空）。"""
+    return _stream_buffer.stats() if _stream_buffer is not None else {}
@@ -0,0 +1,96 @@
+"""
+backend/core/task_queue.py
+
+有界后台任务队列。
+
+用于把非关键路径上的工作（如会话标题生成）移出请求处理流程：
+- 固定数量的工作线程，限制并发
+- 排队上限，队列满时直接拒绝新任务（不阻塞请求）
+- 同一 key 的任务在完成前只排队一次
+- 排队超过 max_wait 秒的任务不再执行（结果已无意义）
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedTaskQueue:
+    """固定并发、有界排队、按 key 去重的后台任务队列。"""
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int = 2,
+        max_pending: int = 32,
+        max_wait: float = 30.0,
+    ):
+        """
+        Args:
+            name: 队列名称（用于线程名和日志）
+            max_workers: 工作线程数
+            max_pending: 已提交未完成任务数上限（含执行中）
+            max_wait: 任务排队等待的最长秒数，超时后跳过
+        """
+        self.name = name
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, float] = {}
+        self._running = 0
+        self._counters = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "expired": 0}
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> bool:
+        """提交任务；队列已满或同 key 任务未完成时返回 False。"""
+        with self._lock:
+            if key in self._pending or len(self._pending) >= self.max_pending:
+                self._counters["rejected"] += 1
+                return False
+            self._pending[key] = time.monotonic()
+            self._counters["submitted"] += 1
+        self._executor.submit(self._run, key, fn, args, kwargs)
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    def _run(self, key: Hashable, fn: Callable[..., Any], args, kwargs) -> None:
+        with self._lock:
+            queued_at = self._pending.get(key, time.monotonic())
+            expired = time.monotonic() - queued_at > self.max_wait
+            if not expired:
+                self._running += 1
+        try:
+            if expired:
+                self._finish(key, "expired")
+                logger.warning(f"[{self.name}] 任务 {key} 排队超时，已跳过")
+                return
+            fn(*args, **kwargs)
+            self._finish(key, "completed", running=True)
+        except Exception as e:
+            self._finish(key, "failed", running=True)
+            logger.warning(f"[{self.name}] 任务 {key} 执行失败: {e}")
+
+    def _finish(self, key: Hashable, outcome: str, running: bool = False) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+            self._counters[outcome] += 1
+            if running:
+                self._running -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """队列指标：排队 / 执行中数量及累计计数。"""
+        with self._lock:
+            return {
+                "pending": len(self._pending) - self._running,
+                "running": self._running,
+                **self._counters,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait)
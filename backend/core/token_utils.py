@@ -0,0 +1,50 @@
+"""
+backend/core/token_utils.py
+
+Token 数估算工具。
+
+不依赖具体 provider 的分词器，按字符类别粗略估算：
+- 中日韩字符及全角标点：约 1 token / 字
+- 其他字符（英文、代码、数字、空白）：约 4 字符 / token
+
+估算值用于历史窗口、附件截断等预算控制，偏保守即可，不用于计费。
+"""
+
+import re
+from typing import Any
+
+from langchain_core.messages import BaseMessage
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+# 每条消息的固定开销（角色标记、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """估算一段文本的 token 数。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def content_to_text(content: Any) -> str:
+    """将消息 content（str 或 content blocks 列表）转换为纯文本。"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif isinstance(block, dict) and block.get("type") == "text":
+                parts.append(block.get("text", ""))
+        return "".join(parts)
+    return str(content)
+
+
+def message_tokens(message: BaseMessage) -> int:
+    """估算单条消息的 token 数（含固定开销）。"""
+    return estimate_tokens(content_to_text(message.content)) + MESSAGE_OVERHEAD_TOKENS
@@ -2,37 +2,80 @@ import os
 import sqlite3
 import logging
 from langchain.tools import BaseTool
-from chromadb import PersistentClient
-from chromadb.utils import embedding_functions
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, ClassVar
 from .db_manager import db_manager
+from . import embedding_registry
+from .executors import ExecutorToolMixin, SQLITE, EMBEDDING, DB
 from backend.config import settings
 
 logger = logging.getLogger(__name__)
 
 
-class ListTablesTool(BaseTool):
+# list_tables 单次最多返回给 LLM 的表数量
+LIST_TABLES_LIMIT = 200
+
+
+class ListTablesTool(ExecutorToolMixin, BaseTool):
     name: str = "list_tables"
-    description: str = "Lists all tables available in the PDM document."
+    executor_name: ClassVar[str] = SQLITE
+    description: str = (
+        "Lists tables available in the PDM document. "
+        "Optionally pass a keyword to filter by table code, name or comment."
+    )
 
     def _run(self, query: str = ""):
+        from .catalog_export import catalog_snapshot
+
+        keyword = query.strip()
+        # Fast path: filter the memory-mapped columnar snapshot
+        if catalog_snapshot.exists():
+            try:
+                total, rows = catalog_snapshot.query_tables(keyword=keyword, limit=LIST_TABLES_LIMIT)
+            except Exception as e:
+                logger.warning(f"Catalog snapshot read failed, falling back to SQLite: {e}")
+            else:
+                return self._format(total, rows)
+
+        # Fallback for databases indexed before the snapshot existed: same filter and cap in SQL
+        where, params = "", []
+        if keyword:
+            pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where = (
+                " WHERE code LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\'"
+                " OR comment LIKE ? ESCAPE '\\'"
+            )
+            params = [pattern] * 3
+
         db_path = os.getenv("SQLITE_DB_PATH", "./data/metadata.db")
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT code, name, comment FROM tables")
-        results = cursor.fetchall()
-        conn.close()
-        
-        if not results:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM tables{where}", params)
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f"SELECT COALESCE(code, ''), COALESCE(name, ''), COALESCE(comment, '') FROM tables{where} "
+                "ORDER BY code LIMIT ?",
+                params + [LIST_TABLES_LIMIT],
+            )
+            rows = [{"code": r[0], "name": r[1], "comment": r[2]} for r in cursor.fetchall()]
+        finally:
+            conn.close()
+        return self._format(total, rows)
+
+    @staticmethod
+    def _format(total: int, rows: List[Dict[str, Any]]) -> str:
+        if not rows:
             return "No tables found in the metadata."
-            
-        output = "Available Tables:\n"
-        for code, name, comment in results:
-            output += f"- {code} ({name}): {comment[:50]}...\n"
+        output = f"Available Tables ({total} matched):\n"
+        for row in rows:
+            output += f"- {row['code']} ({row['name']}): {row['comment'][:50]}...\n"
+        if total > len(rows):
+            output += f"... {total - len(rows)} more. Pass a keyword to narrow the list.\n"
         return output
 
-class TableSchemaTool(BaseTool):
+class TableSchemaTool(ExecutorToolMixin, BaseTool):
     name: str = "get_table_schema"
+    executor_name: ClassVar[str] = SQLITE
     description: str = "Gets the detailed schema (columns, types, comments) for a specific table by its CODE."
 
     def _run(self, table_code: str):
@@ -69,20 +112,15 @@ class TableSchemaTool(BaseTool):
             
         return output
 
-class SearchTablesTool(BaseTool):
+class SearchTablesTool(ExecutorToolMixin, BaseTool):
     name: str = "search_tables"
+    executor_name: ClassVar[str] = EMBEDDING
     description: str = "Performs a semantic search to find relevant tables based on a conceptual query (e.g., 'user info', 'orders')."
 
     def _run(self, query: str):
-        chroma_path = settings.CHROMA_DB_PATH
-        # Use multilingual model (matching the indexer)
-        embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=settings.MODEL_NAME
-        )
-        
-        client = PersistentClient(path=chroma_path)
+        # Query with the model registered for pdm_metadata (same vector space as the indexer)
         try:
-            collection = client.get_collection(name="pdm_metadata", embedding_function=embedding_fn)
+            collection = embedding_registry.get_collection("pdm_metadata")
         except Exception:
             return "PDM index not found. Please run the PDM indexer first."
 
@@ -100,8 +138,9 @@ class SearchTablesTool(BaseTool):
             output += f"- {metadata['name']} ({metadata['code']}): {doc}\n"
         return output
 
-class RelationshipTool(BaseTool):
+class RelationshipTool(ExecutorToolMixin, BaseTool):
     name: str = "find_relationships"
+    executor_name: ClassVar[str] = SQLITE
     description: str = "Finds all foreign key relationships for a specific table by its CODE."
 
     def _run(self, table_code: str):
@@ -139,11 +178,17 @@ class RelationshipTool(BaseTool):
             output += f"- {name}: {table_code} ({direction}) <-> {other}\n"
         return output
 
-class ExecuteSQLTool(BaseTool):
+class ExecuteSQLTool(ExecutorToolMixin, BaseTool):
     name: str = "execute_sql"
-    description: str = "Executes a SQL query on a specific database (mysql or oracle) and returns the results. Input should be a JSON string with 'db_type' and 'sql' keys."
+    executor_name: ClassVar[str] = DB
+    description: str = (
+        "Executes a SQL query on a specific database (mysql or oracle) and returns the results. "
+        "Input should be a JSON string with 'db_type' and 'sql' keys. "
+        "A row limit is added automatically when missing; queries whose EXPLAIN estimate is too expensive are refused. "
+        "Pass 'confirm': true only after the user has explicitly approved running a refused query."
+    )
 
-    def _run(self, db_type: str, sql: str):
+    def _run(self, db_type: str, sql: str, confirm: bool = False):
         """
         Runs the SQL query.
         """
@@ -155,7 +200,7 @@ class ExecuteSQLTool(BaseTool):
 
         logger.info(f"Executing {db_type} SQL: {sql}")
         
-        results = db_manager.execute_query(db_type, sql)
+        results = db_manager.execute_query(db_type, sql, max_rows=settings.DB_TOOL_MAX_ROWS, confirm=confirm)
         
         if isinstance(results, str):
             return results
@@ -163,6 +208,96 @@ class ExecuteSQLTool(BaseTool):
         if not results:
             return "Query execution successful, but no rows were returned."
             
-        # Format results as a string for the LLM
-        df = pd.DataFrame(results)
-        return df.to_string(index=False)
+        # Format results as a string for the LLM, clipping long cell values
+        df = pd.DataFrame(results, columns=results.columns)
+        output = df.to_string(index=False, max_colwidth=settings.DB_TOOL_MAX_COLUMN_WIDTH)
+        if results.truncated:
+            output += (
+                f"\n\n(Result truncated: only the first {len(results)} rows are shown. "
+                "Add WHERE conditions, aggregation or LIMIT to narrow the query.)"
+            )
+        return output
+
+class JoinPathTool(ExecutorToolMixin, BaseTool):
+    name: str = "find_join_path"
+    executor_name: ClassVar[str] = SQLITE
+    description: str = (
+        "Finds how tables connect through foreign keys in one call. "
+        "Given 'source_table' and 'target_table' CODEs, returns the shortest join path between them. "
+        "Given only 'source_table', returns its k-hop neighborhood ('hops', default 2, max 4)."
+    )
+
+    def _run(self, source_table: str, target_table: str = "", hops: int = 2):
+        from .join_graph import get_join_graph
+
+        graph = get_join_graph()
+
+        if target_table:
+            try:
+                path = graph.shortest_path(source_table, target_table)
+            except KeyError as e:
+                return f"Table {e} not found."
+            if path is None:
+                return f"No join path found between {source_table} and {target_table} (different ER components)."
+            if not path["edges"]:
+                return f"{source_table} and {target_table} are the same table."
+
+            output = f"Shortest join path {source_table} -> {target_table} ({len(path['edges'])} hops):\n"
+            output += " -> ".join(path["tables"]) + "\n\n"
+            for edge in path["edges"]:
+                output += f"- {edge['name']}: {edge['parent_table']} (Parent) <-> {edge['child_table']} (Child)\n"
+            return output
+
+        try:
+            result = graph.neighborhood(source_table, hops)
+        except KeyError as e:
+            return f"Table {e} not found."
+
+        output = f"{result['hops']}-hop neighborhood of {source_table} "
+        output += f"({len(result['tables'])} tables, component size {result['component_size']}):\n"
+        for code, distance in result["tables"].items():
+            output += f"- [{distance}] {code}\n"
+        if result["edges"]:
+            output += "\nRelationships:\n"
+            for edge in result["edges"]:
+                output += f"- {edge['name']}: {edge['parent_table']} (Parent) <-> {edge['child_table']} (Child)\n"
+        return output
+
+class JoinSQLTool(ExecutorToolMixin, BaseTool):
+    name: str = "get_join_sql"
+    executor_name: ClassVar[str] = SQLITE
+    description: str = (
+        "Returns a ready-to-edit SELECT skeleton (column lists + JOIN ... ON clauses) joining two tables "
+        "by their CODEs along the shortest foreign-key path. Use it instead of fetching schemas and "
+        "relationships one by one before writing a multi-table query."
+    )
+
+    def _run(self, source_table: str, target_table: str):
+        from .join_graph import build_join_sql
+
+        try:
+            result = build_join_sql(source_table, target_table)
+        except KeyError as e:
+            return f"Table {e} not found."
+        if result is None:
+            return f"No join path found between {source_table} and {target_table} (different ER components)."
+        if not result["edges"]:
+            return f"{source_table} and {target_table} are the same table."
+        if "unknown" in result["join_sources"]:
+            unknown = [
+                f"{e['parent_table']} -> {e['child_table']}"
+                for e, src in zip(result["edges"], result["join_sources"]) if src == "unknown"
+            ]
+            return (
+                f"Join path: {' -> '.join(result['tables'])}\n"
+                f"Join columns are unknown for: {', '.join(unknown)} (not defined in the PDM and not inferable "
+                "from the parent's primary key). Inspect both schemas with get_table_schema to determine them."
+            )
+        if not result["sql"]:
+            return "Join skeletons have not been built yet. Please re-run the PDM indexer."
+
+        output = f"Join path: {' -> '.join(result['tables'])}\n"
+        if any(src != "pdm" for src in result["join_sources"]):
+            output += "Note: some join columns were inferred from the parent's primary key; verify before running.\n"
+        output += f"\n{result['sql']}\n"
+        return output
@@ -8,24 +8,19 @@ import os
 import json
 import sqlite3
 import logging
+from typing import ClassVar
 from langchain.tools import BaseTool
-from chromadb import PersistentClient
-from chromadb.utils import embedding_functions
 
 from backend.config import settings
+from backend.core import embedding_registry
+from backend.core.executors import ExecutorToolMixin, SQLITE, EMBEDDING
 
 logger = logging.getLogger(__name__)
 
 
-def _get_embedding_fn():
-    """统一的嵌入函数工厂，使用多语言模型。"""
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=settings.MODEL_NAME
-    )
-
-
-class TraceComponentTool(BaseTool):
+class TraceComponentTool(ExecutorToolMixin, BaseTool):
     name: str = "trace_component"
+    executor_name: ClassVar[str] = EMBEDDING
     description: str = (
         "Traces the full call chain for a component: Config → Controller → Service → Mapper → Table. "
         "Input should be a component name, API path, or description of what you want to trace."
@@ -36,10 +31,8 @@ class TraceComponentTool(BaseTool):
         chroma_path = settings.CHROMA_DB_PATH
 
         # Step 1: 语义搜索找到相关代码
-        embedding_fn = _get_embedding_fn()
-        client = PersistentClient(path=chroma_path)
         try:
-            collection = client.get_collection(name="code_chunks", embedding_function=embedding_fn)
+            collection = embedding_registry.get_collection("code_chunks", chroma_path=chroma_path)
         except Exception:
             return "Code index not found. Please index a code source first."
 
@@ -181,8 +174,9 @@ class TraceComponentTool(BaseTool):
         return chain_str
 
 
-class FindConfigUsageTool(BaseTool):
+class FindConfigUsageTool(ExecutorToolMixin, BaseTool):
     name: str = "find_config_usage"
+    executor_name: ClassVar[str] = SQLITE
     description: str = (
         "Finds all code locations that reference a specific configuration key "
         "(e.g., from @Value annotations or property files). "
@@ -222,8 +216,9 @@ class FindConfigUsageTool(BaseTool):
         return output
 
 
-class FindTableUsageTool(BaseTool):
+class FindTableUsageTool(ExecutorToolMixin, BaseTool):
     name: str = "find_table_usage"
+    executor_name: ClassVar[str] = SQLITE
     description: str = (
         "Finds all code that references a specific database table "
         "(through MyBatis mappers, @TableName annotations, SQL statements, etc.). "
@@ -12,10 +12,8 @@ import sqlite3
 import logging
 from typing import List, Dict, Any, Optional
 
-import chromadb
-from chromadb.utils import embedding_functions
-
 from backend.config import settings
+from backend.core import embedding_registry
 
 logger = logging.getLogger(__name__)
 
@@ -33,14 +31,10 @@ class UnifiedIndexer:
         # 初始化新增的 SQLite 表
         self._init_sqlite()
 
-        # ChromaDB 客户端和嵌入函数
-        self.chroma_client = chromadb.PersistentClient(path=self.chroma_path)
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=settings.MODEL_NAME
-        )
+        # ChromaDB 客户端（嵌入模型由 embedding_registry 按 collection 登记统一解析）
+        self.chroma_client = embedding_registry.get_chroma_client(self.chroma_path)
 
         # 保留现有 pdm_metadata collection，新增 code_chunks 和 config_entries
-        # 处理嵌入模型切换导致的 collection 冲突
         self.code_collection = self._get_or_recreate_collection("code_chunks")
         self.config_collection = self._get_or_recreate_collection("config_entries")
 
@@ -151,21 +145,12 @@ class UnifiedIndexer:
         conn.close()
 
     def _get_or_recreate_collection(self, name: str):
-        """获取或重建 collection，处理嵌入模型切换导致的冲突。"""
-        try:
-            return self.chroma_client.get_or_create_collection(
-                name=name,
-                embedding_function=self.embedding_fn,
-            )
-        except ValueError as e:
-            if "conflict" in str(e).lower():
-                logger.warning(f"Embedding function conflict for '{name}', recreating collection...")
-                self.chroma_client.delete_collection(name)
-                return self.chroma_client.create_collection(
-                    name=name,
-                    embedding_function=self.embedding_fn,
-                )
-            raise
+        """获取或创建 collection，嵌入模型以注册表登记为准。"""
+        return embedding_registry.get_or_create_collection(
+            name,
+            chroma_path=self.chroma_path,
+            db_path=self.db_path,
+        )
 
     # ------------------------------------------------------------------
     # 索引调度
@@ -207,6 +192,7 @@ class UnifiedIndexer:
             if file_name.endswith(".pdm"):
                 file_path = os.path.join(pdm_dir, file_name)
                 indexer.index_file(file_path)
+        indexer.export_catalog()
 
         # 更新知识源状态
         conn = sqlite3.connect(self.db_path)
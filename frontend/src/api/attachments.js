@@ -0,0 +1,34 @@
+/**
+ * src/api/attachments.js
+ * 附件预上传相关 API 封装
+ *
+ * 对应后端路由：
+ *   POST   /api/attachments                 - 上传附件（multipart），返回 attachment_id，后台立即开始 OCR / 日志处理
+ *   GET    /api/attachments/{attachment_id} - 查询附件处理状态
+ *   DELETE /api/attachments/{attachment_id} - 删除附件
+ */
+
+import request from './index'
+
+/**
+ * 上传附件（图片或日志文件）
+ * @param {File[]} files
+ * @returns {Promise<{data: Array<{attachment_id, kind, filename, mime_type, size, status}>}>}
+ */
+export function uploadAttachments(files) {
+  const form = new FormData()
+  for (const file of files) {
+    form.append('files', file, file.name)
+  }
+  return request.post('/attachments', form, {
+    headers: { 'Content-Type': 'multipart/form-data' }
+  })
+}
+
+/**
+ * 删除附件（用户在发送前移除附件时调用，失败不提示）
+ * @param {string} attachmentId
+ */
+export function deleteAttachment(attachmentId) {
+  return request.delete(`/attachments/${attachmentId}`, { skipGlobalError: true })
+}
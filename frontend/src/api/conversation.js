@@ -8,12 +8,17 @@
  *   GET    /api/conversations/{session_id}           - 获取会话详情
  *   GET    /api/conversations/{session_id}/history   - 获取消息历史
  *   POST   /api/conversations/{session_id}/messages  - 发送消息（AI 对话）
+ *   POST   /api/conversations/{session_id}/messages/stream - 发送消息（SSE 流式，支持 Last-Event-ID 续传）
  *   DELETE /api/conversations/{session_id}/history   - 清空历史
  *   DELETE /api/conversations/{session_id}           - 删除会话
  */
 
 import request from './index'
 
+/** 流式连接中断后的续传次数上限与重试间隔 */
+const STREAM_RESUME_MAX_ATTEMPTS = 3
+const STREAM_RESUME_DELAY_MS = 1000
+
 /**
  * 列出所有会话
  * @returns {Promise<ListSessionsResponse>}
@@ -53,17 +58,13 @@ export function getSessionHistory(sessionId) {
  * 发送消息（普通模式）
  * @param {string} sessionId
  * @param {string} message - 用户消息内容
- * @param {Array} [images] - 图片列表 [{data, filename, mime_type}]
- * @param {Object|null} [logFile] - 日志文件 {data, filename, mime_type}
+ * @param {string[]} [attachmentIds] - 预上传的附件 ID（见 api/attachments.js）
  * @returns {Promise<ChatResponse>}
  */
-export function sendMessage(sessionId, message, images, logFile) {
+export function sendMessage(sessionId, message, attachmentIds) {
   const body = { message }
-  if (images && images.length > 0) {
-    body.images = images
-  }
-  if (logFile) {
-    body.log_file = logFile
+  if (attachmentIds && attachmentIds.length > 0) {
+    body.attachment_ids = attachmentIds
   }
   return request.post(`/conversations/${sessionId}/messages`, body, {
     skipGlobalError: true
@@ -75,79 +76,111 @@ export function sendMessage(sessionId, message, images, logFile) {
  *
  * @param {string} sessionId
  * @param {string} message
- * @param {Array} [images] - 图片列表 [{data, filename, mime_type}]
- * @param {Object|null} [logFile] - 日志文件 {data, filename, mime_type}
+ * @param {string[]} [attachmentIds] - 预上传的附件 ID（见 api/attachments.js）
  * @param {function} onChunk - 每次收到 chunk 时的回调 (chunk: string) => void
  * @param {function} onDone  - 流结束时的回调 () => void
  * @param {function} onError - 错误时的回调 (error: Error) => void
+ * @param {function} [onTool] - 工具调用进度回调 ({name, status}) => void，status 为 running / done / error
  * @returns {() => void} abort 函数，用于提前终止流
  */
-export function sendMessageStream(sessionId, message, images, logFile, onChunk, onDone, onError) {
+export function sendMessageStream(sessionId, message, attachmentIds, onChunk, onDone, onError, onTool) {
   const controller = new AbortController()
 
   const body = { message }
-  if (images && images.length > 0) {
-    body.images = images
-  }
-  if (logFile) {
-    body.log_file = logFile
+  if (attachmentIds && attachmentIds.length > 0) {
+    body.attachment_ids = attachmentIds
   }
 
-  fetch(`/api/conversations/${sessionId}/messages/stream`, {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify(body),
-    signal: controller.signal
-  })
-    .then(async (response) => {
-      if (!response.ok) {
-        const err = await response.json().catch(() => ({}))
-        throw new Error(err.detail || err.message || `HTTP ${response.status}`)
-      }
+  // 最近收到的事件 id（<run_id>:<seq>），连接中断后据此续传
+  let lastEventId = null
+  let finished = false
 
-      const reader = response.body.getReader()
-      const decoder = new TextDecoder('utf-8')
+  const finish = (callback) => {
+    if (finished) return
+    finished = true
+    callback()
+  }
 
-      const read = async () => {
-        while (true) {
-          const { done, value } = await reader.read()
-          if (done) {
-            onDone?.()
-            break
+  const connect = async (attempt) => {
+    const headers = { 'Content-Type': 'application/json' }
+    if (lastEventId) {
+      headers['Last-Event-ID'] = lastEventId
+    }
+    const response = await fetch(`/api/conversations/${sessionId}/messages/stream`, {
+      method: 'POST',
+      headers,
+      // 续传时服务端忽略请求体
+      body: JSON.stringify(lastEventId ? {} : body),
+      signal: controller.signal
+    })
+    if (!response.ok) {
+      const err = await response.json().catch(() => ({}))
+      throw new Error(err.detail || err.message || `HTTP ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder('utf-8')
+
+    // 未以换行结尾的残余行，与下一次读取的内容拼接
+    let buffer = ''
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) {
+        // 未收到 [DONE] 就断开：连接中断，带 Last-Event-ID 续传
+        if (lastEventId && attempt < STREAM_RESUME_MAX_ATTEMPTS) {
+          await new Promise((resolve) => setTimeout(resolve, STREAM_RESUME_DELAY_MS))
+          return connect(attempt + 1)
+        }
+        finish(() => onDone?.())
+        return
+      }
+      // SSE 格式：[id: <run_id>:<seq>\n]data: <json>\n\n；以 ":" 开头的心跳注释行直接忽略
+      buffer += decoder.decode(value, { stream: true })
+      const lines = buffer.split('\n')
+      buffer = lines.pop()
+      for (const line of lines) {
+        if (line.startsWith('id: ')) {
+          lastEventId = line.slice(4).trim()
+          attempt = 0
+        } else if (line.startsWith('data: ')) {
+          const data = line.slice(6).trim()
+          if (data === '[DONE]') {
+            finish(() => onDone?.())
+            return
           }
-          // SSE 格式：data: <json>\n\n
-          const text = decoder.decode(value, { stream: true })
-          const lines = text.split('\n')
-          for (const line of lines) {
-            if (line.startsWith('data: ')) {
-              const data = line.slice(6).trim()
-              if (data === '[DONE]') {
-                onDone?.()
-                return
-              }
-              try {
-                const parsed = JSON.parse(data)
-                if (parsed.error) {
-                  onError?.(new Error(parsed.error))
-                  return
-                }
-                onChunk?.(parsed.content || parsed.delta || data)
-              } catch {
-                onChunk?.(data)
-              }
+          try {
+            const parsed = JSON.parse(data)
+            if (parsed.error) {
+              finish(() => onError?.(new Error(parsed.error)))
+              return
+            }
+            if (parsed.tool) {
+              onTool?.(parsed.tool)
+              continue
             }
+            onChunk?.(parsed.content || parsed.delta || data)
+          } catch {
+            onChunk?.(data)
           }
         }
       }
+    }
+  }
 
-      await read()
-    })
-    .catch((error) => {
-      if (error.name !== 'AbortError') {
-        onError?.(error)
+  const run = (attempt) =>
+    connect(attempt).catch(async (error) => {
+      if (error.name === 'AbortError') return
+      // 网络错误：已收到过事件时续传，否则直接报错
+      if (lastEventId && attempt < STREAM_RESUME_MAX_ATTEMPTS && error instanceof TypeError) {
+        await new Promise((resolve) => setTimeout(resolve, STREAM_RESUME_DELAY_MS))
+        return run(attempt + 1)
       }
+      finish(() => onError?.(error))
     })
 
+  run(0)
+
   // 返回终止函数
   return () => controller.abort()
 }
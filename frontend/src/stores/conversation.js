@@ -17,6 +17,10 @@ import {
   deleteSession
 } from '@/api/conversation'
 
+/** 后台生成会话标题时的轮询间隔与最大次数 */
+const TITLE_POLL_INTERVAL_MS = 1500
+const TITLE_POLL_MAX_ATTEMPTS = 10
+
 export const useConversationStore = defineStore('conversation', () => {
   // ---------------------------------------------------------------
   // State
@@ -172,27 +176,24 @@ export const useConversationStore = defineStore('conversation', () => {
     }
     messages.value.push(userMsg)
 
-    // 准备发送给 API 的附件数据（不含 preview / size）
-    const apiImages = images
-      ? images.map(({ data, filename, mime_type }) => ({ data, filename, mime_type }))
-      : null
-    const apiLogFile = logFile
-      ? (({ data, filename, mime_type }) => ({ data, filename, mime_type }))(logFile)
-      : null
+    // 附件已预上传（后端已在处理），发送时只引用 attachment_id
+    const attachmentIds = [...(images || []), ...(logFile ? [logFile] : [])]
+      .map((item) => item.attachment_id)
+      .filter(Boolean)
 
     sending.value = true
 
     if (streamMode.value) {
-      await _sendStream(text, apiImages, apiLogFile)
+      await _sendStream(text, attachmentIds)
     } else {
-      await _sendNormal(text, apiImages, apiLogFile)
+      await _sendNormal(text, attachmentIds)
     }
   }
 
   /** 普通（非流式）发送 */
-  async function _sendNormal(content, images, logFile) {
+  async function _sendNormal(content, attachmentIds) {
     try {
-      const res = await sendMessage(currentSessionId.value, content, images, logFile)
+      const res = await sendMessage(currentSessionId.value, content, attachmentIds)
       const aiMsg = {
         role: 'assistant',
         content: res.reply || '',
@@ -217,7 +218,7 @@ export const useConversationStore = defineStore('conversation', () => {
   }
 
   /** 流式发送 */
-  async function _sendStream(content, images, logFile) {
+  async function _sendStream(content, attachmentIds) {
     const aiMsgId = `ai-stream-${Date.now()}`
     const aiMsg = { role: 'assistant', content: '', id: aiMsgId, timestamp: Date.now() }
     messages.value.push(aiMsg)
@@ -228,18 +229,19 @@ export const useConversationStore = defineStore('conversation', () => {
     _abortStream = sendMessageStream(
       currentSessionId.value,
       content,
-      images,
-      logFile,
+      attachmentIds,
       // onChunk
       (chunk) => {
         streamingContent.value += chunk
         messages.value[aiMsgIndex].content = streamingContent.value
+        messages.value[aiMsgIndex].toolStatus = ''
       },
       // onDone
       async () => {
         sending.value = false
         _abortStream = null
         streamingContent.value = ''
+        messages.value[aiMsgIndex].toolStatus = ''
         await _refreshCurrentSessionInList()
       },
       // onError
@@ -250,10 +252,36 @@ export const useConversationStore = defineStore('conversation', () => {
         sending.value = false
         _abortStream = null
         streamingContent.value = ''
+      },
+      // onTool：显示正在执行的工具
+      (tool) => {
+        messages.value[aiMsgIndex].toolStatus = tool.status === 'running' ? `正在调用 ${tool.name} ...` : ''
       }
     )
   }
 
+  /**
+   * 标题在后台生成（title_pending）时轮询会话信息，拿到标题后更新列表
+   * @param {string} sessionId
+   * @param {number} [attempt]
+   */
+  function _pollSessionTitle(sessionId, attempt = 0) {
+    if (attempt >= TITLE_POLL_MAX_ATTEMPTS) return
+    setTimeout(async () => {
+      try {
+        const res = await getSession(sessionId)
+        const idx = sessions.value.findIndex((s) => s.session_id === sessionId)
+        if (!res?.data || idx === -1) return
+        sessions.value[idx] = { ...sessions.value[idx], ...res.data }
+        if (res.data.title_pending) {
+          _pollSessionTitle(sessionId, attempt + 1)
+        }
+      } catch (e) {
+        // 轮询失败忽略，下次刷新列表时会拿到标题
+      }
+    }, TITLE_POLL_INTERVAL_MS)
+  }
+
   /**
    * 刷新当前会话在列表中的信息
    * 优先从后端拉取（可获取自动生成的标题），失败再降级为本地更新
@@ -271,6 +299,9 @@ export const useConversationStore = defineStore('conversation', () => {
           ...sessions.value[idx],
           ...res.data,
         }
+        if (res.data.title_pending) {
+          _pollSessionTitle(res.data.session_id)
+        }
         return
       }
     } catch (e) {
@@ -0,0 +1,181 @@
+"""
+scripts/benchmark_ocr.py
+
+OCR 预处理基准测试：在截图样本集上对比原图直接识别与预处理后识别的耗时和准确率。
+
+用法：
+    # 激活虚拟环境后，在项目根目录执行
+    # 生成合成的异常堆栈截图样本（含 4K 与超长截图），同时写出参考文本 <name>.txt
+    python scripts/benchmark_ocr.py --dir data/ocr_fixtures --generate 10
+
+    # 对比样本目录中的全部图片（同名 .txt 存在时作为参考文本，否则以原图识别结果为参考）
+    python scripts/benchmark_ocr.py --dir data/ocr_fixtures
+
+    # 每张图片重复识别 3 次取最短耗时
+    python scripts/benchmark_ocr.py --dir data/ocr_fixtures --repeat 3
+"""
+
+import os
+import sys
+import random
+import argparse
+import time
+from difflib import SequenceMatcher
+
+# 确保项目根目录在 sys.path 中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".gif")
+
+# 合成样本的尺寸：(宽, 行数)，覆盖普通截图、4K 截图和超长截图
+_FIXTURE_SHAPES = [(1280, 30), (3840, 40), (2560, 200)]
+
+_FRAMES = [
+    "at com.pc90.product.service.ProductServiceImpl.save(ProductServiceImpl.java:{n})",
+    "at com.pc90.product.controller.ProductController.create(ProductController.java:{n})",
+    "at org.springframework.aop.framework.ReflectiveMethodInvocation.proceed(ReflectiveMethodInvocation.java:{n})",
+    "at org.apache.ibatis.executor.SimpleExecutor.doUpdate(SimpleExecutor.java:{n})",
+    "at java.base/jdk.internal.reflect.NativeMethodAccessorImpl.invoke0(Native Method)",
+    "at org.apache.catalina.core.ApplicationFilterChain.doFilter(ApplicationFilterChain.java:{n})",
+]
+
+_EXCEPTIONS = [
+    "java.lang.NullPointerException: Cannot invoke \"String.trim()\" because \"code\" is null",
+    "org.springframework.dao.DuplicateKeyException: ORA-00001: unique constraint (PDM.PK_PRODUCT) violated",
+    "java.sql.SQLSyntaxErrorException: Unknown column 'prod_status' in 'field list'",
+]
+
+
+def _similarity(expected: str, actual: str) -> float:
+    """字符级相似度（忽略空白），0~1。"""
+    a = "".join(expected.split())
+    b = "".join(actual.split())
+    if not a and not b:
+        return 1.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def generate_fixtures(directory: str, count: int, seed: int = 42):
+    """生成合成的异常堆栈截图及参考文本。"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        width, rows = _FIXTURE_SHAPES[i % len(_FIXTURE_SHAPES)]
+        font_size = max(14, width // 80)
+        try:
+            font = ImageFont.load_default(size=font_size)
+        except TypeError:
+            # Pillow < 10.1 只有固定大小的位图字体
+            font = ImageFont.load_default()
+        line_height = int(font_size * 1.6)
+        margin = width // 10
+
+        lines = [rng.choice(_EXCEPTIONS)]
+        for _ in range(rows - 1):
+            lines.append("    " + rng.choice(_FRAMES).format(n=rng.randint(20, 2000)))
+
+        height = margin * 2 + line_height * len(lines)
+        image = Image.new("RGB", (width, height), (245, 245, 245))
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(lines):
+            draw.text((margin, margin + row * line_height), line, fill=(30, 30, 30), font=font)
+
+        name = f"stacktrace_{i + 1:02d}_{width}x{height}"
+        image.save(os.path.join(directory, f"{name}.png"))
+        with open(os.path.join(directory, f"{name}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        print(f"  已生成 {name}.png")
+
+
+def _timed_ocr(image, preprocess: bool, repeat: int):
+    from backend.core.ocr_service import ocr_image
+
+    best = None
+    lines = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = ocr_image(image, preprocess=preprocess)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return "\n".join(lines), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR 预处理基准测试")
+    parser.add_argument("--dir", required=True, help="截图样本目录")
+    parser.add_argument("--generate", type=int, default=0, metavar="N", help="先在样本目录中生成 N 张合成截图")
+    parser.add_argument("--repeat", type=int, default=1, help="每张图片重复识别次数，取最短耗时（默认: 1）")
+    args = parser.parse_args()
+
+    from PIL import Image
+    from backend.config import settings
+    from backend.core.ocr_service import _get_ocr_engine, preprocess_image
+
+    if args.generate:
+        print(f"生成 {args.generate} 张合成截图 → {args.dir}")
+        generate_fixtures(args.dir, args.generate)
+
+    if not os.path.isdir(args.dir):
+        print(f"❌ 样本目录不存在: {args.dir}")
+        sys.exit(1)
+    files = sorted(f for f in os.listdir(args.dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not files:
+        print(f"❌ 样本目录中没有图片: {args.dir}")
+        sys.exit(1)
+
+    print(f"预处理参数: OCR_MAX_LONG_EDGE={settings.OCR_MAX_LONG_EDGE}, OCR_TILE_HEIGHT={settings.OCR_TILE_HEIGHT}")
+    # 预热引擎，避免首张图片的耗时包含模型加载
+    _get_ocr_engine()
+
+    print()
+    print(f"{'图片':<40} {'尺寸':>11} {'切块':>4} {'原图(s)':>8} {'预处理(s)':>9} {'加速':>6} {'原图准确率':>10} {'预处理准确率':>12}")
+    total_raw = total_pre = 0.0
+    acc_raw, acc_pre, agreement = [], [], []
+    for name in files:
+        path = os.path.join(args.dir, name)
+        image = Image.open(path)
+        image.load()
+
+        raw_text, raw_time = _timed_ocr(image, False, args.repeat)
+        pre_text, pre_time = _timed_ocr(image, True, args.repeat)
+        tiles = len(preprocess_image(image))
+
+        ref_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(ref_path):
+            with open(ref_path, encoding="utf-8") as f:
+                reference = f.read()
+            raw_acc = _similarity(reference, raw_text)
+            acc_raw.append(raw_acc)
+            raw_acc_str = f"{raw_acc:.1%}"
+        else:
+            # 没有参考文本时以原图识别结果为参考，衡量预处理带来的差异
+            reference = raw_text
+            raw_acc_str = "-"
+        pre_acc = _similarity(reference, pre_text)
+        (acc_pre if raw_acc_str != "-" else agreement).append(pre_acc)
+
+        total_raw += raw_time
+        total_pre += pre_time
+        size = f"{image.width}x{image.height}"
+        speedup = raw_time / pre_time if pre_time else 0.0
+        print(f"{name[:40]:<40} {size:>11} {tiles:>4} {raw_time:>8.2f} {pre_time:>9.2f} {speedup:>5.1f}x "
+              f"{raw_acc_str:>10} {pre_acc:>12.1%}")
+
+    print()
+    print(f"合计耗时: 原图 {total_raw:.2f}s，预处理 {total_pre:.2f}s"
+          f"（{total_raw / total_pre if total_pre else 0:.1f}x）")
+    if acc_raw:
+        print(f"平均准确率（有参考文本的 {len(acc_raw)} 张）: 原图 {sum(acc_raw) / len(acc_raw):.1%}，"
+              f"预处理 {sum(acc_pre) / len(acc_pre):.1%}")
+    if agreement:
+        print(f"预处理与原图识别结果一致率（无参考文本的 {len(agreement)} 张）: "
+              f"{sum(agreement) / len(agreement):.1%}")
+
+
+if __name__ == "__main__":
+    main()
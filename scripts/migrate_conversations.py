@@ -0,0 +1,54 @@
+"""
+scripts/migrate_conversations.py
+
+会话迁移脚本：将旧版 conversations.json 一次性导入 SQLite 会话库。
+
+用法：
+    # 使用 .env 中的 CONVERSATION_PERSIST_PATH / CONVERSATION_DB_PATH
+    python scripts/migrate_conversations.py
+
+    # 指定文件，导入后保留原 JSON 文件
+    python scripts/migrate_conversations.py --json data/conversations.json --db data/conversations.db --keep
+"""
+
+import os
+import sys
+import argparse
+
+# 确保项目根目录在 sys.path 中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def main():
+    from backend.config import settings
+
+    parser = argparse.ArgumentParser(description="conversations.json → SQLite 会话库迁移工具")
+    parser.add_argument("--json", default=settings.CONVERSATION_PERSIST_PATH,
+                        help=f"旧版 JSON 会话文件（默认: {settings.CONVERSATION_PERSIST_PATH}）")
+    parser.add_argument("--db", default=settings.CONVERSATION_DB_PATH,
+                        help=f"目标 SQLite 会话库（默认: {settings.CONVERSATION_DB_PATH}）")
+    parser.add_argument("--keep", action="store_true", help="导入后保留原 JSON 文件（默认改名为 .migrated.bak）")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json):
+        print(f"错误：文件不存在: {args.json}")
+        sys.exit(1)
+
+    from backend.core.conversation_store import ConversationStore
+
+    store = ConversationStore(args.db)
+    try:
+        count = store.migrate_from_json(args.json, rename=not args.keep)
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        sys.exit(1)
+    finally:
+        store.close()
+    print(f"已导入 {count} 个会话到 {args.db}")
+
+
+if __name__ == "__main__":
+    main()
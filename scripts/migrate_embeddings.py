@@ -0,0 +1,84 @@
+"""
+scripts/migrate_embeddings.py
+
+嵌入模型迁移脚本：切换嵌入模型后，使用新模型批量重新嵌入指定 collection。
+
+用法：
+    # 查看各 collection 登记的嵌入模型
+    python scripts/migrate_embeddings.py --list
+
+    # 将 pdm_metadata 迁移到 .env 中配置的 MODEL_NAME
+    python scripts/migrate_embeddings.py --collection pdm_metadata
+
+    # 指定目标模型，迁移全部已登记的 collection
+    python scripts/migrate_embeddings.py --all --model paraphrase-multilingual-MiniLM-L12-v2
+"""
+
+import os
+import sys
+import argparse
+import time
+
+# 确保项目根目录在 sys.path 中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入模型迁移工具")
+    parser.add_argument("--collection", help="要迁移的 collection 名称（如 pdm_metadata）")
+    parser.add_argument("--all", action="store_true", help="迁移所有已登记的 collection")
+    parser.add_argument("--model", help="目标嵌入模型（默认读取 .env 中的 MODEL_NAME）")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批重新嵌入的记录数（默认: 500）")
+    parser.add_argument("--list", action="store_true", help="列出各 collection 登记的嵌入模型")
+    args = parser.parse_args()
+
+    from backend.config import settings
+    from backend.core import embedding_registry
+
+    # --list: 列出登记信息
+    if args.list:
+        models = embedding_registry.list_registered_models()
+        if not models:
+            print("暂无已登记的 collection。")
+            return
+        print(f"{'Collection':<24} {'维度':<6} {'更新时间':<20} {'模型'}")
+        print("-" * 100)
+        for m in models:
+            print(f"{m['collection_name']:<24} {m['dimension']:<6} {str(m['updated_at']):<20} {m['model_name']}")
+        return
+
+    if args.all:
+        names = [m["collection_name"] for m in embedding_registry.list_registered_models()]
+    elif args.collection:
+        names = [args.collection]
+    else:
+        print("错误：请通过 --collection 指定 collection，或使用 --all")
+        sys.exit(1)
+
+    target_model = args.model or settings.MODEL_NAME
+    for name in names:
+        registered = embedding_registry.get_registered_model(name)
+        if registered and registered["model_name"] == target_model:
+            print(f"[{name}] 已使用 {target_model}，跳过")
+            continue
+
+        print(f"[{name}] 迁移到 {target_model} ...")
+        start = time.time()
+        try:
+            count = embedding_registry.migrate_collection(
+                name, model_name=target_model, batch_size=args.batch_size
+            )
+        except embedding_registry.MigrationRenameError as e:
+            print(f"[{name}] 迁移失败: {e}")
+            sys.exit(1)
+        except Exception as e:
+            print(f"[{name}] 迁移失败（原 collection 未改动）: {e}")
+            sys.exit(1)
+        print(f"[{name}] 完成：{count} 条，耗时 {time.time() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""backend.core.stack_frames 的堆栈帧解析与方法匹配。"""
+
+import sqlite3
+
+from backend.core.stack_frames import extract_frames, resolve_frames
+
+
+def _make_index(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE code_chunks (
+            chunk_id TEXT, file_path TEXT, qualified_name TEXT, content TEXT,
+            line_start INTEGER, line_end INTEGER, chunk_type TEXT
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO code_chunks VALUES (?, ?, ?, ?, ?, ?, 'method')", rows
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_extract_frames_tolerates_ocr_punctuation():
+    text = "at com.acme.Foo$Inner.run（Foo.java：12）\n at com . acme.Foo.lambda$save$0(Foo.java:30)"
+    frames = extract_frames(text)
+    assert [(f.class_name, f.method, f.line) for f in frames] == [
+        ("com.acme.Foo$Inner", "run", 12),
+        ("com.acme.Foo", "lambda$save$0", 30),
+    ]
+
+
+def test_inner_class_candidates_include_indexed_name():
+    frame = extract_frames("at com.acme.Foo$Inner$1.run(Foo.java:12)")[0]
+    assert frame.candidates() == [
+        "com.acme.Foo.Inner.run",
+        "com.acme.Inner.run",
+        "com.acme.Foo.run",
+    ]
+
+
+def test_resolve_picks_closest_overload_and_inner_class(tmp_path):
+    db_path = str(tmp_path / "index.db")
+    path = "src/main/java/com/acme/Foo.java"
+    # 方法 chunk 的 line_end = line_start + max_lines，重载的范围相互重叠
+    _make_index(db_path, [
+        ("save-1", path, "com.acme.Foo.save", "void save() {}", 10, 110),
+        ("save-2", path, "com.acme.Foo.save", "void save(int n) {}", 40, 140),
+        ("run", path, "com.acme.Inner.run", "public void run() {}", 60, 160),
+    ])
+    frames = extract_frames(
+        "at com.acme.Foo.save(Foo.java:45)\n"
+        "at com.acme.Foo.save(Foo.java:12)\n"
+        "at com.acme.Foo$Inner.run(Foo.java:61)"
+    )
+    resolved = resolve_frames(frames, db_path=db_path)
+    assert [item["chunk_id"] for item in resolved] == ["save-2", "save-1", "run"]